@@ -11,6 +11,8 @@ import numpy as np
 from itertools import chain
 from scipy.optimize import linear_sum_assignment
 from shapely import geometry
+from shapely.prepared import prep
+from shapely.strtree import STRtree
 
 from cvat.apps.engine.models import ShapeType, DimensionType
 from cvat.apps.engine.serializers import LabeledDataSerializer
@@ -238,6 +240,16 @@ class ObjectManager:
     def _modify_unmatched_object(self, obj, end_frame):
         raise NotImplementedError()
 
+    def _calc_cost_matrix(self, int_objects, old_objects, start_frame, overlap, dimension):
+        cost_matrix = np.empty(shape=(len(int_objects), len(old_objects)),
+            dtype=float)
+        for i, int_obj in enumerate(int_objects):
+            for j, old_obj in enumerate(old_objects):
+                cost_matrix[i][j] = 1 - self._calc_objects_similarity(
+                    int_obj, old_obj, start_frame, overlap, dimension)
+
+        return cost_matrix
+
     def merge(self, objects, start_frame, overlap, dimension):
         # 1. Split objects on two parts: new and which can be intersected
         # with existing objects.
@@ -271,13 +283,9 @@ class ObjectManager:
             if frame in old_objects_by_frame:
                 int_objects = int_objects_by_frame[frame]
                 old_objects = old_objects_by_frame[frame]
-                cost_matrix = np.empty(shape=(len(int_objects), len(old_objects)),
-                    dtype=float)
                 # 5.1 Construct cost matrix for the frame.
-                for i, int_obj in enumerate(int_objects):
-                    for j, old_obj in enumerate(old_objects):
-                        cost_matrix[i][j] = 1 - self._calc_objects_similarity(
-                            int_obj, old_obj, start_frame, overlap, dimension)
+                cost_matrix = self._calc_cost_matrix(int_objects, old_objects,
+                    start_frame, overlap, dimension)
 
                 # 6. Find optimal solution using Hungarian algorithm.
                 row_ind, col_ind = linear_sum_assignment(cost_matrix)
@@ -328,6 +336,65 @@ def pairwise(iterable):
     a = iter(iterable)
     return zip(a, a)
 
+def _calc_pairwise_boxes_similarity(boxes0: np.ndarray, boxes1: np.ndarray) -> np.ndarray:
+    """
+    Computes IoU for each pair of the axis-aligned boxes
+    from the (N, 4) and (M, 4) arrays of (x0, y0, x1, y1) coordinates.
+    """
+
+    def _normalize(boxes):
+        return np.concatenate([
+            np.minimum(boxes[:, :2], boxes[:, 2:]),
+            np.maximum(boxes[:, :2], boxes[:, 2:]),
+        ], axis=1)
+
+    boxes0 = _normalize(boxes0)
+    boxes1 = _normalize(boxes1)
+    area0 = (boxes0[:, 2] - boxes0[:, 0]) * (boxes0[:, 3] - boxes0[:, 1])
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+
+    top_left = np.maximum(boxes0[:, np.newaxis, :2], boxes1[np.newaxis, :, :2])
+    bottom_right = np.minimum(boxes0[:, np.newaxis, 2:], boxes1[np.newaxis, :, 2:])
+    overlap_size = np.clip(bottom_right - top_left, 0, None)
+    overlap_area = overlap_size[:, :, 0] * overlap_size[:, :, 1]
+
+    # degenerate boxes are not similar to anything
+    is_valid = (area0 > 0)[:, np.newaxis] & (area1 > 0)[np.newaxis, :]
+    union_area = np.where(is_valid,
+        area0[:, np.newaxis] + area1[np.newaxis, :] - overlap_area, 1)
+    return np.where(is_valid, overlap_area / union_area, 0)
+
+def _calc_pairwise_polygons_similarity(polygons0: list, polygons1: list) -> np.ndarray:
+    """
+    Computes IoU for each pair of the polygons.
+    Only the pairs with intersecting bounding boxes are compared.
+    """
+
+    similarity = np.zeros(shape=(len(polygons0), len(polygons1)), dtype=float)
+
+    # invalid polygons and lines with many points are not similar to anything
+    valid_polygons1 = [(j, p) for j, p in enumerate(polygons1) if p.is_valid and p.area != 0]
+    if not valid_polygons1:
+        return similarity
+
+    tree = STRtree([p for _, p in valid_polygons1])
+    polygon_indices1 = {id(p): j for j, p in valid_polygons1}
+
+    for i, p0 in enumerate(polygons0):
+        if not p0.is_valid or p0.area == 0:
+            continue
+
+        prepared_p0 = prep(p0)
+        for p1 in tree.query(p0):
+            if not prepared_p0.intersects(p1):
+                continue
+
+            overlap_area = p0.intersection(p1).area
+            similarity[i, polygon_indices1[id(p1)]] = \
+                overlap_area / (p0.area + p1.area - overlap_area)
+
+    return similarity
+
 class ShapeManager(ObjectManager):
     def to_tracks(self):
         tracks = []
@@ -430,6 +497,61 @@ class ShapeManager(ObjectManager):
                 return 0 # FIXME: need some similarity for points, polylines, ellipses and 2D cuboids
         return 0
 
+    def _calc_cost_matrix(self, int_objects, old_objects, start_frame, overlap, dimension):
+        # Only the shapes of the same type and label can be similar,
+        # so the similarity is computed for each such group of shapes at once.
+        # The results are the same as from _calc_objects_similarity()
+        def _group_objects(objects):
+            groups = {}
+            for idx, obj in enumerate(objects):
+                groups.setdefault((obj["type"], obj.get("label_id")), []).append(idx)
+            return groups
+
+        def _get_points(objects, indices, count):
+            return np.array([objects[idx]["points"][:count] for idx in indices], dtype=float)
+
+        def _get_cuboid_views(points):
+            center = points[:, 0:3]
+            half_size = points[:, 6:9] / 2
+            top_view = np.concatenate([
+                center[:, [0, 1]] - half_size[:, [0, 1]],
+                center[:, [0, 1]] + half_size[:, [0, 1]],
+            ], axis=1)
+            side_view = np.concatenate([
+                center[:, [0, 2]] - half_size[:, [0, 2]],
+                center[:, [0, 2]] + half_size[:, [0, 2]],
+            ], axis=1)
+            return top_view, side_view
+
+        cost_matrix = np.ones(shape=(len(int_objects), len(old_objects)), dtype=float)
+
+        old_groups = _group_objects(old_objects)
+        for (shape_type, label_id), int_indices in _group_objects(int_objects).items():
+            old_indices = old_groups.get((shape_type, label_id))
+            if not old_indices:
+                continue
+
+            if shape_type == ShapeType.RECTANGLE:
+                # FIXME: need to consider rotated boxes
+                similarity = _calc_pairwise_boxes_similarity(
+                    _get_points(int_objects, int_indices, 4),
+                    _get_points(old_objects, old_indices, 4))
+            elif shape_type == ShapeType.CUBOID and dimension == DimensionType.DIM_3D:
+                top_view0, side_view0 = _get_cuboid_views(_get_points(int_objects, int_indices, 9))
+                top_view1, side_view1 = _get_cuboid_views(_get_points(old_objects, old_indices, 9))
+                similarity = _calc_pairwise_boxes_similarity(top_view0, top_view1) * \
+                    _calc_pairwise_boxes_similarity(side_view0, side_view1)
+            elif shape_type == ShapeType.POLYGON:
+                similarity = _calc_pairwise_polygons_similarity(
+                    [geometry.Polygon(pairwise(int_objects[i]["points"])) for i in int_indices],
+                    [geometry.Polygon(pairwise(old_objects[j]["points"])) for j in old_indices])
+            else:
+                continue
+
+            cost_matrix[np.ix_(int_indices, old_indices)] = 1 - similarity
+
+        return cost_matrix
+
     @staticmethod
     def _unite_objects(obj0, obj1):
         # TODO: improve the trivial implementation
@@ -0,0 +1,371 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Conversion of raw annotation table rows into the annotation IR.
+
+The functions here read the rows returned by `.values_list()` queries with
+the corresponding `*_FIELDS` columns. The result matches the output of
+the `Labeled*SerializerFromDB` serializers applied to the merged rows,
+but the rows are merged into compact records in one pass, without
+intermediate dicts for each row and attribute.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from cvat.apps.engine.models import ShapeType
+
+TAG_FIELDS = (
+    'id',
+    'frame',
+    'label_id',
+    'group',
+    'source',
+    'attribute__spec_id',
+    'attribute__value',
+    'attribute__id',
+)
+
+SHAPE_FIELDS = (
+    'id',
+    'label_id',
+    'type',
+    'frame',
+    'group',
+    'source',
+    'occluded',
+    'outside',
+    'z_order',
+    'rotation',
+    'points',
+    'parent',
+    'attribute__spec_id',
+    'attribute__value',
+    'attribute__id',
+)
+
+TRACK_FIELDS = (
+    'id',
+    'frame',
+    'label_id',
+    'group',
+    'source',
+    'parent',
+    'attribute__spec_id',
+    'attribute__value',
+    'attribute__id',
+    'shape__type',
+    'shape__occluded',
+    'shape__z_order',
+    'shape__rotation',
+    'shape__points',
+    'shape__id',
+    'shape__frame',
+    'shape__outside',
+    'shape__attribute__spec_id',
+    'shape__attribute__value',
+    'shape__attribute__id',
+)
+
+_SKELETON_TYPE = str(ShapeType.SKELETON)
+
+# (spec_id, value) pairs
+_AttributeValues = list[tuple[int, str]]
+
+
+class _DefaultAttributes:
+    """
+    Caches the default attribute values of labels as (spec_id, value) pairs.
+    The attribute specs are expected in the JobAnnotation.db_attributes format.
+    """
+
+    __slots__ = ('_db_attributes', '_kind', '_cache')
+
+    def __init__(self, db_attributes: Mapping[int, Mapping[str, Mapping]], kind: str):
+        self._db_attributes = db_attributes
+        self._kind = kind
+        self._cache = {}
+
+    def get(self, label_id: int) -> _AttributeValues:
+        values = self._cache.get(label_id)
+        if values is None:
+            values = [
+                (db_attr.spec_id, db_attr.value)
+                for db_attr in self._db_attributes[label_id][self._kind].values()
+            ]
+            self._cache[label_id] = values
+
+        return values
+
+
+def _extend_attributes(attributes: _AttributeValues, defaults: Iterable[tuple[int, str]]):
+    present_specs = set(spec_id for spec_id, _ in attributes)
+    for spec_id, value in defaults:
+        if spec_id not in present_specs:
+            attributes.append((spec_id, value))
+
+
+def _deduplicate_attributes(attributes_by_id: dict[int, tuple[int, str]]) -> _AttributeValues:
+    # The joined track rows repeat each attribute row many times. The attributes
+    # used to be deduplicated with a set of objects hashed by id,
+    # keep the same ordering here.
+    return [attributes_by_id[attr_id] for attr_id in set(list(attributes_by_id))]
+
+
+def _represent_attributes(attributes: _AttributeValues) -> list[dict[str, Any]]:
+    return [{'spec_id': spec_id, 'value': value} for spec_id, value in attributes]
+
+
+class _TagRecord:
+    __slots__ = ('id', 'label_id', 'frame', 'group', 'source', 'attributes')
+
+    def __init__(self, id, label_id, frame, group, source):
+        self.id = id
+        self.label_id = label_id
+        self.frame = frame
+        self.group = group
+        self.source = source
+        self.attributes = []
+
+    def to_representation(self) -> dict[str, Any]:
+        return {
+            'id': self.id,
+            'label_id': self.label_id,
+            'frame': self.frame,
+            'group': self.group,
+            'source': self.source,
+            'attributes': _represent_attributes(self.attributes),
+        }
+
+
+class _ShapeRecord:
+    __slots__ = (
+        'id', 'label_id', 'type', 'frame', 'group', 'source',
+        'occluded', 'outside', 'z_order', 'rotation', 'points', 'parent',
+        'attributes', 'elements',
+    )
+
+    def __init__(self, id, label_id, type, frame, group, source,
+        occluded, outside, z_order, rotation, points, parent
+    ):
+        self.id = id
+        self.label_id = label_id
+        self.type = type
+        self.frame = frame
+        self.group = group
+        self.source = source
+        self.occluded = occluded
+        self.outside = outside
+        self.z_order = z_order
+        self.rotation = rotation
+        self.points = points
+        self.parent = parent
+        self.attributes = []
+        self.elements = []
+
+    def to_representation(self) -> dict[str, Any]:
+        result = {
+            'id': self.id,
+            'label_id': self.label_id,
+            'type': self.type,
+            'frame': self.frame,
+            'group': self.group,
+            'source': self.source,
+            'occluded': self.occluded,
+            'outside': self.outside,
+            'z_order': self.z_order,
+            'rotation': self.rotation,
+            'points': self.points,
+            'attributes': _represent_attributes(self.attributes),
+        }
+        if self.parent is None:
+            result['elements'] = [element.to_representation() for element in self.elements]
+        return result
+
+
+class _TrackedShapeRecord:
+    __slots__ = (
+        'id', 'type', 'frame', 'occluded', 'outside', 'z_order', 'rotation', 'points',
+        'attributes_by_id',
+    )
+
+    def __init__(self, id, type, frame, occluded, outside, z_order, rotation, points):
+        self.id = id
+        self.type = type
+        self.frame = frame
+        self.occluded = occluded
+        self.outside = outside
+        self.z_order = z_order
+        self.rotation = rotation
+        self.points = points
+        self.attributes_by_id = {}
+
+    def to_representation(self, attributes: _AttributeValues) -> dict[str, Any]:
+        return {
+            'id': self.id,
+            'type': self.type,
+            'frame': self.frame,
+            'occluded': self.occluded,
+            'outside': self.outside,
+            'z_order': self.z_order,
+            'rotation': self.rotation,
+            'points': [] if self.type == _SKELETON_TYPE else self.points,
+            'attributes': _represent_attributes(attributes),
+        }
+
+
+class _TrackRecord:
+    __slots__ = (
+        'id', 'label_id', 'frame', 'group', 'source', 'parent',
+        'attributes_by_id', 'shapes', 'elements',
+    )
+
+    def __init__(self, id, label_id, frame, group, source, parent):
+        self.id = id
+        self.label_id = label_id
+        self.frame = frame
+        self.group = group
+        self.source = source
+        self.parent = parent
+        self.attributes_by_id = {}
+        self.shapes = {}
+        self.elements = []
+
+    def to_representation(
+        self, immutable_defaults: _DefaultAttributes, mutable_defaults: _DefaultAttributes
+    ) -> dict[str, Any]:
+        attributes = _deduplicate_attributes(self.attributes_by_id)
+        _extend_attributes(attributes, immutable_defaults.get(self.label_id))
+
+        # tracked shapes inherit the missing mutable attribute values
+        # from the previous shape, and the first one - from the defaults
+        shapes = []
+        previous_attributes = mutable_defaults.get(self.label_id)
+        for shape in self.shapes.values():
+            shape_attributes = _deduplicate_attributes(shape.attributes_by_id)
+            _extend_attributes(shape_attributes, previous_attributes)
+            shapes.append(shape.to_representation(shape_attributes))
+            previous_attributes = shape_attributes
+
+        result = {
+            'id': self.id,
+            'label_id': self.label_id,
+            'frame': self.frame,
+            'group': self.group,
+            'source': self.source,
+            'shapes': shapes,
+            'attributes': _represent_attributes(attributes),
+        }
+        if self.parent is None:
+            result['elements'] = [
+                element.to_representation(immutable_defaults, mutable_defaults)
+                for element in self.elements
+            ]
+        return result
+
+
+def convert_tags(
+    rows: Iterable[tuple], db_attributes: Mapping[int, Mapping[str, Mapping]]
+) -> list[dict[str, Any]]:
+    tags: dict[int, _TagRecord] = {}
+    for (
+        tag_id, frame, label_id, group, source,
+        attr_spec_id, attr_value, attr_id,
+    ) in rows:
+        tag = tags.get(tag_id)
+        if tag is None:
+            tag = _TagRecord(tag_id, label_id, frame, group, source)
+            tags[tag_id] = tag
+
+        if attr_id is not None:
+            tag.attributes.append((attr_spec_id, attr_value))
+
+    defaults = _DefaultAttributes(db_attributes, 'all')
+    for tag in tags.values():
+        _extend_attributes(tag.attributes, defaults.get(tag.label_id))
+
+    return [tag.to_representation() for tag in tags.values()]
+
+
+def convert_shapes(
+    rows: Iterable[tuple], db_attributes: Mapping[int, Mapping[str, Mapping]]
+) -> list[dict[str, Any]]:
+    all_shapes: dict[int, _ShapeRecord] = {}
+    for (
+        shape_id, label_id, shape_type, frame, group, source,
+        occluded, outside, z_order, rotation, points, parent,
+        attr_spec_id, attr_value, attr_id,
+    ) in rows:
+        shape = all_shapes.get(shape_id)
+        if shape is None:
+            if shape_type == _SKELETON_TYPE:
+                # skeletons themselves should not have points as they consist of other elements
+                # here we ensure that it was initialized correctly
+                points = []
+
+            shape = _ShapeRecord(shape_id, label_id, shape_type, frame, group, source,
+                occluded, outside, z_order, rotation, points, parent)
+            all_shapes[shape_id] = shape
+
+        if attr_id is not None:
+            shape.attributes.append((attr_spec_id, attr_value))
+
+    defaults = _DefaultAttributes(db_attributes, 'all')
+    shapes = {}
+    for shape in all_shapes.values():
+        _extend_attributes(shape.attributes, defaults.get(shape.label_id))
+
+        if shape.parent is None:
+            shapes[shape.id] = shape
+        else:
+            all_shapes[shape.parent].elements.append(shape)
+
+    return [shape.to_representation() for shape in shapes.values()]
+
+
+def convert_tracks(
+    rows: Iterable[tuple], db_attributes: Mapping[int, Mapping[str, Mapping]]
+) -> list[dict[str, Any]]:
+    all_tracks: dict[int, _TrackRecord] = {}
+    for (
+        track_id, frame, label_id, group, source, parent,
+        attr_spec_id, attr_value, attr_id,
+        shape_type, shape_occluded, shape_z_order, shape_rotation, shape_points,
+        shape_id, shape_frame, shape_outside,
+        shape_attr_spec_id, shape_attr_value, shape_attr_id,
+    ) in rows:
+        track = all_tracks.get(track_id)
+        if track is None:
+            track = _TrackRecord(track_id, label_id, frame, group, source, parent)
+            all_tracks[track_id] = track
+
+        if attr_id is not None and attr_id not in track.attributes_by_id:
+            track.attributes_by_id[attr_id] = (attr_spec_id, attr_value)
+
+        if shape_id is not None:
+            shape = track.shapes.get(shape_id)
+            if shape is None:
+                shape = _TrackedShapeRecord(shape_id, shape_type, shape_frame,
+                    shape_occluded, shape_outside, shape_z_order, shape_rotation, shape_points)
+                track.shapes[shape_id] = shape
+
+            if shape_attr_id is not None and shape_attr_id not in shape.attributes_by_id:
+                shape.attributes_by_id[shape_attr_id] = (shape_attr_spec_id, shape_attr_value)
+
+    tracks = {}
+    for track in all_tracks.values():
+        if track.parent is None:
+            tracks[track.id] = track
+        else:
+            all_tracks[track.parent].elements.append(track)
+
+    immutable_defaults = _DefaultAttributes(db_attributes, 'immutable')
+    mutable_defaults = _DefaultAttributes(db_attributes, 'mutable')
+    return [
+        track.to_representation(immutable_defaults, mutable_defaults)
+        for track in tracks.values()
+    ]
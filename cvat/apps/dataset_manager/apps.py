@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: MIT
 
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
 
 
 class DatasetManagerConfig(AppConfig):
@@ -16,3 +17,8 @@ class DatasetManagerConfig(AppConfig):
         for key in dir(default_settings):
             if key.isupper() and not hasattr(settings, key):
                 setattr(settings, key, getattr(default_settings, key))
+
+        if settings.DATASET_EXPORT_MEDIA_WORKERS < 1:
+            raise ImproperlyConfigured(
+                'The CVAT_DATASET_EXPORT_MEDIA_WORKERS environment variable must be greater than 0'
+            )
@@ -13,8 +13,8 @@ from functools import reduce
 from operator import add
 from pathlib import Path
 from types import SimpleNamespace
-from typing import (Any, Callable, DefaultDict, Dict, Iterable, List, Literal, Mapping,
-                    NamedTuple, Optional, OrderedDict, Sequence, Set, Tuple, Union)
+from typing import (Any, Callable, DefaultDict, Dict, Iterable, Iterator, List, Literal,
+                    Mapping, NamedTuple, Optional, OrderedDict, Sequence, Set, Tuple, Union)
 
 from attrs.converters import to_bool
 import datumaro as dm
@@ -403,67 +403,70 @@ class CommonData(InstanceLabelData):
             type=label.type
         )
 
-    def group_by_frame(self, include_empty: bool = False):
-        frames = {}
-        def get_frame(idx):
-            frame_info = self._frame_info[idx]
-            frame = self.abs_frame_id(idx)
-            if frame not in frames:
-                frames[frame] = CommonData.Frame(
-                    idx=idx,
-                    id=frame_info.get("id", 0),
-                    subset=frame_info["subset"],
-                    frame=frame,
-                    name=frame_info["path"],
-                    height=frame_info["height"],
-                    width=frame_info["width"],
-                    labeled_shapes=[],
-                    tags=[],
-                    shapes=[],
-                    labels={}
-                )
-            return frames[frame]
+    def group_by_frame(self, include_empty: bool = False) -> Iterator[CommonData.Frame]:
+        """
+        Yields the frames with their annotations in the frame order.
+        The annotations are exported only for the frame being yielded,
+        so the consumers can process big tasks frame by frame.
+        """
 
         included_frames = self.get_included_frames()
 
-        if include_empty:
-            for idx in sorted(set(self._frame_info) & included_frames):
-                get_frame(idx)
-
         anno_manager = AnnotationManager(self._annotation_ir)
-        for shape in sorted(
-            anno_manager.to_shapes(self.stop, self._annotation_ir.dimension,
-                # Skip outside, deleted and excluded frames
-                included_frames=included_frames,
-                include_outside=False,
-                use_server_track_ids=self._use_server_track_ids
-            ),
-            key=lambda shape: shape.get("z_order", 0)
+        shapes_by_frame: Dict[int, List[dict]] = {}
+        for shape in anno_manager.to_shapes(self.stop, self._annotation_ir.dimension,
+            # Skip outside, deleted and excluded frames
+            included_frames=included_frames,
+            include_outside=False,
+            use_server_track_ids=self._use_server_track_ids
         ):
-            shape_data = ''
-
-            if 'track_id' in shape:
-                if shape['outside']:
-                    continue
-                exported_shape = self._export_tracked_shape(shape)
-            else:
-                exported_shape = self._export_labeled_shape(shape)
-                shape_data = self._export_shape(shape)
-
-            get_frame(shape['frame']).labeled_shapes.append(exported_shape)
+            if 'track_id' in shape and shape['outside']:
+                continue
 
-            if shape_data:
-                get_frame(shape['frame']).shapes.append(shape_data)
-                for label in self._label_mapping.values():
-                    label = self._export_label(label)
-                    get_frame(shape['frame']).labels.update({label.id: label})
+            shapes_by_frame.setdefault(shape['frame'], []).append(shape)
 
+        tags_by_frame: Dict[int, List[dict]] = {}
         for tag in self._annotation_ir.tags:
             if tag['frame'] not in included_frames:
                 continue
-            get_frame(tag['frame']).tags.append(self._export_tag(tag))
 
-        return iter(frames.values())
+            tags_by_frame.setdefault(tag['frame'], []).append(tag)
+
+        labels = {
+            label.id: label
+            for label in map(self._export_label, self._label_mapping.values())
+        }
+
+        frame_ids = set(shapes_by_frame).union(tags_by_frame)
+        if include_empty:
+            frame_ids.update(set(self._frame_info) & included_frames)
+
+        for idx in sorted(frame_ids):
+            labeled_shapes = []
+            shapes = []
+            for shape in sorted(
+                shapes_by_frame.pop(idx, []), key=lambda shape: shape.get("z_order", 0)
+            ):
+                if 'track_id' in shape:
+                    labeled_shapes.append(self._export_tracked_shape(shape))
+                else:
+                    labeled_shapes.append(self._export_labeled_shape(shape))
+                    shapes.append(self._export_shape(shape))
+
+            frame_info = self._frame_info[idx]
+            yield CommonData.Frame(
+                idx=idx,
+                id=frame_info.get("id", 0),
+                subset=frame_info["subset"],
+                frame=self.abs_frame_id(idx),
+                name=frame_info["path"],
+                height=frame_info["height"],
+                width=frame_info["width"],
+                labeled_shapes=labeled_shapes,
+                tags=[self._export_tag(tag) for tag in tags_by_frame.get(idx, [])],
+                shapes=shapes,
+                labels=dict(labels) if shapes else {},
+            )
 
     @property
     def shapes(self):
@@ -1492,6 +1495,13 @@ class CVATDataExtractorMixin:
 
 
 class CvatTaskOrJobDataExtractor(dm.SourceExtractor, CVATDataExtractorMixin):
+    """
+    Provides the task or job frames as dataset items.
+
+    The items are created on iteration, frame by frame, so only the current item
+    and its annotations are kept in memory by the extractor.
+    """
+
     def __init__(
         self,
         instance_data: CommonData,
@@ -1509,31 +1519,38 @@ class CvatTaskOrJobDataExtractor(dm.SourceExtractor, CVATDataExtractorMixin):
         )
         CVATDataExtractorMixin.__init__(self, **kwargs)
 
+        self._instance_data = instance_data
         self._categories = self._load_categories(instance_meta['labels'])
         self._user = self._load_user_info(instance_meta) if dimension == DimensionType.DIM_3D else {}
         self._dimension = dimension
         self._format_type = format_type
-        dm_items = []
+        self._include_images = include_images
+        self._length = None
 
         is_video = instance_meta['mode'] == 'interpolation'
-        ext = ''
+        self._ext = ''
         if is_video:
-            ext = FrameProvider.VIDEO_FRAME_EXT
+            self._ext = FrameProvider.VIDEO_FRAME_EXT
 
         if dimension == DimensionType.DIM_3D or include_images:
             self._image_provider = IMAGE_PROVIDERS_BY_DIMENSION[dimension](
                 {0: ImageSource(instance_data.db_data, is_video=is_video)}
             )
 
-        for frame_data in instance_data.group_by_frame(include_empty=True):
+    def __iter__(self):
+        instance_meta = self._instance_data.meta[self._instance_data.META_FIELD]
+        dimension = self._dimension
+        format_type = self._format_type
+
+        for frame_data in self._instance_data.group_by_frame(include_empty=True):
             image_args = {
-                'path': frame_data.name + ext,
+                'path': frame_data.name + self._ext,
                 'size': (frame_data.height, frame_data.width),
             }
 
             if dimension == DimensionType.DIM_3D:
                 dm_image = self._image_provider.get_image_for_frame(0, frame_data.id, **image_args)
-            elif include_images:
+            elif self._include_images:
                 dm_image = self._image_provider.get_image_for_frame(0, frame_data.idx, **image_args)
             else:
                 dm_image = dm.Image(**image_args)
@@ -1563,9 +1580,16 @@ class CvatTaskOrJobDataExtractor(dm.SourceExtractor, CVATDataExtractorMixin):
                     attributes=attributes, subset=frame_data.subset,
                 )
 
-            dm_items.append(dm_item)
+            yield dm_item
 
-        self._items = dm_items
+    def __len__(self):
+        if self._length is None:
+            # all the included frames are exported, including the empty ones
+            self._length = len(
+                self._instance_data.get_included_frames() & set(self._instance_data.frame_info)
+            )
+
+        return self._length
 
     def _read_cvat_anno(self, cvat_frame_anno: CommonData.Frame, labels: list):
         categories = self.categories()
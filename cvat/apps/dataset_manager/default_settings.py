@@ -4,6 +4,8 @@
 
 import os
 
+from attrs.converters import to_bool
+
 DATASET_CACHE_TTL = int(os.getenv("CVAT_DATASET_CACHE_TTL", 60 * 60 * 24))
 "Base lifetime for cached exported datasets, in seconds"
 
@@ -12,3 +14,9 @@ DATASET_CACHE_LOCK_TIMEOUT = int(os.getenv("CVAT_DATASET_CACHE_LOCK_TIMEOUT", 10
 
 DATASET_EXPORT_LOCKED_RETRY_INTERVAL = int(os.getenv("CVAT_DATASET_EXPORT_LOCKED_RETRY_INTERVAL", 60))
 "Retry interval for cases the export cache lock was unavailable, in seconds"
+
+DATASET_EXPORT_MEDIA_WORKERS = int(os.getenv("CVAT_DATASET_EXPORT_MEDIA_WORKERS", 4))
+"Number of media chunks decoded and encoded in parallel when images are included in an export"
+
+DATASET_EXPORT_VIDEO_FRAMES_AS_JPEG = to_bool(os.getenv("CVAT_DATASET_EXPORT_VIDEO_FRAMES_AS_JPEG", False))
+"Export video frames from the compressed JPEG chunks as is, instead of encoding the original frames as PNG"
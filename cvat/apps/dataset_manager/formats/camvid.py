@@ -29,7 +29,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
             save_images=save_images, apply_colormap=True,
             label_map={label: label_map[label][0] for label in label_map})
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='CamVid', ext='ZIP', version='1.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -31,7 +31,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
             apply_colormap=True, label_map={label: info[0]
                 for label, info in make_colormap(instance_data).items()})
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='Cityscapes', ext='ZIP', version='1.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -22,7 +22,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
         dataset.export(temp_dir, 'coco_instances', save_images=save_images,
             merge_images=False)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='COCO', ext='JSON, ZIP', version='1.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -46,7 +46,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
         dataset.export(temp_dir, 'coco_person_keypoints', save_images=save_images,
             merge_images=False)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='COCO Keypoints', ext='JSON, ZIP', version='1.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -3,12 +3,12 @@
 #
 # SPDX-License-Identifier: MIT
 
-import os
 import os.path as osp
 import zipfile
 from collections import OrderedDict
+from contextlib import closing
 from glob import glob
-from io import BufferedWriter
+from io import BufferedIOBase
 from typing import Callable
 
 from datumaro.components.annotation import (AnnotationType, Bbox, Label,
@@ -21,13 +21,15 @@ from datumaro.plugins.cvat_format.extractor import CvatImporter as _CvatImporter
 
 from datumaro.util.image import Image
 from defusedxml import ElementTree
+from django.conf import settings
 
 from cvat.apps.dataset_manager.bindings import (ProjectData, CommonData, detect_dataset,
                                                 get_defaulted_subset,
                                                 import_dm_annotations,
                                                 match_dm_item)
-from cvat.apps.dataset_manager.util import make_zip_archive
+from cvat.apps.dataset_manager.util import ZipArchiveWriter
 from cvat.apps.engine.frame_provider import FrameProvider
+from cvat.apps.engine.models import DataChoice
 
 from .registry import dm_env, exporter, importer
 
@@ -1364,56 +1366,61 @@ def dump_task_or_job_anno(dst_file, instance_data, callback):
     callback(dumper, instance_data)
     dumper.close_document()
 
-def dump_project_anno(dst_file: BufferedWriter, project_data: ProjectData, callback: Callable):
+def dump_project_anno(dst_file: BufferedIOBase, project_data: ProjectData, callback: Callable):
     dumper = create_xml_dumper(dst_file)
     dumper.open_document()
     callback(dumper, project_data)
     dumper.close_document()
 
-def dump_media_files(instance_data: CommonData, img_dir: str, project_data: ProjectData = None):
+def dump_media_files(instance_data: CommonData, archive: ZipArchiveWriter, img_dir: str,
+    project_data: ProjectData = None
+):
+    quality = FrameProvider.Quality.ORIGINAL
     ext = ''
     if instance_data.meta[instance_data.META_FIELD]['mode'] == 'interpolation':
-        ext = FrameProvider.VIDEO_FRAME_EXT
+        if (
+            settings.DATASET_EXPORT_VIDEO_FRAMES_AS_JPEG and
+            instance_data.db_data.compressed_chunk_type == DataChoice.IMAGESET
+        ):
+            # the compressed chunks contain the video frames as JPEG images
+            quality = FrameProvider.Quality.COMPRESSED
+            ext = '.jpg'
+        else:
+            ext = FrameProvider.VIDEO_FRAME_EXT
 
     frame_provider = FrameProvider(instance_data.db_data)
-    frames = frame_provider.get_frames(
+    frames = frame_provider.get_frames_parallel(
         instance_data.start, instance_data.stop,
-        frame_provider.Quality.ORIGINAL,
-        frame_provider.Type.BUFFER)
-    for frame_id, (frame_data, _) in zip(instance_data.rel_range, frames):
-        if (project_data is not None and (instance_data.db_instance.id, frame_id) in project_data.deleted_frames) \
-            or frame_id in instance_data.deleted_frames:
-            continue
-        frame_name = instance_data.frame_info[frame_id]['path'] if project_data is None \
-            else project_data.frame_info[(instance_data.db_instance.id, frame_id)]['path']
-        img_path = osp.join(img_dir, frame_name + ext)
-        os.makedirs(osp.dirname(img_path), exist_ok=True)
-        with open(img_path, 'wb') as f:
-            f.write(frame_data.getvalue())
+        quality, frame_provider.Type.BUFFER,
+        max_workers=settings.DATASET_EXPORT_MEDIA_WORKERS)
+    with closing(frames):
+        for frame_id, (frame_data, _) in zip(instance_data.rel_range, frames):
+            if (project_data is not None and (instance_data.db_instance.id, frame_id) in project_data.deleted_frames) \
+                or frame_id in instance_data.deleted_frames:
+                continue
+            frame_name = instance_data.frame_info[frame_id]['path'] if project_data is None \
+                else project_data.frame_info[(instance_data.db_instance.id, frame_id)]['path']
+            archive.write(osp.join(img_dir, frame_name + ext), frame_data.getbuffer())
 
 def _export_task_or_job(dst_file, temp_dir, instance_data, anno_callback, save_images=False):
-    with open(osp.join(temp_dir, 'annotations.xml'), 'wb') as f:
-        dump_task_or_job_anno(f, instance_data, anno_callback)
-
-    if save_images:
-        dump_media_files(instance_data, osp.join(temp_dir, 'images'))
+    with ZipArchiveWriter(dst_file) as archive:
+        with archive.open('annotations.xml') as f:
+            dump_task_or_job_anno(f, instance_data, anno_callback)
 
-    make_zip_archive(temp_dir, dst_file)
+        if save_images:
+            dump_media_files(instance_data, archive, 'images')
 
 def _export_project(dst_file: str, temp_dir: str, project_data: ProjectData,
     anno_callback: Callable, save_images: bool=False
 ):
-    with open(osp.join(temp_dir, 'annotations.xml'), 'wb') as f:
-        dump_project_anno(f, project_data, anno_callback)
-
-    if save_images:
-        for task_data in project_data.task_data:
-            subset = get_defaulted_subset(task_data.db_instance.subset, project_data.subsets)
-            subset_dir = osp.join(temp_dir, 'images', subset)
-            os.makedirs(subset_dir, exist_ok=True)
-            dump_media_files(task_data, subset_dir, project_data)
-
-    make_zip_archive(temp_dir, dst_file)
+    with ZipArchiveWriter(dst_file) as archive:
+        with archive.open('annotations.xml') as f:
+            dump_project_anno(f, project_data, anno_callback)
+
+        if save_images:
+            for task_data in project_data.task_data:
+                subset = get_defaulted_subset(task_data.db_instance.subset, project_data.subsets)
+                dump_media_files(task_data, archive, osp.join('images', subset), project_data)
 
 @exporter(name='CVAT for video', ext='ZIP', version='1.1')
 def _export_video(dst_file, temp_dir, instance_data, save_images=False):
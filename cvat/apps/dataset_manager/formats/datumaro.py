@@ -32,7 +32,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
             dataset.transform(DeleteImagePath)
         dataset.export(temp_dir, 'datumaro', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name="Datumaro", ext="ZIP", version="1.0")
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -57,7 +57,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
             dataset.transform(DeleteImagePath)
         dataset.export(temp_dir, 'datumaro', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name="Datumaro 3D", ext="ZIP", version="1.0", dimension=DimensionType.DIM_3D)
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -83,7 +83,7 @@ def _export_recognition(dst_file, temp_dir, instance_data, save_images=False):
         dataset.transform(LabelToCaption)
         dataset.export(temp_dir, 'icdar_word_recognition', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='ICDAR Recognition', ext='ZIP', version='1.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -105,7 +105,7 @@ def _export_localization(dst_file, temp_dir, instance_data, save_images=False):
         dataset = Dataset.from_extractors(extractor, env=dm_env)
         dataset.export(temp_dir, 'icdar_text_localization', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='ICDAR Localization', ext='ZIP', version='1.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -131,7 +131,7 @@ def _export_segmentation(dst_file, temp_dir, instance_data, save_images=False):
         dataset.transform('merge_instance_segments')
         dataset.export(temp_dir, 'icdar_text_segmentation', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='ICDAR Segmentation', ext='ZIP', version='1.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
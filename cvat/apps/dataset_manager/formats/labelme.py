@@ -20,7 +20,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
         dataset = Dataset.from_extractors(extractor, env=dm_env)
         dataset.export(temp_dir, 'label_me', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='LabelMe', ext='ZIP', version='3.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
@@ -29,4 +29,4 @@ def _exporter(dst_file, temp_dir, instance_data, save_images=False):
         dataset = Dataset.from_extractors(extractor, env=dm_env)
         dataset.export(temp_dir, format='lfw', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
@@ -99,7 +99,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
 
         dataset.export(temp_dir, 'mot_seq_gt', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='MOT', ext='ZIP', version='1.1')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
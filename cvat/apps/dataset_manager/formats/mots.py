@@ -104,7 +104,7 @@ def _export(dst_file, temp_dir, instance_data, save_images=False):
 
         dataset.export(temp_dir, 'mots_png', save_images=save_images)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 @importer(name='MOTS PNG', ext='ZIP', version='1.0')
 def _import(src_file, temp_dir, instance_data, load_data_callback=None, **kwargs):
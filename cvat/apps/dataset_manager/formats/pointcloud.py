@@ -24,7 +24,7 @@ def _export_images(dst_file, temp_dir, task_data, save_images=False):
         dataset = Dataset.from_extractors(extractor, env=dm_env)
         dataset.export(temp_dir, 'sly_pointcloud', save_images=save_images, allow_undeclared_attrs=True)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 
 @importer(name='Sly Point Cloud Format', ext='ZIP', version='1.0', dimension=DimensionType.DIM_3D)
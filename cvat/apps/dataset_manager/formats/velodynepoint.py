@@ -35,7 +35,7 @@ def _export_images(dst_file, temp_dir, task_data, save_images=False):
         dataset.transform(RemoveTrackingInformation)
         dataset.export(temp_dir, 'kitti_raw', save_images=save_images, reindex=True)
 
-    make_zip_archive(temp_dir, dst_file)
+    make_zip_archive(temp_dir, dst_file, move_files=True)
 
 
 @importer(name='Kitti Raw Format', ext='ZIP', version='1.0', dimension=DimensionType.DIM_3D)
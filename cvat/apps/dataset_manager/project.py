@@ -34,7 +34,7 @@ def export_project(project_id, dst_file, format_name,
     # https://github.com/cvat-ai/cvat/issues/217
     with transaction.atomic():
         project = ProjectAnnotationAndData(project_id)
-        project.init_from_db()
+        project.init_from_db(use_job_cache=True)
 
     exporter = make_exporter(format_name)
     with open(dst_file, 'wb') as f:
@@ -121,12 +121,12 @@ class ProjectAnnotationAndData:
         if attributes:
             models.AttributeSpec.objects.bulk_create([a[1] for a in attributes])
 
-    def init_from_db(self):
+    def init_from_db(self, *, use_job_cache: bool = False):
         self.reset()
 
         for task in self.db_tasks:
             annotation = TaskAnnotation(pk=task.id)
-            annotation.init_from_db()
+            annotation.init_from_db(use_job_cache=use_job_cache)
             self.task_annotations[task.id] = annotation
             self.annotation_irs[task.id] = annotation.ir_data
 
@@ -3,11 +3,18 @@
 #
 # SPDX-License-Identifier: MIT
 
+import hashlib
+import json
 import os
+import os.path as osp
 from collections import OrderedDict
+from contextlib import suppress
 from copy import deepcopy
 from enum import Enum
-from tempfile import TemporaryDirectory
+from itertools import groupby
+from operator import itemgetter
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from typing import Optional
 from datumaro.components.errors import DatasetError, DatasetImportError, DatasetNotFoundError
 
 from django.db import transaction
@@ -15,13 +22,14 @@ from django.db.models.query import Prefetch
 from django.conf import settings
 from rest_framework.exceptions import ValidationError
 
-from cvat.apps.engine import models, serializers
+from cvat.apps.engine import models
 from cvat.apps.engine.plugins import plugin_decorator
 from cvat.apps.engine.log import DatasetLogManager
 from cvat.apps.engine.utils import chunked_list
 from cvat.apps.events.handlers import handle_annotations_change
 from cvat.apps.profiler import silk_profile
 
+from cvat.apps.dataset_manager import annotation_rows
 from cvat.apps.dataset_manager.annotation import AnnotationIR, AnnotationManager
 from cvat.apps.dataset_manager.bindings import TaskData, JobData, CvatImportError, CvatDatasetNotFoundError
 from cvat.apps.dataset_manager.formats.registry import make_exporter, make_importer
@@ -77,6 +85,28 @@ def merge_table_rows(rows, keys_for_merge, field_id):
 
     return list(merged_rows.values())
 
+class _RowsByJob:
+    """
+    Splits the rows of a task-wide query ordered by job_id into per-job groups.
+    The job_id is expected in the first column, it is removed from the returned rows.
+    The groups must be requested in the increasing job id order.
+    """
+
+    def __init__(self, rows):
+        self._groups = groupby(rows, key=itemgetter(0))
+        self._current_group = next(self._groups, None)
+
+    def get(self, job_id: int) -> list:
+        while self._current_group is not None and self._current_group[0] < job_id:
+            self._current_group = next(self._groups, None)
+
+        if self._current_group is None or self._current_group[0] != job_id:
+            return []
+
+        rows = [row[1:] for row in self._current_group[1]]
+        self._current_group = next(self._groups, None)
+        return rows
+
 class JobAnnotation:
     @classmethod
     def add_prefetch_info(cls, queryset):
@@ -128,9 +158,13 @@ class JobAnnotation:
             for db_label in (db_segment.task.project.label_set.all()
             if db_segment.task.project_id else db_segment.task.label_set.all())}
 
-        self.db_attributes = {}
-        for db_label in self.db_labels.values():
-            self.db_attributes[db_label.id] = {
+        self.db_attributes = self._get_db_attributes(self.db_labels.values())
+
+    @staticmethod
+    def _get_db_attributes(db_labels):
+        db_attributes = {}
+        for db_label in db_labels:
+            db_attributes[db_label.id] = {
                 "mutable": OrderedDict(),
                 "immutable": OrderedDict(),
                 "all": OrderedDict(),
@@ -141,11 +175,13 @@ class JobAnnotation:
                     ('value', db_attr.default_value),
                 ])
                 if db_attr.mutable:
-                    self.db_attributes[db_label.id]["mutable"][db_attr.id] = default_value
+                    db_attributes[db_label.id]["mutable"][db_attr.id] = default_value
                 else:
-                    self.db_attributes[db_label.id]["immutable"][db_attr.id] = default_value
+                    db_attributes[db_label.id]["immutable"][db_attr.id] = default_value
+
+                db_attributes[db_label.id]["all"][db_attr.id] = default_value
 
-                self.db_attributes[db_label.id]["all"][db_attr.id] = default_value
+        return db_attributes
 
     def reset(self):
         self.ir_data.reset()
@@ -516,199 +552,32 @@ class JobAnnotation:
 
         handle_annotations_change(self.db_job, deleted_data, "delete")
 
-    @staticmethod
-    def _extend_attributes(attributeval_set, default_attribute_values):
-        shape_attribute_specs_set = set(attr.spec_id for attr in attributeval_set)
-        for db_attr in default_attribute_values:
-            if db_attr.spec_id not in shape_attribute_specs_set:
-                attributeval_set.append(dotdict([
-                    ('spec_id', db_attr.spec_id),
-                    ('value', db_attr.value),
-                ]))
-
     def _init_tags_from_db(self):
-        # NOTE: do not use .prefetch_related() with .values() since it's useless:
+        # NOTE: do not use .prefetch_related() with .values_list() since it's useless:
         # https://github.com/cvat-ai/cvat/pull/7748#issuecomment-2063695007
-        db_tags = self.db_job.labeledimage_set.values(
-            'id',
-            'frame',
-            'label_id',
-            'group',
-            'source',
-            'attribute__spec_id',
-            'attribute__value',
-            'attribute__id',
+        db_tags = self.db_job.labeledimage_set.values_list(
+            *annotation_rows.TAG_FIELDS
         ).order_by('frame').iterator(chunk_size=2000)
 
-        db_tags = merge_table_rows(
-            rows=db_tags,
-            keys_for_merge={
-                "attributes": [
-                    'attribute__spec_id',
-                    'attribute__value',
-                    'attribute__id',
-                ],
-            },
-            field_id='id',
-        )
-
-        for db_tag in db_tags:
-            self._extend_attributes(db_tag.attributes,
-                self.db_attributes[db_tag.label_id]["all"].values())
-
-        serializer = serializers.LabeledImageSerializerFromDB(db_tags, many=True)
-        self.ir_data.tags = serializer.data
+        self.ir_data.tags = annotation_rows.convert_tags(db_tags, self.db_attributes)
 
     def _init_shapes_from_db(self):
-        # NOTE: do not use .prefetch_related() with .values() since it's useless:
+        # NOTE: do not use .prefetch_related() with .values_list() since it's useless:
         # https://github.com/cvat-ai/cvat/pull/7748#issuecomment-2063695007
-        db_shapes = self.db_job.labeledshape_set.values(
-            'id',
-            'label_id',
-            'type',
-            'frame',
-            'group',
-            'source',
-            'occluded',
-            'outside',
-            'z_order',
-            'rotation',
-            'points',
-            'parent',
-            'attribute__spec_id',
-            'attribute__value',
-            'attribute__id',
+        db_shapes = self.db_job.labeledshape_set.values_list(
+            *annotation_rows.SHAPE_FIELDS
         ).order_by('frame').iterator(chunk_size=2000)
 
-        db_shapes = merge_table_rows(
-            rows=db_shapes,
-            keys_for_merge={
-                'attributes': [
-                    'attribute__spec_id',
-                    'attribute__value',
-                    'attribute__id',
-                ],
-            },
-            field_id='id',
-        )
-
-        shapes = {}
-        elements = {}
-        for db_shape in db_shapes:
-            self._extend_attributes(db_shape.attributes,
-                self.db_attributes[db_shape.label_id]["all"].values())
-            if db_shape['type'] == str(models.ShapeType.SKELETON):
-                # skeletons themselves should not have points as they consist of other elements
-                # here we ensure that it was initialized correctly
-                db_shape['points'] = []
-
-            if db_shape.parent is None:
-                db_shape.elements = []
-                shapes[db_shape.id] = db_shape
-            else:
-                if db_shape.parent not in elements:
-                    elements[db_shape.parent] = []
-                elements[db_shape.parent].append(db_shape)
-
-        for shape_id, shape_elements in elements.items():
-            shapes[shape_id].elements = shape_elements
-
-        serializer = serializers.LabeledShapeSerializerFromDB(list(shapes.values()), many=True)
-        self.ir_data.shapes = serializer.data
+        self.ir_data.shapes = annotation_rows.convert_shapes(db_shapes, self.db_attributes)
 
     def _init_tracks_from_db(self):
-        # NOTE: do not use .prefetch_related() with .values() since it's useless:
+        # NOTE: do not use .prefetch_related() with .values_list() since it's useless:
         # https://github.com/cvat-ai/cvat/pull/7748#issuecomment-2063695007
-        db_tracks = self.db_job.labeledtrack_set.values(
-            "id",
-            "frame",
-            "label_id",
-            "group",
-            "source",
-            "parent",
-            "attribute__spec_id",
-            "attribute__value",
-            "attribute__id",
-            "shape__type",
-            "shape__occluded",
-            "shape__z_order",
-            "shape__rotation",
-            "shape__points",
-            "shape__id",
-            "shape__frame",
-            "shape__outside",
-            "shape__attribute__spec_id",
-            "shape__attribute__value",
-            "shape__attribute__id",
+        db_tracks = self.db_job.labeledtrack_set.values_list(
+            *annotation_rows.TRACK_FIELDS
         ).order_by('id', 'shape__frame').iterator(chunk_size=2000)
 
-        db_tracks = merge_table_rows(
-            rows=db_tracks,
-            keys_for_merge={
-                "attributes": [
-                    "attribute__spec_id",
-                    "attribute__value",
-                    "attribute__id",
-                ],
-                "shapes":[
-                    "shape__type",
-                    "shape__occluded",
-                    "shape__z_order",
-                    "shape__points",
-                    "shape__rotation",
-                    "shape__id",
-                    "shape__frame",
-                    "shape__outside",
-                    "shape__attribute__spec_id",
-                    "shape__attribute__value",
-                    "shape__attribute__id",
-                ],
-            },
-            field_id="id",
-        )
-
-        tracks = {}
-        elements = {}
-        for db_track in db_tracks:
-            db_track["shapes"] = merge_table_rows(db_track["shapes"], {
-                'attributes': [
-                    'attribute__value',
-                    'attribute__spec_id',
-                    'attribute__id',
-                ]
-            }, 'id')
-
-            # A result table can consist many equal rows for track/shape attributes
-            # We need filter unique attributes manually
-            db_track["attributes"] = list(set(db_track["attributes"]))
-            self._extend_attributes(db_track.attributes,
-                self.db_attributes[db_track.label_id]["immutable"].values())
-
-            default_attribute_values = self.db_attributes[db_track.label_id]["mutable"].values()
-            for db_shape in db_track["shapes"]:
-                db_shape["attributes"] = list(set(db_shape["attributes"]))
-                # in case of trackedshapes need to interpolate attribute values and extend it
-                # by previous shape attribute values (not default values)
-                self._extend_attributes(db_shape["attributes"], default_attribute_values)
-                if db_shape['type'] == str(models.ShapeType.SKELETON):
-                    # skeletons themselves should not have points as they consist of other elements
-                    # here we ensure that it was initialized correctly
-                    db_shape['points'] = []
-                default_attribute_values = db_shape["attributes"]
-
-            if db_track.parent is None:
-                db_track.elements = []
-                tracks[db_track.id] = db_track
-            else:
-                if db_track.parent not in elements:
-                    elements[db_track.parent] = []
-                elements[db_track.parent].append(db_track)
-
-        for track_id, track_elements in elements.items():
-            tracks[track_id].elements = track_elements
-
-        serializer = serializers.LabeledTrackSerializerFromDB(list(tracks.values()), many=True)
-        self.ir_data.tracks = serializer.data
+        self.ir_data.tracks = annotation_rows.convert_tracks(db_tracks, self.db_attributes)
 
     def _init_version_from_db(self):
         self.ir_data.version = 0 # FIXME: should be removed in the future
@@ -762,6 +631,79 @@ class JobAnnotation:
 
         self.create(job_data.data.slice(self.start_frame, self.stop_frame).serialize())
 
+class JobAnnotationsCache:
+    """
+    Keeps the job annotations read from the database in the job directories,
+    so that the following task and project exports only need to read
+    the jobs changed since then.
+
+    The cached annotations are invalidated by the job updated_date,
+    which is updated on each annotation change, and by the label attribute specs,
+    which define the default attribute values in the annotations.
+    """
+
+    CACHE_DIR_NAME = 'annotations_cache'
+    _VERSION = 1
+
+    def __init__(self, db_attributes, *, dimension: models.DimensionType):
+        self._signature = self._make_signature(db_attributes)
+        self._dimension = dimension
+
+    @classmethod
+    def _make_signature(cls, db_attributes) -> str:
+        signature = hashlib.sha1(str(cls._VERSION).encode())
+        for label_id, label_attributes in sorted(db_attributes.items()):
+            signature.update(json.dumps([
+                label_id,
+                [
+                    [spec_id, spec_id in label_attributes["mutable"], default_value.value]
+                    for spec_id, default_value in label_attributes["all"].items()
+                ]
+            ]).encode())
+        return signature.hexdigest()[:16]
+
+    def _get_cache_dir(self, db_job: models.Job) -> str:
+        return osp.join(db_job.get_dirname(), self.CACHE_DIR_NAME)
+
+    def _make_cache_path(self, db_job: models.Job) -> str:
+        return osp.join(self._get_cache_dir(db_job), 'annotations-instance{:f}-{}.json'.format(
+            db_job.updated_date.timestamp(), self._signature,
+        ))
+
+    def get(self, db_job: models.Job) -> Optional[AnnotationIR]:
+        try:
+            with open(self._make_cache_path(db_job), 'rb') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            # missing, removed by a concurrent update or incomplete
+            return None
+
+        return AnnotationIR(self._dimension, data)
+
+    def set(self, db_job: models.Job, data: AnnotationIR):
+        if not osp.isdir(db_job.get_dirname()):
+            return
+
+        cache_dir = self._get_cache_dir(db_job)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        cache_path = self._make_cache_path(db_job)
+        with NamedTemporaryFile('w', dir=cache_dir, suffix='.tmp', delete=False) as f:
+            json.dump({
+                'tags': data.tags,
+                'shapes': data.shapes,
+                'tracks': data.tracks,
+            }, f, separators=(',', ':'))
+        os.replace(f.name, cache_path)
+
+        # only the latest state of the job is needed
+        for filename in os.listdir(cache_dir):
+            path = osp.join(cache_dir, filename)
+            if path != cache_path and not filename.endswith('.tmp'):
+                with suppress(FileNotFoundError):
+                    os.remove(path)
+
+
 class TaskAnnotation:
     def __init__(self, pk):
         self.db_task = models.Task.objects.prefetch_related(
@@ -818,22 +760,77 @@ class TaskAnnotation:
             for db_job in self.db_jobs:
                 delete_job_data(db_job.id)
 
-    def init_from_db(self):
+    def init_from_db(self, *, use_job_cache: bool = False):
+        """
+        Reads the task annotations from the database.
+
+        With use_job_cache, the job annotations are reused from the previous reads,
+        only the jobs changed since then are read from the database.
+        """
+
         self.reset()
 
-        for db_job in self.db_jobs:
-            if db_job.type != models.JobType.ANNOTATION:
-                continue
-
-            annotation = JobAnnotation(db_job.id, is_prefetched=True)
-            annotation.init_from_db()
-            if annotation.ir_data.version > self.ir_data.version:
-                self.ir_data.version = annotation.ir_data.version
-            db_segment = db_job.segment
-            start_frame = db_segment.start_frame
-            overlap = self.db_task.overlap
-            dimension = self.db_task.dimension
-            self._merge_data(annotation.ir_data, start_frame, overlap, dimension)
+        # The job annotations are read with a few task-wide queries instead of
+        # a separate set of queries for each job. The rows are grouped by job
+        # and merged into the task annotations in the job id order.
+        db_jobs = self.db_jobs
+        if use_job_cache:
+            # The cached job annotations are keyed by the job updated date.
+            # The job rows are locked, so that the annotation changes can't be committed
+            # between reading the dates and reading the annotations.
+            # The segments are not locked.
+            db_jobs = db_jobs.select_for_update(of=('self',))
+        db_jobs = list(db_jobs)
+
+        db_labels = (
+            self.db_task.project.label_set if self.db_task.project_id else self.db_task.label_set
+        ).prefetch_related('attributespec_set')
+        db_attributes = JobAnnotation._get_db_attributes(db_labels)
+
+        job_cache = JobAnnotationsCache(
+            db_attributes, dimension=self.db_task.dimension
+        ) if use_job_cache else None
+        cached_job_data = {}
+        if job_cache:
+            for db_job in db_jobs:
+                if (job_data := job_cache.get(db_job)) is not None:
+                    cached_job_data[db_job.id] = job_data
+
+        job_ids = [db_job.id for db_job in db_jobs if db_job.id not in cached_job_data]
+
+        # NOTE: do not use .prefetch_related() with .values_list() since it's useless:
+        # https://github.com/cvat-ai/cvat/pull/7748#issuecomment-2063695007
+        db_tags = _RowsByJob(models.LabeledImage.objects.filter(job_id__in=job_ids).values_list(
+            'job_id', *annotation_rows.TAG_FIELDS
+        ).order_by('job_id', 'frame').iterator(chunk_size=2000) if job_ids else [])
+
+        db_shapes = _RowsByJob(models.LabeledShape.objects.filter(job_id__in=job_ids).values_list(
+            'job_id', *annotation_rows.SHAPE_FIELDS
+        ).order_by('job_id', 'frame').iterator(chunk_size=2000) if job_ids else [])
+
+        db_tracks = _RowsByJob(models.LabeledTrack.objects.filter(job_id__in=job_ids).values_list(
+            'job_id', *annotation_rows.TRACK_FIELDS
+        ).order_by('job_id', 'id', 'shape__frame').iterator(chunk_size=2000) if job_ids else [])
+
+        for db_job in db_jobs:
+            job_data = cached_job_data.get(db_job.id)
+            if job_data is None:
+                job_data = AnnotationIR(self.db_task.dimension)
+                job_data.tags = annotation_rows.convert_tags(
+                    db_tags.get(db_job.id), db_attributes
+                )
+                job_data.shapes = annotation_rows.convert_shapes(
+                    db_shapes.get(db_job.id), db_attributes
+                )
+                job_data.tracks = annotation_rows.convert_tracks(
+                    db_tracks.get(db_job.id), db_attributes
+                )
+
+                if job_cache:
+                    job_cache.set(db_job, job_data)
+
+            self._merge_data(job_data, db_job.segment.start_frame,
+                self.db_task.overlap, self.db_task.dimension)
 
     def export(self, dst_file, exporter, host='', **options):
         task_data = TaskData(
@@ -972,7 +969,7 @@ def export_task(task_id, dst_file, format_name, server_url=None, save_images=Fal
     # https://github.com/cvat-ai/cvat/issues/217
     with transaction.atomic():
         task = TaskAnnotation(task_id)
-        task.init_from_db()
+        task.init_from_db(use_job_cache=True)
 
     exporter = make_exporter(format_name)
     with open(dst_file, 'wb') as f:
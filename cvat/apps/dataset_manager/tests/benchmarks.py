@@ -0,0 +1,283 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Benchmarks for the annotation reading and export code.
+
+The module is not picked up by the default test discovery, run it explicitly:
+
+    python manage.py test --settings cvat.settings.testing \
+        cvat.apps.dataset_manager.tests.benchmarks
+
+The problem sizes can be adjusted in the class attributes.
+"""
+
+import random
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+from unittest import mock
+
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+
+from cvat.apps.dataset_manager import annotation_rows
+from cvat.apps.dataset_manager.annotation import (
+    AnnotationIR, AnnotationManager, ObjectManager, ShapeManager
+)
+from cvat.apps.dataset_manager.bindings import CvatTaskOrJobDataExtractor, TaskData
+from cvat.apps.dataset_manager.task import JobAnnotation, TaskAnnotation
+from cvat.apps.dataset_manager.tests.test_annotation import (
+    AnnotationRowsGenerator, serialize_db_shapes, serialize_db_tags, serialize_db_tracks
+)
+from cvat.apps.engine import models
+
+
+@contextmanager
+def _measure(name: str):
+    started = perf_counter()
+    yield
+    print(f"{name}: {perf_counter() - started:.2f}s")
+
+
+@contextmanager
+def _measure_memory(name: str):
+    tracemalloc.start()
+    started = perf_counter()
+    yield
+    elapsed = perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name}: {elapsed:.2f}s, peak memory {peak / 2**20:.1f}MB")
+
+
+class TaskAnnotationReadBenchmark(TestCase):
+    JOB_COUNT = 500
+    SHAPES_PER_JOB = 2000
+    SEGMENT_SIZE = 10
+    BATCH_SIZE = 10000
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+
+        db_data = models.Data.objects.create(
+            size=cls.JOB_COUNT * cls.SEGMENT_SIZE,
+            stop_frame=cls.JOB_COUNT * cls.SEGMENT_SIZE - 1,
+            chunk_size=cls.SEGMENT_SIZE,
+        )
+        cls.db_task = models.Task.objects.create(name="benchmark", data=db_data, mode="annotation",
+            overlap=0, segment_size=cls.SEGMENT_SIZE)
+
+        db_label = models.Label.objects.create(task=cls.db_task, name="car")
+        db_spec = models.AttributeSpec.objects.create(label=db_label, name="parked",
+            mutable=True, input_type=models.AttributeType.CHECKBOX,
+            default_value="false", values="false")
+
+        db_segments = models.Segment.objects.bulk_create(
+            models.Segment(task=cls.db_task,
+                start_frame=i * cls.SEGMENT_SIZE, stop_frame=(i + 1) * cls.SEGMENT_SIZE - 1)
+            for i in range(cls.JOB_COUNT)
+        )
+        db_jobs = models.Job.objects.bulk_create(
+            models.Job(segment=db_segment) for db_segment in db_segments
+        )
+
+        db_shapes = models.LabeledShape.objects.bulk_create((
+            models.LabeledShape(job=db_job, label=db_label,
+                frame=db_job.segment.start_frame + rng.randrange(cls.SEGMENT_SIZE),
+                type=models.ShapeType.RECTANGLE,
+                points=[rng.uniform(0, 100), rng.uniform(0, 100),
+                    rng.uniform(100, 200), rng.uniform(100, 200)])
+            for db_job in db_jobs
+            for _ in range(cls.SHAPES_PER_JOB)
+        ), batch_size=cls.BATCH_SIZE)
+        models.LabeledShapeAttributeVal.objects.bulk_create((
+            models.LabeledShapeAttributeVal(shape=db_shape, spec=db_spec,
+                value=rng.choice(["true", "false"]))
+            for db_shape in db_shapes
+        ), batch_size=cls.BATCH_SIZE)
+
+    def _read_job_by_job(self):
+        db_task = self.db_task
+        task_data = AnnotationIR(db_task.dimension)
+
+        for db_job in models.Job.objects.filter(segment__task=db_task).order_by('id'):
+            job_annotation = JobAnnotation(db_job.id)
+            job_annotation.init_from_db()
+            AnnotationManager(task_data).merge(job_annotation.ir_data,
+                db_job.segment.start_frame, db_task.overlap, db_task.dimension)
+
+        return task_data
+
+    def _read_task(self):
+        task_annotation = TaskAnnotation(self.db_task.id)
+        task_annotation.init_from_db()
+        return task_annotation.ir_data
+
+    def test_read_task_annotations(self):
+        print(f"\n{self.JOB_COUNT} jobs x {self.SHAPES_PER_JOB} shapes")
+
+        with transaction.atomic(), _measure("job by job"):
+            expected = self._read_job_by_job()
+
+        with transaction.atomic(), _measure("task-wide queries"):
+            actual = self._read_task()
+
+        self.assertEqual(len(actual.shapes), len(expected.shapes))
+
+
+class AnnotationRowsConversionBenchmark(SimpleTestCase):
+    MAX_OBJECTS = 20000
+    MAX_ATTRIBUTES = 5
+    SEED = 42
+
+    def _compare(self, name, get_rows, convert, reference_convert):
+        generator = AnnotationRowsGenerator(self.SEED,
+            max_objects=self.MAX_OBJECTS, max_attributes=self.MAX_ATTRIBUTES)
+        rows = get_rows(generator)
+        row_tuples = [tuple(row.values()) for row in rows]
+        print(f"\n{name}: {len(rows)} rows")
+
+        with _measure("merged rows and serializers"):
+            reference_convert(rows, generator.db_attributes)
+
+        with _measure("annotation_rows"):
+            convert(row_tuples, generator.db_attributes)
+
+    def test_convert_tags(self):
+        self._compare("tags", AnnotationRowsGenerator.tags,
+            annotation_rows.convert_tags, serialize_db_tags)
+
+    def test_convert_shapes(self):
+        self._compare("shapes", AnnotationRowsGenerator.shapes,
+            annotation_rows.convert_shapes, serialize_db_shapes)
+
+    def test_convert_tracks(self):
+        self._compare("tracks", AnnotationRowsGenerator.tracks,
+            annotation_rows.convert_tracks, serialize_db_tracks)
+
+
+def _make_task_data(frame_count: int, *, shapes_per_frame: int, label_count: int = 1) -> TaskData:
+    rng = random.Random(42)
+
+    db_data = models.Data.objects.create(size=frame_count, stop_frame=frame_count - 1)
+    models.Image.objects.bulk_create(
+        models.Image(data=db_data, path=f"images/{frame:06d}.jpg", frame=frame,
+            width=1920, height=1080)
+        for frame in range(frame_count)
+    )
+    db_task = models.Task.objects.create(name="benchmark", data=db_data, mode="annotation")
+    db_labels = models.Label.objects.bulk_create(
+        models.Label(task=db_task, name=f"label_{i}") for i in range(label_count)
+    )
+
+    annotations = AnnotationIR(db_task.dimension)
+    for frame in range(frame_count):
+        for _ in range(shapes_per_frame):
+            x, y = rng.uniform(0, 1800), rng.uniform(0, 1000)
+            annotations.add_shape({
+                "id": len(annotations.shapes) + 1, "type": models.ShapeType.RECTANGLE,
+                "frame": frame, "label_id": rng.choice(db_labels).id, "group": 0,
+                "source": "manual", "occluded": False, "outside": False,
+                "z_order": rng.randrange(3), "rotation": 0,
+                "points": [x, y, x + 100, y + 50], "attributes": [], "elements": [],
+            })
+
+    return TaskData(annotations, db_task)
+
+
+class TaskDataExtractorMemoryBenchmark(TestCase):
+    FRAME_COUNTS = [1000, 4000, 16000]
+    SHAPES_PER_FRAME = 20
+
+    def test_iterate_task_items(self):
+        print(f"\n{self.SHAPES_PER_FRAME} shapes per frame")
+
+        for frame_count in self.FRAME_COUNTS:
+            with transaction.atomic():
+                task_data = _make_task_data(frame_count, shapes_per_frame=self.SHAPES_PER_FRAME)
+
+                with CvatTaskOrJobDataExtractor(task_data) as extractor:
+                    with _measure_memory(f"{frame_count} frames, all items kept"):
+                        items = list(extractor)
+
+                    del items
+
+                    with _measure_memory(f"{frame_count} frames, streaming"):
+                        for _ in extractor:
+                            pass
+
+                transaction.set_rollback(True)
+
+
+class GroupByFrameBenchmark(TestCase):
+    FRAME_COUNT = 2000
+    SHAPES_PER_FRAME = 20
+    LABEL_COUNTS = [1, 100, 500]
+
+    def test_group_by_frame(self):
+        print(f"\n{self.FRAME_COUNT} frames x {self.SHAPES_PER_FRAME} shapes")
+
+        for label_count in self.LABEL_COUNTS:
+            with transaction.atomic():
+                task_data = _make_task_data(self.FRAME_COUNT,
+                    shapes_per_frame=self.SHAPES_PER_FRAME, label_count=label_count)
+
+                with _measure(f"{label_count} labels"):
+                    frame_count = sum(1 for _ in task_data.group_by_frame(include_empty=True))
+
+                self.assertEqual(frame_count, self.FRAME_COUNT)
+                transaction.set_rollback(True)
+
+
+class ShapeMergeBenchmark(SimpleTestCase):
+    FRAME_COUNT = 10
+    SHAPES_PER_FRAME = 300
+    LABEL_COUNT = 3
+
+    def _generate_shapes(self, rng: random.Random, shape_type: str) -> list:
+        shapes = []
+        for frame in range(self.FRAME_COUNT):
+            for _ in range(self.SHAPES_PER_FRAME):
+                x, y = rng.uniform(0, 1800), rng.uniform(0, 1000)
+                w, h = rng.uniform(10, 100), rng.uniform(10, 100)
+                if shape_type == models.ShapeType.RECTANGLE:
+                    points = [x, y, x + w, y + h]
+                else:
+                    points = [x, y, x + w, y, x + w / 2, y + h]
+
+                shapes.append({
+                    "type": shape_type, "frame": frame, "points": points,
+                    "label_id": rng.randrange(self.LABEL_COUNT),
+                })
+
+        return shapes
+
+    def _merge(self, shape_type: str) -> list:
+        rng = random.Random(42)
+        manager = ShapeManager(self._generate_shapes(rng, shape_type))
+        manager.merge(self._generate_shapes(rng, shape_type),
+            start_frame=0, overlap=self.FRAME_COUNT, dimension=models.DimensionType.DIM_2D)
+        return manager.objects
+
+    def _compare(self, shape_type: str):
+        print(f"\n{shape_type}: {self.FRAME_COUNT} frames x {self.SHAPES_PER_FRAME} shapes")
+
+        with (
+            mock.patch.object(ShapeManager, '_calc_cost_matrix', ObjectManager._calc_cost_matrix),
+            _measure("pairwise similarity"),
+        ):
+            expected = self._merge(shape_type)
+
+        with _measure("grouped similarity"):
+            actual = self._merge(shape_type)
+
+        self.assertEqual(actual, expected)
+
+    def test_merge_rectangles(self):
+        self._compare(str(models.ShapeType.RECTANGLE))
+
+    def test_merge_polygons(self):
+        self._compare(str(models.ShapeType.POLYGON))
@@ -1,8 +1,18 @@
 # Copyright (C) 2020-2022 Intel Corporation
+# Copyright (C) 2024 CVAT.ai Corporation
 #
 # SPDX-License-Identifier: MIT
 
-from cvat.apps.dataset_manager.annotation import TrackManager
+import json
+import random
+from collections import OrderedDict
+
+import numpy as np
+
+from cvat.apps.dataset_manager import annotation_rows
+from cvat.apps.dataset_manager.annotation import ObjectManager, ShapeManager, TrackManager
+from cvat.apps.dataset_manager.task import dotdict, merge_table_rows
+from cvat.apps.engine import models, serializers
 
 from unittest import TestCase
 
@@ -324,3 +334,329 @@ class TrackManagerTest(TestCase):
 
         interpolated_shapes = TrackManager.get_interpolated_shapes(track, 0, 3, '2d')
         self.assertEqual(expected_shapes, interpolated_shapes)
+
+
+class ShapeManagerTest(TestCase):
+    @staticmethod
+    def _generate_shapes(rng: random.Random, count: int, dimension: str) -> list:
+        shape_types = [models.ShapeType.RECTANGLE, models.ShapeType.POLYGON, models.ShapeType.POINTS]
+        if dimension == models.DimensionType.DIM_3D:
+            shape_types.append(models.ShapeType.CUBOID)
+
+        shapes = []
+        for _ in range(count):
+            shape_type = rng.choice(shape_types)
+            x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+            if shape_type == models.ShapeType.RECTANGLE:
+                # include degenerate and flipped boxes
+                points = [x, y, x + rng.choice([0, rng.uniform(1, 30)]), y + rng.uniform(1, 30)]
+                if rng.random() < 0.2:
+                    points = points[2:] + points[:2]
+            elif shape_type == models.ShapeType.POLYGON:
+                points = [x, y, x + rng.uniform(5, 30), y, x + rng.uniform(0, 30), y + rng.uniform(5, 30)]
+                if rng.random() < 0.1:
+                    points = [x, y, x + 5, y + 5, x + 10, y + 10] # a line
+            elif shape_type == models.ShapeType.CUBOID:
+                points = [x, y, rng.uniform(0, 100), 0, 0, 0] + \
+                    [rng.uniform(1, 30) for _ in range(3)] + [0] * 7
+            else:
+                points = [x, y]
+
+            shapes.append({
+                "type": str(shape_type), "label_id": rng.choice([1, 2]),
+                "frame": 0, "points": points,
+            })
+
+        return shapes
+
+    def test_cost_matrix_matches_pairwise_similarity(self):
+        rng = random.Random(42)
+
+        for dimension in [models.DimensionType.DIM_2D, models.DimensionType.DIM_3D]:
+            for _ in range(20):
+                int_shapes = self._generate_shapes(rng, rng.randint(1, 30), dimension)
+                old_shapes = self._generate_shapes(rng, rng.randint(1, 30), dimension)
+                manager = ShapeManager([])
+
+                expected = ObjectManager._calc_cost_matrix(manager, int_shapes, old_shapes,
+                    0, 0, dimension)
+                actual = manager._calc_cost_matrix(int_shapes, old_shapes, 0, 0, dimension)
+
+                np.testing.assert_allclose(actual, expected)
+
+
+def _extend_attributes(attributeval_set, default_attribute_values):
+    shape_attribute_specs_set = set(attr.spec_id for attr in attributeval_set)
+    for db_attr in default_attribute_values:
+        if db_attr.spec_id not in shape_attribute_specs_set:
+            attributeval_set.append(dotdict([
+                ('spec_id', db_attr.spec_id),
+                ('value', db_attr.value),
+            ]))
+
+def serialize_db_tags(db_tags, db_attributes):
+    # The conversion based on the merged rows and the DB serializers,
+    # used as the reference for the annotation_rows module
+    db_tags = merge_table_rows(db_tags, {
+        'attributes': ['attribute__spec_id', 'attribute__value', 'attribute__id'],
+    }, 'id')
+
+    for db_tag in db_tags:
+        _extend_attributes(db_tag.attributes, db_attributes[db_tag.label_id]["all"].values())
+
+    return serializers.LabeledImageSerializerFromDB(db_tags, many=True).data
+
+def serialize_db_shapes(db_shapes, db_attributes):
+    db_shapes = merge_table_rows(db_shapes, {
+        'attributes': ['attribute__spec_id', 'attribute__value', 'attribute__id'],
+    }, 'id')
+
+    shapes = {}
+    elements = {}
+    for db_shape in db_shapes:
+        _extend_attributes(db_shape.attributes, db_attributes[db_shape.label_id]["all"].values())
+        if db_shape['type'] == str(models.ShapeType.SKELETON):
+            db_shape['points'] = []
+
+        if db_shape.parent is None:
+            db_shape.elements = []
+            shapes[db_shape.id] = db_shape
+        else:
+            elements.setdefault(db_shape.parent, []).append(db_shape)
+
+    for shape_id, shape_elements in elements.items():
+        shapes[shape_id].elements = shape_elements
+
+    return serializers.LabeledShapeSerializerFromDB(list(shapes.values()), many=True).data
+
+def serialize_db_tracks(db_tracks, db_attributes):
+    db_tracks = merge_table_rows(db_tracks, {
+        "attributes": ["attribute__spec_id", "attribute__value", "attribute__id"],
+        "shapes": [
+            "shape__type", "shape__occluded", "shape__z_order", "shape__points",
+            "shape__rotation", "shape__id", "shape__frame", "shape__outside",
+            "shape__attribute__spec_id", "shape__attribute__value", "shape__attribute__id",
+        ],
+    }, "id")
+
+    tracks = {}
+    elements = {}
+    for db_track in db_tracks:
+        db_track["shapes"] = merge_table_rows(db_track["shapes"], {
+            'attributes': ['attribute__value', 'attribute__spec_id', 'attribute__id']
+        }, 'id')
+
+        db_track["attributes"] = list(set(db_track["attributes"]))
+        _extend_attributes(db_track.attributes,
+            db_attributes[db_track.label_id]["immutable"].values())
+
+        default_attribute_values = db_attributes[db_track.label_id]["mutable"].values()
+        for db_shape in db_track["shapes"]:
+            db_shape["attributes"] = list(set(db_shape["attributes"]))
+            _extend_attributes(db_shape["attributes"], default_attribute_values)
+            if db_shape['type'] == str(models.ShapeType.SKELETON):
+                db_shape['points'] = []
+            default_attribute_values = db_shape["attributes"]
+
+        if db_track.parent is None:
+            db_track.elements = []
+            tracks[db_track.id] = db_track
+        else:
+            elements.setdefault(db_track.parent, []).append(db_track)
+
+    for track_id, track_elements in elements.items():
+        tracks[track_id].elements = track_elements
+
+    return serializers.LabeledTrackSerializerFromDB(list(tracks.values()), many=True).data
+
+
+class AnnotationRowsGenerator:
+    """
+    Generates random annotation table rows, as they are returned by the .values() queries
+    with the annotation_rows.*_FIELDS columns
+    """
+
+    SHAPE_TYPES = [
+        str(models.ShapeType.RECTANGLE),
+        str(models.ShapeType.POLYGON),
+        str(models.ShapeType.POINTS),
+        str(models.ShapeType.SKELETON),
+    ]
+
+    def __init__(self, seed, *, label_count=3, max_attributes=3, max_objects=20,
+        max_track_shapes=5, max_elements=3, frame_count=10,
+    ):
+        self._rng = random.Random(seed)
+        self._max_objects = max_objects
+        self._max_track_shapes = max_track_shapes
+        self._max_elements = max_elements
+        self._frame_count = frame_count
+        self._last_id = 0
+
+        self.db_attributes = {}
+        for label_id in range(1, label_count + 1):
+            label_attributes = self.db_attributes[label_id] = {
+                "mutable": OrderedDict(), "immutable": OrderedDict(), "all": OrderedDict(),
+            }
+            for _ in range(self._rng.randint(0, max_attributes)):
+                spec_id = self._next_id()
+                default_value = dotdict([('spec_id', spec_id), ('value', self._value())])
+                label_attributes[
+                    "mutable" if self._rng.random() < 0.5 else "immutable"
+                ][spec_id] = default_value
+                label_attributes["all"][spec_id] = default_value
+
+    def _next_id(self):
+        # ids of the different objects are interleaved in the tables
+        self._last_id += self._rng.randint(1, 50)
+        return self._last_id
+
+    def _value(self):
+        return self._rng.choice(["true", "false", "", "a value", "1.5"])
+
+    def _object_ids(self, count):
+        ids = [self._next_id() for _ in range(count)]
+        self._rng.shuffle(ids)
+        return ids
+
+    def _attributes(self, label_id, kind):
+        specs = list(self.db_attributes[label_id][kind])
+        return [
+            (spec_id, self._value(), self._next_id())
+            for spec_id in self._rng.sample(specs, self._rng.randint(0, len(specs)))
+        ] or [(None, None, None)]
+
+    def _annotation(self, annotation_id, *, frame=None, label_id=None):
+        return {
+            'id': annotation_id,
+            'frame': self._rng.randrange(self._frame_count) if frame is None else frame,
+            'label_id': label_id or self._rng.choice(list(self.db_attributes)),
+            'group': self._rng.choice([None, 0, self._rng.randint(1, 5)]),
+            'source': self._rng.choice(['manual', 'auto', 'semi-auto']),
+        }
+
+    def _shape(self, shape_type=None):
+        shape_type = shape_type or self._rng.choice(self.SHAPE_TYPES)
+        return {
+            'type': shape_type,
+            'occluded': self._rng.random() < 0.5,
+            'outside': self._rng.random() < 0.5,
+            'z_order': self._rng.randint(-2, 2),
+            'rotation': self._rng.choice([0.0, self._rng.uniform(0, 360)]),
+            'points': [self._rng.uniform(0, 100) for _ in range(2 * self._rng.randint(1, 4))],
+        }
+
+    def _sort_rows(self, rows, key):
+        # the database doesn't guarantee any order of the rows with equal keys
+        self._rng.shuffle(rows)
+        rows.sort(key=key)
+        return rows
+
+    def tags(self):
+        rows = []
+        for tag_id in self._object_ids(self._rng.randint(0, self._max_objects)):
+            tag = self._annotation(tag_id)
+            for spec_id, value, attr_id in self._attributes(tag['label_id'], "all"):
+                rows.append(dict(tag,
+                    attribute__spec_id=spec_id, attribute__value=value, attribute__id=attr_id,
+                ))
+
+        rows = [{field: row[field] for field in annotation_rows.TAG_FIELDS} for row in rows]
+        return self._sort_rows(rows, key=lambda row: row['frame'])
+
+    def shapes(self):
+        rows = []
+
+        def _add_shape(shape_id, *, shape_type=None, frame=None, parent=None):
+            shape = self._annotation(shape_id, frame=frame)
+            shape.update(self._shape(shape_type), parent=parent)
+            for spec_id, value, attr_id in self._attributes(shape['label_id'], "all"):
+                rows.append(dict(shape,
+                    attribute__spec_id=spec_id, attribute__value=value, attribute__id=attr_id,
+                ))
+            return shape
+
+        for shape_id in self._object_ids(self._rng.randint(0, self._max_objects)):
+            shape = _add_shape(shape_id)
+            if shape['type'] == str(models.ShapeType.SKELETON):
+                for element_id in self._object_ids(self._rng.randint(1, self._max_elements)):
+                    _add_shape(element_id, shape_type=str(models.ShapeType.POINTS),
+                        frame=shape['frame'], parent=shape_id)
+
+        rows = [{field: row[field] for field in annotation_rows.SHAPE_FIELDS} for row in rows]
+        return self._sort_rows(rows, key=lambda row: row['frame'])
+
+    def tracks(self):
+        rows = []
+
+        def _add_track(track_id, *, shape_type=None, frame=None, label_id=None, parent=None):
+            track = self._annotation(track_id, frame=frame, label_id=label_id)
+            track['parent'] = parent
+            shape_type = shape_type or self._rng.choice(self.SHAPE_TYPES)
+
+            shapes = []
+            shape_frames = self._rng.sample(range(self._frame_count),
+                self._rng.randint(0, min(self._max_track_shapes, self._frame_count)))
+            for shape_id, shape_frame in zip(self._object_ids(len(shape_frames)), shape_frames):
+                shape = self._shape(shape_type)
+                shape.update(id=shape_id, frame=shape_frame)
+                shapes.append((shape, self._attributes(track['label_id'], "mutable")))
+
+            for spec_id, value, attr_id in self._attributes(track['label_id'], "immutable"):
+                track_row = dict(track,
+                    attribute__spec_id=spec_id, attribute__value=value, attribute__id=attr_id,
+                )
+                for shape, shape_attributes in shapes or [({}, [(None, None, None)])]:
+                    for shape_spec_id, shape_value, shape_attr_id in shape_attributes:
+                        rows.append(dict(track_row,
+                            **{
+                                f'shape__{field}': shape.get(field)
+                                for field in ['type', 'occluded', 'z_order', 'rotation',
+                                    'points', 'id', 'frame', 'outside']
+                            },
+                            shape__attribute__spec_id=shape_spec_id,
+                            shape__attribute__value=shape_value,
+                            shape__attribute__id=shape_attr_id,
+                        ))
+
+            return track, shape_type
+
+        for track_id in self._object_ids(self._rng.randint(0, self._max_objects)):
+            track, shape_type = _add_track(track_id)
+            if shape_type == str(models.ShapeType.SKELETON):
+                for element_id in self._object_ids(self._rng.randint(1, self._max_elements)):
+                    _add_track(element_id, shape_type=str(models.ShapeType.POINTS),
+                        frame=track['frame'], parent=track_id)
+
+        rows = [{field: row[field] for field in annotation_rows.TRACK_FIELDS} for row in rows]
+        return self._sort_rows(rows, key=lambda row: (row['id'], row['shape__frame'] or 0))
+
+
+class AnnotationRowsTest(TestCase):
+    EXAMPLE_COUNT = 200
+
+    def _check_conversion(self, get_rows, convert, reference_convert):
+        for seed in range(self.EXAMPLE_COUNT):
+            with self.subTest(seed=seed):
+                generator = AnnotationRowsGenerator(seed)
+                rows = get_rows(generator)
+
+                expected = reference_convert(rows, generator.db_attributes)
+                actual = convert(
+                    [tuple(row.values()) for row in rows], generator.db_attributes
+                )
+
+                # the key order is checked as well
+                self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+    def test_can_convert_tag_rows(self):
+        self._check_conversion(AnnotationRowsGenerator.tags,
+            annotation_rows.convert_tags, serialize_db_tags)
+
+    def test_can_convert_shape_rows(self):
+        self._check_conversion(AnnotationRowsGenerator.shapes,
+            annotation_rows.convert_shapes, serialize_db_shapes)
+
+    def test_can_convert_track_rows(self):
+        self._check_conversion(AnnotationRowsGenerator.tracks,
+            annotation_rows.convert_tracks, serialize_db_tracks)
@@ -32,11 +32,13 @@ from PIL import Image
 from rest_framework import status
 
 import cvat.apps.dataset_manager as dm
+from cvat.apps.dataset_manager import annotation_rows
+from cvat.apps.dataset_manager.annotation import AnnotationIR, AnnotationManager
 from cvat.apps.dataset_manager.bindings import CvatTaskOrJobDataExtractor, TaskData
-from cvat.apps.dataset_manager.task import TaskAnnotation
+from cvat.apps.dataset_manager.task import JobAnnotation, TaskAnnotation
 from cvat.apps.dataset_manager.util import get_export_cache_lock
 from cvat.apps.dataset_manager.views import clear_export_cache, export, parse_export_file_path
-from cvat.apps.engine.models import Task
+from cvat.apps.engine.models import Job, JobType, Task
 from cvat.apps.engine.tests.utils import get_paginated_collection, ApiTestBase, ForceLogin
 
 projects_path = osp.join(osp.dirname(__file__), 'assets', 'projects.json')
@@ -1251,6 +1253,64 @@ class TaskDumpUploadTest(_DbTestBase):
                     data_from_task_after_upload = self._get_data_from_task(task_id, include_images)
                     compare_datasets(self, data_from_task_before_upload, data_from_task_after_upload)
 
+class TaskAnnotationReadTest(_DbTestBase):
+    def _merge_job_annotations(self, task_id):
+        # Read each job separately and merge the results, as the task annotations are defined
+        db_task = Task.objects.get(pk=task_id)
+        task_data = AnnotationIR(db_task.dimension)
+
+        for db_job in Job.objects.filter(
+            segment__task_id=task_id, type=JobType.ANNOTATION
+        ).order_by('id'):
+            job_annotation = JobAnnotation(db_job.id)
+            job_annotation.init_from_db()
+            AnnotationManager(task_data).merge(job_annotation.ir_data,
+                db_job.segment.start_frame, db_task.overlap, db_task.dimension)
+
+        return task_data.data
+
+    def _create_annotated_task(self):
+        task_spec = copy.deepcopy(tasks["main"])
+        task_spec.update(overlap=3, segment_size=6)
+        task = self._create_task(task_spec, self._generate_task_images(15))
+        jobs = self._get_jobs(task["id"])
+        self.assertGreater(len(jobs), 2)
+
+        # leave the last job empty
+        for job in jobs[:-1]:
+            self._create_annotations_in_job(task, job["id"], "CVAT for images 1.1 merge", "random")
+
+        return task, jobs
+
+    def _read_task_annotations(self, task_id, **kwargs):
+        task_annotation = TaskAnnotation(task_id)
+        task_annotation.init_from_db(**kwargs)
+        return json.loads(json.dumps(task_annotation.data))
+
+    def test_can_read_task_annotations_from_all_jobs_at_once(self):
+        task, _ = self._create_annotated_task()
+
+        self.assertEqual(
+            self._read_task_annotations(task["id"]),
+            json.loads(json.dumps(self._merge_job_annotations(task["id"]))),
+        )
+
+    def test_can_reuse_cached_job_annotations(self):
+        task, jobs = self._create_annotated_task()
+        self._read_task_annotations(task["id"], use_job_cache=True)
+
+        self._create_annotations_in_job(task, jobs[0]["id"], "CVAT for images 1.1 merge", "random")
+
+        with patch(
+            "cvat.apps.dataset_manager.annotation_rows.convert_shapes",
+            wraps=annotation_rows.convert_shapes,
+        ) as mock_convert_shapes:
+            cached_annotations = self._read_task_annotations(task["id"], use_job_cache=True)
+
+        # only the changed job is read from the database
+        self.assertEqual(mock_convert_shapes.call_count, 1)
+        self.assertEqual(cached_annotations, self._read_task_annotations(task["id"]))
+
 class ExportBehaviorTest(_DbTestBase):
     @define
     class SharedBase:
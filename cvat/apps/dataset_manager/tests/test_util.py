@@ -0,0 +1,63 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import os.path as osp
+import zipfile
+from tempfile import TemporaryDirectory
+
+from django.test import SimpleTestCase
+
+from cvat.apps.dataset_manager.util import ZipArchiveWriter, make_zip_archive
+
+
+class ZipArchiveTest(SimpleTestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.tmp_dir = self._tmp_dir.name
+
+    def test_can_write_files_into_archive(self):
+        archive_path = osp.join(self.tmp_dir, 'archive.zip')
+
+        with ZipArchiveWriter(archive_path) as archive:
+            with archive.open('annotations.xml') as f:
+                f.write(b'<annotations/>')
+
+            archive.write('images/a/1.jpg', b'image1')
+            archive.write('images/2.jpg', memoryview(b'image2'))
+
+        with zipfile.ZipFile(archive_path) as archive:
+            self.assertEqual(
+                {name: archive.read(name) for name in archive.namelist()},
+                {
+                    'annotations.xml': b'<annotations/>',
+                    'images/a/1.jpg': b'image1',
+                    'images/2.jpg': b'image2',
+                }
+            )
+            self.assertTrue(all(
+                info.compress_type == zipfile.ZIP_STORED for info in archive.infolist()
+            ))
+
+    def test_can_move_files_into_archive(self):
+        src_dir = osp.join(self.tmp_dir, 'src')
+        os.makedirs(osp.join(src_dir, 'images'))
+        for name in ['annotations.json', osp.join('images', '1.jpg')]:
+            with open(osp.join(src_dir, name), 'wb') as f:
+                f.write(name.encode())
+
+        archive_path = osp.join(self.tmp_dir, 'archive.zip')
+        make_zip_archive(src_dir, archive_path, move_files=True)
+
+        with zipfile.ZipFile(archive_path) as archive:
+            self.assertEqual(
+                {name: archive.read(name) for name in archive.namelist()},
+                {
+                    'annotations.json': b'annotations.json',
+                    'images/1.jpg': b'images/1.jpg',
+                }
+            )
+
+        self.assertEqual([files for _, _, files in os.walk(src_dir)], [[], []])
@@ -3,6 +3,8 @@
 #
 # SPDX-License-Identifier: MIT
 
+from __future__ import annotations
+
 import inspect
 import os
 import os.path as osp
@@ -12,7 +14,7 @@ from contextlib import contextmanager
 from copy import deepcopy
 from datetime import timedelta
 from threading import Lock
-from typing import Any, Generator, Optional, Sequence
+from typing import IO, Any, Generator, Optional, Sequence, Union
 
 import attrs
 import django_rq
@@ -29,13 +31,55 @@ def current_function_name(depth=1):
     return inspect.getouterframes(inspect.currentframe())[depth].function
 
 
-def make_zip_archive(src_path, dst_path):
+def make_zip_archive(src_path, dst_path, *, move_files: bool = False):
+    """
+    Packs the directory contents into a zip archive.
+    If move_files is True, the files are removed as soon as they are packed,
+    so that the directory and the archive don't take twice the space on disk.
+    """
+
     with zipfile.ZipFile(dst_path, 'w') as archive:
         for (dirpath, _, filenames) in os.walk(src_path):
             for name in filenames:
                 path = osp.join(dirpath, name)
                 archive.write(path, osp.relpath(path, src_path))
 
+                if move_files:
+                    os.remove(path)
+
+
+class ZipArchiveWriter:
+    """
+    Writes files directly into a zip archive, without an intermediate directory.
+
+    The files are stored without compression, as in make_zip_archive(),
+    so the media files are written as is.
+    """
+
+    def __init__(self, dst_path: str):
+        self._archive = zipfile.ZipFile(dst_path, 'w')
+
+    def __enter__(self) -> ZipArchiveWriter:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._archive.close()
+
+    def open(self, name: str) -> IO[bytes]:
+        """
+        Returns a writable stream for a new archive file.
+        The stream must be closed before the next file is added.
+        """
+
+        # the file size is unknown in advance
+        return self._archive.open(name, 'w', force_zip64=True)
+
+    def write(self, name: str, data: Union[bytes, memoryview]):
+        self._archive.writestr(name, data)
+
 
 def bulk_create(db_model, objects, flt_param):
     if objects:
@@ -1,61 +1,156 @@
 # Copyright (C) 2020-2022 Intel Corporation
-# Copyright (C) 2022-2023 CVAT.ai Corporation
+# Copyright (C) 2022-2024 CVAT.ai Corporation
 #
 # SPDX-License-Identifier: MIT
 
+import hashlib
 import io
+import itertools
+import math
 import os
+import threading
 import zipfile
+from collections import OrderedDict
+from contextlib import closing
 from datetime import datetime, timezone
 from io import BytesIO
-import shutil
-import tempfile
 import zlib
+from enum import Enum
 
-from typing import Optional, Tuple
+from typing import Dict, Iterator, Optional, Sequence, Tuple
 
 import cv2
+import django_rq
 import PIL.Image
 import pickle # nosec
 from django.conf import settings
 from django.core.cache import caches
+from pottery import Redlock, ReleaseUnlockedLock
 from rest_framework.exceptions import NotFound, ValidationError
+from rq.job import JobStatus as RQJobStatus
 
+from cvat.apps.engine.cloud_object_cache import CloudObjectCache
 from cvat.apps.engine.cloud_provider import (Credentials,
                                              db_storage_to_storage_instance,
                                              get_cloud_storage_instance)
+from cvat.apps.engine.disk_cache import BoundedDiskCache
 from cvat.apps.engine.log import ServerLogManager
-from cvat.apps.engine.media_extractors import (ImageDatasetManifestReader,
+from cvat.apps.engine.media_extractors import (IChunkWriter,
+                                               ImageDatasetManifestReader,
                                                Mpeg4ChunkWriter,
                                                Mpeg4CompressedChunkWriter,
-                                               VideoDatasetManifestReader,
+                                               VideoChunkBuilder,
                                                ZipChunkWriter,
                                                ZipCompressedChunkWriter)
 from cvat.apps.engine.mime_types import mimetypes
-from cvat.apps.engine.models import (DataChoice, DimensionType, Job, Image,
-                                     StorageChoice, CloudStorage)
-from cvat.apps.engine.utils import md5_hash, preload_images
+from cvat.apps.engine.models import (Data, DataChoice, DimensionType, Job, Image,
+                                     SegmentType, StorageChoice, CloudStorage)
+from cvat.apps.engine.utils import get_chunk_compression_options, preload_images
 from utils.dataset_manifest import ImageManifestManager
+from utils.dataset_manifest.core import ManifestDirectoryTree
 
 slogger = ServerLogManager(__name__)
 
+class MediaCacheFiles(BoundedDiskCache):
+    """
+    Keeps the media cache chunks in files, so that they can be sent to the clients
+    without reading them into the server memory. The media cache keeps the file names.
+
+    The file names include the data checksum. The checksum is verified once,
+    when the file is written.
+    """
+
+    def __init__(self, root: Optional[str] = None, *, max_size: Optional[int] = None):
+        super().__init__(
+            root or settings.MEDIA_CACHE_CHUNK_FILES_ROOT,
+            max_size=settings.MEDIA_CACHE_CHUNK_FILES_MAX_SIZE if max_size is None else max_size,
+            eviction_interval=settings.MEDIA_CACHE_CHUNK_FILES_EVICTION_INTERVAL,
+        )
+
+    def get_path(self, file_name: str) -> Optional[str]:
+        path = os.path.join(self._root, file_name)
+        if not self._touch(path):
+            return None
+
+        return path
+
+    def write(self, key: str, data: memoryview, *, ext: str = '') -> Tuple[str, int]:
+        "Returns the file name and the checksum of the data"
+
+        checksum = zlib.crc32(data)
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        path = self._get_file_path(f'{digest}-{checksum:08x}', ext)
+
+        with self._make_tmp_dir() as tmp_dir:
+            tmp_path = os.path.join(tmp_dir, os.path.basename(path))
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+
+            with open(tmp_path, 'rb') as f:
+                written_checksum = 0
+                while block := f.read(2**20):
+                    written_checksum = zlib.crc32(block, written_checksum)
+
+            if written_checksum != checksum:
+                raise OSError(f'Failed to write the media cache file for the key {key}')
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+
+        self._evict_if_needed()
+
+        return os.path.relpath(path, self._root), checksum
+
+
 class MediaCache:
+    _CACHE_ITEM_LOCK_KEY_PREFIX = 'media_cache_lock'
+    _STATS_KEY_PREFIX = 'media_cache_stats'
+
     def __init__(self, dimension=DimensionType.DIM_2D):
         self._dimension = dimension
         self._cache = caches['media']
+        self._files = MediaCacheFiles()
 
-    def _get_or_set_cache_item(self, key, create_function):
-        def create_item():
-            slogger.glob.info(f'Starting to prepare chunk: key {key}')
-            item = create_function()
-            slogger.glob.info(f'Ending to prepare chunk: key {key}')
+    class Stats(str, Enum):
+        HITS = 'hits'
+        "Requests served from the cache"
 
-            if item[0]:
-                item = (item[0], item[1], zlib.crc32(item[0].getbuffer()))
-                self._cache.set(key, item)
+        BUILDS = 'builds'
+        "Requests which prepared the item"
 
-            return item
+        COALESCED = 'coalesced'
+        "Requests which waited for the item prepared by another request"
+
+        LOCK_TIMEOUTS = 'lock_timeouts'
+        "Requests which stopped waiting for another request and prepared the item themselves"
+
+    @staticmethod
+    def _get_cache_item_lock(key: str) -> Redlock:
+        return Redlock(
+            key=f'{MediaCache._CACHE_ITEM_LOCK_KEY_PREFIX}:{key}',
+            masters={django_rq.get_connection(settings.CVAT_QUEUES.CHUNKS.value)},
+            auto_release_time=settings.MEDIA_CACHE_ITEM_LOCK_TTL,
+        )
 
+    def _increment_stat(self, stat: Stats):
+        key = f'{self._STATS_KEY_PREFIX}:{stat.value}'
+        try:
+            self._cache.incr(key)
+        except ValueError:
+            # the counter is created only once, not on every request
+            if not self._cache.add(key, 1, timeout=None):
+                try:
+                    self._cache.incr(key)
+                except ValueError:
+                    # the key was evicted between the calls, the counter is not critical
+                    pass
+
+    def get_stats(self) -> Dict[str, int]:
+        keys = {f'{self._STATS_KEY_PREFIX}:{stat.value}': stat.value for stat in self.Stats}
+        values = self._cache.get_many(keys.keys())
+        return {name: values.get(key, 0) for key, name in keys.items()}
+
+    def _get_cache_item(self, key):
         slogger.glob.info(f'Starting to get chunk from cache: key {key}')
         try:
             item = self._cache.get(key)
@@ -64,38 +159,175 @@ class MediaCache:
             item = None
         slogger.glob.info(f'Ending to get chunk from cache: key {key}, is_cached {bool(item)}')
 
-        if not item:
-            item = create_item()
-        else:
+        if item:
             # compare checksum
             item_data = item[0].getbuffer() if isinstance(item[0], io.BytesIO) else item[0]
             item_checksum = item[2] if len(item) == 3 else None
             if item_checksum != zlib.crc32(item_data):
                 slogger.glob.info(f'Recreating cache item {key} due to checksum mismatch')
+                item = None
+
+        return item
+
+    def _get_or_create_item(self, key, *, get_item, create_item):
+        item = get_item(key)
+        if item:
+            self._increment_stat(self.Stats.HITS)
+            return item
+
+        # Concurrent requests for the same item are coalesced:
+        # only the lock owner prepares the item, the others wait for it to appear in the cache
+        lock = self._get_cache_item_lock(key)
+        acquired = lock.acquire(blocking=False)
+        if not acquired:
+            slogger.glob.info(f'Waiting for cache item to be prepared by another worker: key {key}')
+            acquired = lock.acquire(
+                blocking=True, timeout=settings.MEDIA_CACHE_ITEM_LOCK_TIMEOUT
+            )
+
+            if acquired:
+                item = get_item(key)
+            else:
+                slogger.glob.warning(f'Timed out waiting for cache item: key {key}')
+                self._increment_stat(self.Stats.LOCK_TIMEOUTS)
+
+        try:
+            if item:
+                self._increment_stat(self.Stats.COALESCED)
+            else:
+                slogger.glob.info(f'Starting to prepare chunk: key {key}')
                 item = create_item()
+                slogger.glob.info(f'Ending to prepare chunk: key {key}')
+                self._increment_stat(self.Stats.BUILDS)
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except ReleaseUnlockedLock:
+                    slogger.glob.warning(
+                        f'Cache item lock expired before the item was prepared: key {key}'
+                    )
+
+        return item
+
+    def _get_or_set_cache_item(self, key, create_function, *, with_checksum: bool = False):
+        """
+        Returns the (data, mime type) item, and the CRC32 checksum of the data,
+        if with_checksum is True. The checksum is None for empty items.
+        """
+
+        def create_item():
+            item = create_function()
+
+            if item[0]:
+                item = (item[0], item[1], zlib.crc32(item[0].getbuffer()))
+                self._cache.set(key, item)
+
+            return item
+
+        item = self._get_or_create_item(key, get_item=self._get_cache_item, create_item=create_item)
+        return self._unpack_cache_item(item, with_checksum=with_checksum)
+
+    @staticmethod
+    def _make_file_item_key(key: str) -> str:
+        return f'{key}_file'
+
+    def _get_file_item(self, key):
+        item = self._cache.get(self._make_file_item_key(key))
+        if not item:
+            return None
+
+        file_name, mime_type, checksum = item
+        path = self._files.get_path(file_name)
+        if not path:
+            return None
+
+        return path, mime_type, checksum
+
+    def _get_or_set_file_item(self, key, create_function):
+        def create_item():
+            buff, mime_type = create_function()
+            file_name, checksum = self._files.write(key, buff.getbuffer(),
+                ext=mimetypes.guess_extension(mime_type) or '')
+            self._cache.set(self._make_file_item_key(key), (file_name, mime_type, checksum))
+
+            path = self._files.get_path(file_name)
+            if not path:
+                # the file can be evicted right after it's written
+                buff.seek(0)
+                return buff, mime_type, checksum
+
+            return path, mime_type, checksum
+
+        return self._get_or_create_item(key, get_item=self._get_file_item, create_item=create_item)
+
+    def _get_or_set_chunk_item(self, key, create_function, *, with_checksum: bool = False):
+        """
+        Works as _get_or_set_cache_item, but if the chunk files are enabled,
+        the chunk is kept in a file, and the file path is returned instead of the data.
+        """
+
+        if not self._files.enabled:
+            return self._get_or_set_cache_item(key, create_function, with_checksum=with_checksum)
+
+        item = self._get_or_set_file_item(key, create_function)
+        return item if with_checksum else item[:2]
+
+    def _has_chunk_item(self, key) -> bool:
+        if self._files.enabled:
+            key = self._make_file_item_key(key)
+
+        return self._has_cache_item(key)
+
+    @staticmethod
+    def _unpack_cache_item(item, *, with_checksum: bool):
+        if with_checksum:
+            return item[0], item[1], item[2] if len(item) == 3 else None
 
         return item[0], item[1]
 
-    def get_task_chunk_data_with_mime(self, chunk_number, quality, db_data):
-        item = self._get_or_set_cache_item(
-            key=f'{db_data.id}_{chunk_number}_{quality}',
+    def _has_cache_item(self, key) -> bool:
+        return self._cache.has_key(key)
+
+    @staticmethod
+    def _make_task_chunk_key(db_data_id: int, chunk_number: int, quality) -> str:
+        return f'{db_data_id}_{chunk_number}_{quality}'
+
+    @staticmethod
+    def _make_selective_job_chunk_key(db_job_id: int, chunk_number: int, quality) -> str:
+        return f'job_{db_job_id}_{chunk_number}_{quality}'
+
+    def has_task_chunk(self, chunk_number, quality, db_data) -> bool:
+        return self._has_chunk_item(self._make_task_chunk_key(db_data.id, chunk_number, quality))
+
+    def has_selective_job_chunk(self, chunk_number, quality, job) -> bool:
+        return self._has_chunk_item(
+            self._make_selective_job_chunk_key(job.id, chunk_number, quality)
+        )
+
+    def get_task_chunk_data_with_mime(self, chunk_number, quality, db_data, *, with_checksum=False):
+        item = self._get_or_set_chunk_item(
+            key=self._make_task_chunk_key(db_data.id, chunk_number, quality),
             create_function=lambda: self._prepare_task_chunk(db_data, quality, chunk_number),
+            with_checksum=with_checksum,
         )
 
         return item
 
-    def get_selective_job_chunk_data_with_mime(self, chunk_number, quality, job):
-        item = self._get_or_set_cache_item(
-            key=f'job_{job.id}_{chunk_number}_{quality}',
+    def get_selective_job_chunk_data_with_mime(self, chunk_number, quality, job, *, with_checksum=False):
+        item = self._get_or_set_chunk_item(
+            key=self._make_selective_job_chunk_key(job.id, chunk_number, quality),
             create_function=lambda: self.prepare_selective_job_chunk(job, quality, chunk_number),
+            with_checksum=with_checksum,
         )
 
         return item
 
-    def get_local_preview_with_mime(self, frame_number, db_data):
+    def get_local_preview_with_mime(self, frame_number, db_data, *, with_checksum=False):
         item = self._get_or_set_cache_item(
             key=f'data_{db_data.id}_{frame_number}_preview',
             create_function=lambda: self._prepare_local_preview(frame_number, db_data),
+            with_checksum=with_checksum,
         )
 
         return item
@@ -136,76 +368,59 @@ class MediaCache:
     from contextlib import contextmanager
 
     @staticmethod
-    @contextmanager
-    def _get_images(db_data, chunk_number, dimension):
-        images = []
-        tmp_dir = None
-        upload_dir = {
+    def _get_upload_dir(db_data) -> str:
+        return {
             StorageChoice.LOCAL: db_data.get_upload_dirname(),
             StorageChoice.SHARE: settings.SHARE_ROOT,
             StorageChoice.CLOUD_STORAGE: db_data.get_upload_dirname(),
         }[db_data.storage]
 
-        try:
-            if hasattr(db_data, 'video'):
-                source_path = os.path.join(upload_dir, db_data.video.path)
-
-                reader = VideoDatasetManifestReader(manifest_path=db_data.get_manifest_path(),
-                    source_path=source_path, chunk_number=chunk_number,
-                    chunk_size=db_data.chunk_size, start=db_data.start_frame,
-                    stop=db_data.stop_frame, step=db_data.get_frame_step())
-                for frame in reader:
-                    images.append((frame, source_path, None))
-            else:
-                reader = ImageDatasetManifestReader(manifest_path=db_data.get_manifest_path(),
-                    chunk_number=chunk_number, chunk_size=db_data.chunk_size,
-                    start=db_data.start_frame, stop=db_data.stop_frame,
-                    step=db_data.get_frame_step())
-                if db_data.storage == StorageChoice.CLOUD_STORAGE:
-                    db_cloud_storage = db_data.cloud_storage
-                    assert db_cloud_storage, 'Cloud storage instance was deleted'
-                    credentials = Credentials()
-                    credentials.convert_from_db({
-                        'type': db_cloud_storage.credentials_type,
-                        'value': db_cloud_storage.credentials,
-                    })
-                    details = {
-                        'resource': db_cloud_storage.resource,
-                        'credentials': credentials,
-                        'specific_attributes': db_cloud_storage.get_specific_attributes()
-                    }
-                    cloud_storage_instance = get_cloud_storage_instance(cloud_provider=db_cloud_storage.provider_type, **details)
-
-                    tmp_dir = tempfile.mkdtemp(prefix='cvat')
-                    files_to_download = []
-                    checksums = []
-                    for item in reader:
-                        file_name = f"{item['name']}{item['extension']}"
-                        fs_filename = os.path.join(tmp_dir, file_name)
-
-                        files_to_download.append(file_name)
-                        checksums.append(item.get('checksum', None))
-                        images.append((fs_filename, fs_filename, None))
-
-                    cloud_storage_instance.bulk_download_to_dir(files=files_to_download, upload_dir=tmp_dir)
-                    images = preload_images(images)
-
-                    for checksum, (_, fs_filename, _) in zip(checksums, images):
-                        if checksum and not md5_hash(fs_filename) == checksum:
-                            slogger.cloud_storage[db_cloud_storage.id].warning('Hash sums of files {} do not match'.format(file_name))
-                else:
-                    for item in reader:
-                        source_path = os.path.join(upload_dir, f"{item['name']}{item['extension']}")
-                        images.append((source_path, source_path, None))
-                    if dimension == DimensionType.DIM_2D:
-                        images = preload_images(images)
+    @staticmethod
+    @contextmanager
+    def _get_images(db_data, chunk_number, dimension):
+        upload_dir = MediaCache._get_upload_dir(db_data)
+
+        reader = ImageDatasetManifestReader(manifest_path=db_data.get_manifest_path(),
+            chunk_number=chunk_number, chunk_size=db_data.chunk_size,
+            start=db_data.start_frame, stop=db_data.stop_frame,
+            step=db_data.get_frame_step())
+        if db_data.storage == StorageChoice.CLOUD_STORAGE:
+            db_cloud_storage = db_data.cloud_storage
+            assert db_cloud_storage, 'Cloud storage instance was deleted'
+            credentials = Credentials()
+            credentials.convert_from_db({
+                'type': db_cloud_storage.credentials_type,
+                'value': db_cloud_storage.credentials,
+            })
+            details = {
+                'resource': db_cloud_storage.resource,
+                'credentials': credentials,
+                'specific_attributes': db_cloud_storage.get_specific_attributes()
+            }
+            cloud_storage_instance = get_cloud_storage_instance(cloud_provider=db_cloud_storage.provider_type, **details)
+
+            files_to_download = [
+                (f"{item['name']}{item['extension']}", item.get('checksum', None))
+                for item in reader
+            ]
+
+            # the images are downloaded while the previous ones are encoded
+            with CloudObjectCache().open_images(
+                cloud_storage_instance, db_cloud_storage.id, files_to_download,
+                max_pending_size=settings.CLOUD_DATA_DOWNLOADING_MAX_PENDING_SIZE,
+            ) as images:
+                yield ((image, path, None) for image, path in images)
+        else:
+            images = []
+            for item in reader:
+                source_path = os.path.join(upload_dir, f"{item['name']}{item['extension']}")
+                images.append((source_path, source_path, None))
+            if dimension == DimensionType.DIM_2D:
+                images = preload_images(images)
 
             yield images
-        finally:
-            if db_data.storage == StorageChoice.CLOUD_STORAGE and tmp_dir is not None:
-                shutil.rmtree(tmp_dir)
 
-    def _prepare_task_chunk(self, db_data, quality, chunk_number):
+    def _make_task_chunk_writer(self, db_data, quality) -> Tuple[IChunkWriter, str]:
         FrameProvider = self._get_frame_provider_class()
 
         writer_classes = {
@@ -219,15 +434,101 @@ class MediaCache:
         kwargs = {}
         if self._dimension == DimensionType.DIM_3D:
             kwargs["dimension"] = DimensionType.DIM_3D
+        if writer_classes[quality] is ZipCompressedChunkWriter:
+            kwargs.update(get_chunk_compression_options())
         writer = writer_classes[quality](image_quality, **kwargs)
 
+        return writer, mime_type
+
+    def _prepare_task_chunk(self, db_data, quality, chunk_number):
+        if hasattr(db_data, 'video'):
+            (_, item), = self._prepare_video_task_chunks(db_data, quality, chunk_number, 1)
+            return item
+
+        writer, mime_type = self._make_task_chunk_writer(db_data, quality)
+
         buff = BytesIO()
         with self._get_images(db_data, chunk_number, self._dimension) as images:
+            if not isinstance(writer, ZipChunkWriter):
+                # the video writers need all the frames in advance
+                images = list(images)
+
             writer.save_as_chunk(images, buff)
         buff.seek(0)
 
         return buff, mime_type
 
+    def _prepare_video_task_chunks(
+        self, db_data, quality, start_chunk: int, chunk_count: int
+    ) -> Iterator[Tuple[int, Tuple[BytesIO, str]]]:
+        writer, mime_type = self._make_task_chunk_writer(db_data, quality)
+
+        builder = VideoChunkBuilder(manifest_path=db_data.get_manifest_path(),
+            source_path=os.path.join(self._get_upload_dir(db_data), db_data.video.path),
+            chunk_number=start_chunk, chunk_count=chunk_count, chunk_size=db_data.chunk_size,
+            start=db_data.start_frame, stop=db_data.stop_frame, step=db_data.get_frame_step(),
+            writer=writer,
+            # the compressed chunks can be downscaled and have a different quality
+            allow_remuxing=type(writer) is Mpeg4ChunkWriter,
+        )
+
+        for chunk_number, buff in enumerate(builder, start_chunk):
+            yield chunk_number, (buff, mime_type)
+
+    def prepare_task_chunks(self, chunk_numbers: Sequence[int], quality, db_data):
+        """
+        Prepares the task chunks missing in the cache.
+        Consecutive video chunks are built in one pass over the video.
+        """
+
+        missing_chunks = [
+            chunk_number for chunk_number in sorted(chunk_numbers)
+            if not self.has_task_chunk(chunk_number, quality, db_data)
+        ]
+
+        if not hasattr(db_data, 'video'):
+            for chunk_number in missing_chunks:
+                self.get_task_chunk_data_with_mime(chunk_number, quality, db_data)
+            return
+
+        for _, group in itertools.groupby(
+            enumerate(missing_chunks), key=lambda v: v[1] - v[0]
+        ):
+            group_chunks = [chunk_number for _, chunk_number in group]
+            while group_chunks:
+                processed_count = self._put_video_task_chunks(db_data, quality, group_chunks)
+                group_chunks = group_chunks[processed_count:]
+
+    def _put_video_task_chunks(self, db_data, quality, chunk_numbers: Sequence[int]) -> int:
+        """
+        Builds the consecutive chunks in one pass over the video and puts them into the cache.
+        Each chunk is built under its cache item lock, so the concurrent requests
+        for the chunk wait for it instead of building it again.
+
+        Stops after a chunk prepared by another request, as the pass can't skip it.
+        Returns the number of the processed chunks.
+        """
+
+        built_chunks = []
+        with closing(self._prepare_video_task_chunks(
+            db_data, quality, chunk_numbers[0], len(chunk_numbers)
+        )) as chunks:
+            def build_next_chunk():
+                chunk_number, item = next(chunks)
+                built_chunks.append(chunk_number)
+                return item
+
+            for processed_count, chunk_number in enumerate(chunk_numbers, 1):
+                self._get_or_set_chunk_item(
+                    key=self._make_task_chunk_key(db_data.id, chunk_number, quality),
+                    create_function=build_next_chunk,
+                )
+
+                if built_chunks[-1:] != [chunk_number]:
+                    break
+
+        return processed_count
+
     def prepare_selective_job_chunk(self, db_job: Job, quality, chunk_number: int):
         db_data = db_job.segment.task.data
 
@@ -321,7 +622,11 @@ class MediaCache:
             slogger.cloud_storage[db_storage.pk].info(msg)
             raise NotFound(msg)
 
-        buff = storage.download_fileobj(preview_path)
+        with CloudObjectCache().download_files(
+            storage, db_storage.id, [(preview_path, preview_info.get('checksum', None))]
+        ) as (preview_file_path, ):
+            with open(preview_file_path, 'rb') as preview_file:
+                buff = BytesIO(preview_file.read())
         mime_type = mimetypes.guess_type(preview_path)[0]
 
         return buff, mime_type
@@ -347,3 +652,180 @@ class MediaCache:
         mime_type = 'application/zip'
         zip_buffer.seek(0)
         return zip_buffer, mime_type
+
+
+class MediaCachePrefetcher:
+    """
+    Prepares media cache chunks in the background, so that they are ready
+    by the time they are requested.
+    """
+
+    _QUEUE_JOB_PREFIX = 'prefetch-chunks-'
+    _JOB_RESULT_TTL = 60
+
+    def _get_queue(self):
+        return django_rq.get_queue(settings.CVAT_QUEUES.CHUNKS.value)
+
+    @staticmethod
+    def _get_last_chunk_number(db_data: Data) -> int:
+        # the chunk numbers computed from the frame numbers can exceed it
+        # if the task has a start frame or a frame step
+        return math.ceil(db_data.size / db_data.chunk_size) - 1
+
+    def _make_queue_job_id(self, db_data: Data, quality, db_job: Optional[Job] = None) -> str:
+        scope = f'job-{db_job.id}' if db_job else f'data-{db_data.id}'
+        return f'{self._QUEUE_JOB_PREFIX}{scope}-{quality.name.lower()}'
+
+    def _enqueue(
+        self,
+        db_data: Data,
+        quality,
+        chunk_numbers: Sequence[int],
+        *,
+        dimension: DimensionType,
+        db_job: Optional[Job] = None,
+        rq_id: str,
+    ) -> bool:
+        queue = self._get_queue()
+
+        # There is at most one pending prefetching job per rq_id,
+        # the requests coming while it is running are covered by the lock in MediaCache
+        rq_job = queue.fetch_job(rq_id)
+        if rq_job and rq_job.get_status(refresh=False) in (
+            RQJobStatus.QUEUED, RQJobStatus.STARTED, RQJobStatus.SCHEDULED, RQJobStatus.DEFERRED
+        ):
+            return False
+
+        # Only SPECIFIC_FRAMES jobs have their own chunks, other jobs use the task chunks
+        if db_job and db_job.segment.type != SegmentType.SPECIFIC_FRAMES:
+            db_job = None
+
+        queue.enqueue(
+            self._prepare_chunks,
+            db_data_id=db_data.id,
+            db_job_id=db_job.id if db_job else None,
+            chunk_numbers=list(chunk_numbers),
+            quality=quality,
+            dimension=dimension,
+            job_id=rq_id,
+            result_ttl=self._JOB_RESULT_TTL,
+            failure_ttl=self._JOB_RESULT_TTL,
+        )
+        return True
+
+    def prefetch_next_chunks(
+        self,
+        db_data: Data,
+        chunk_number: int,
+        quality,
+        *,
+        stop_chunk: int,
+        dimension: DimensionType,
+        db_job: Optional[Job] = None,
+    ):
+        """
+        Schedules preparation of the chunks following the requested one.
+        The requests made for a job must pass db_job.
+        """
+
+        depth = settings.MEDIA_CACHE_PREFETCH_DEPTH
+        stop_chunk = min(stop_chunk, self._get_last_chunk_number(db_data))
+        chunk_numbers = range(chunk_number + 1, min(chunk_number + depth, stop_chunk) + 1)
+        if not chunk_numbers:
+            return
+
+        self._enqueue(db_data, quality, chunk_numbers,
+            dimension=dimension, db_job=db_job,
+            rq_id=self._make_queue_job_id(db_data, quality, db_job=db_job),
+        )
+
+    def prefetch_chunks(
+        self,
+        db_data: Data,
+        quality,
+        *,
+        start_chunk: int,
+        stop_chunk: int,
+        dimension: DimensionType,
+        db_job: Optional[Job] = None,
+    ) -> bool:
+        """
+        Schedules preparation of all the chunks in the [start_chunk; stop_chunk] range.
+        The requests made for a job must pass db_job.
+
+        Returns False if the same chunks are being prepared already.
+        """
+
+        stop_chunk = min(stop_chunk, self._get_last_chunk_number(db_data))
+        return self._enqueue(db_data, quality, range(start_chunk, stop_chunk + 1),
+            dimension=dimension, db_job=db_job,
+            rq_id='{}-all'.format(self._make_queue_job_id(db_data, quality, db_job=db_job)),
+        )
+
+    @staticmethod
+    def _prepare_chunks(
+        *,
+        db_data_id: int,
+        db_job_id: Optional[int],
+        chunk_numbers: Sequence[int],
+        quality,
+        dimension: DimensionType,
+    ):
+        cache = MediaCache(dimension=dimension)
+
+        if db_job_id is not None:
+            db_job = Job.objects.select_related('segment__task__data').filter(id=db_job_id).first()
+            if not db_job:
+                return
+
+            for chunk_number in chunk_numbers:
+                if not cache.has_selective_job_chunk(chunk_number, quality, db_job):
+                    cache.get_selective_job_chunk_data_with_mime(chunk_number, quality, db_job)
+        else:
+            db_data = Data.objects.filter(id=db_data_id).first()
+            if not db_data:
+                return
+
+            cache.prepare_task_chunks(chunk_numbers, quality, db_data)
+
+
+class ManifestDirectoryTreeCache:
+    """
+    Keeps the directory trees of the recently browsed cloud storage manifests
+    in the process memory. The trees are addressed by the manifest path, size and
+    modification time, so a changed manifest gets a new tree.
+    """
+
+    _trees: OrderedDict[tuple, ManifestDirectoryTree] = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _make_key(manifest_path: str, manifest_prefix: Optional[str]) -> tuple:
+        stat = os.stat(manifest_path)
+        return (manifest_path, stat.st_size, stat.st_mtime_ns, manifest_prefix)
+
+    @classmethod
+    def get(cls, manifest_path: str, *, manifest_prefix: Optional[str] = None) -> ManifestDirectoryTree:
+        key = cls._make_key(manifest_path, manifest_prefix)
+        with cls._lock:
+            tree = cls._trees.get(key)
+            if tree is not None:
+                cls._trees.move_to_end(key)
+                return tree
+
+        manifest = ImageManifestManager(manifest_path)
+        manifest.set_index()
+        tree = manifest.get_directory_tree(manifest_prefix)
+
+        with cls._lock:
+            # remove the trees of the previous manifest versions
+            for outdated_key in [
+                k for k in cls._trees if k[0] == manifest_path and k[1:3] != key[1:3]
+            ]:
+                del cls._trees[outdated_key]
+
+            cls._trees[key] = tree
+            while len(cls._trees) > settings.MANIFEST_DIRECTORY_TREE_CACHE_SIZE:
+                cls._trees.popitem(last=False)
+
+        return tree
@@ -0,0 +1,231 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Generic, Iterable, Iterator, NamedTuple, Optional, TypeVar
+
+from django.conf import settings
+from rest_framework.exceptions import NotFound, PermissionDenied
+
+from cvat.apps.engine.log import ServerLogManager
+
+slogger = ServerLogManager(__name__)
+
+_T = TypeVar('_T')
+
+
+class DownloadProgress(NamedTuple):
+    downloaded_files: int
+    total_files: Optional[int]
+    downloaded_bytes: int
+
+
+class _ConcurrencyController:
+    """
+    Adapts the number of parallel downloads to the observed throughput.
+
+    The throughput is measured over the rounds of completed downloads. If it has grown
+    since the previous round, the concurrency keeps changing in the same direction,
+    if it has dropped, the direction is reversed. If it hasn't changed, the concurrency
+    goes down, as more parallel downloads only increase the latency of each download then.
+    """
+
+    _MIN_GAIN = 0.05
+    _MIN_ROUND_DURATION = 0.2 # seconds, shorter rounds give noisy measurements
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.concurrency = (self.max_concurrency + 1) // 2
+        self._direction = 1
+        self._last_throughput = None
+        self._start_round(time.monotonic())
+
+    def _start_round(self, now: float):
+        self._round_started = now
+        self._round_files = 0
+        self._round_bytes = 0
+
+    def on_downloaded(self, size: int):
+        self._round_files += 1
+        self._round_bytes += size
+        now = time.monotonic()
+        if (
+            self._round_files < self.concurrency or
+            now - self._round_started < self._MIN_ROUND_DURATION
+        ):
+            return
+
+        throughput = self._round_bytes / max(now - self._round_started, 1e-6)
+        if self._last_throughput is not None:
+            if throughput < self._last_throughput * (1 - self._MIN_GAIN):
+                self._direction = -self._direction
+            elif throughput < self._last_throughput * (1 + self._MIN_GAIN):
+                # no gain, prefer fewer connections
+                self._direction = -1
+
+        self._last_throughput = throughput
+        self.concurrency = min(max(self.concurrency + self._direction, 1), self.max_concurrency)
+        self._start_round(now)
+
+
+class BulkDownloader(Generic[_T]):
+    """
+    Downloads files in parallel with a sliding window: a new download is started
+    as soon as any of the previous ones is finished. The window size is adapted
+    to the observed throughput.
+
+    The failed downloads are retried with exponential backoff, except for the missing
+    and the forbidden files. The progress callback is called from the download threads,
+    possibly concurrently.
+    """
+
+    def __init__(
+        self,
+        download: Callable[[str], _T],
+        *,
+        get_size: Callable[[_T], int],
+        max_concurrency: int,
+        max_retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+        progress_callback: Optional[Callable[[DownloadProgress], None]] = None,
+    ):
+        self._download = download
+        self._get_size = get_size
+        self._controller = _ConcurrencyController(max_concurrency)
+        self._max_retries = settings.CLOUD_DATA_DOWNLOADING_MAX_RETRIES \
+            if max_retries is None else max_retries
+        self._retry_delay = settings.CLOUD_DATA_DOWNLOADING_RETRY_DELAY \
+            if retry_delay is None else retry_delay
+        self._progress_callback = progress_callback
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._total_files = None
+        self._downloaded_files = 0
+        self._downloaded_bytes = 0
+
+    @property
+    def concurrency(self) -> int:
+        return self._controller.concurrency
+
+    def _download_with_retries(self, key: str) -> _T:
+        attempt = 0
+        while True:
+            try:
+                return self._download(key)
+            except (NotFound, PermissionDenied):
+                raise
+            except Exception as ex:
+                if attempt >= self._max_retries or self._stopped.is_set():
+                    raise
+
+                delay = self._retry_delay * 2 ** attempt * random.uniform(0.5, 1.5) # nosec
+                slogger.glob.warning(
+                    f"Failed to download '{key}', retrying in {delay:.1f}s: {ex}"
+                )
+
+                attempt += 1
+                if self._stopped.wait(delay):
+                    raise
+
+    def _on_download_finished(self, future: Future):
+        if future.cancelled() or future.exception():
+            return
+
+        size = self._get_size(future.result())
+        with self._lock:
+            self._controller.on_downloaded(size)
+            self._downloaded_files += 1
+            self._downloaded_bytes += size
+
+            progress = DownloadProgress(
+                downloaded_files=self._downloaded_files,
+                total_files=self._total_files,
+                downloaded_bytes=self._downloaded_bytes,
+            )
+
+        # The callback can be slow, it must not block the other downloads.
+        # The calls can come out of order.
+        if self._progress_callback:
+            self._progress_callback(progress)
+
+    def _get_pending_size(self, pending_downloads: Iterable[Future]) -> int:
+        return sum(
+            self._get_size(f.result())
+            for f in pending_downloads
+            if f.done() and not f.exception()
+        )
+
+    def download(
+        self,
+        files: Iterable[str],
+        *,
+        ordered: bool = True,
+        max_pending_size: Optional[int] = None,
+    ) -> Iterator[_T]:
+        """
+        Yields the downloaded files, in the input order if ordered is True,
+        and in the completion order otherwise.
+
+        The downloaded, but not yet consumed files take no more than
+        max_pending_size bytes, if it's specified, and no more than
+        the maximum concurrency files in addition to the running downloads.
+        """
+
+        if hasattr(files, '__len__'):
+            self._total_files = len(files)
+
+        max_concurrency = self._controller.max_concurrency
+        files_iter = iter(files)
+        has_files = True
+        pending_downloads: Deque[Future] = deque()
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            try:
+                while True:
+                    while has_files:
+                        running_count = sum(1 for f in pending_downloads if not f.done())
+                        if (
+                            running_count >= self.concurrency or
+                            len(pending_downloads) - running_count >= max_concurrency or
+                            max_pending_size is not None and
+                            self._get_pending_size(pending_downloads) >= max_pending_size
+                        ):
+                            break
+
+                        next_file = next(files_iter, None)
+                        if next_file is None:
+                            has_files = False
+                            break
+
+                        future = executor.submit(self._download_with_retries, next_file)
+                        future.add_done_callback(self._on_download_finished)
+                        pending_downloads.append(future)
+
+                    if not pending_downloads:
+                        break
+
+                    if ordered and pending_downloads[0].done():
+                        yield pending_downloads.popleft().result()
+                        continue
+                    elif not ordered:
+                        done_downloads = [f for f in pending_downloads if f.done()]
+                        if done_downloads:
+                            for f in done_downloads:
+                                pending_downloads.remove(f)
+                                yield f.result()
+                            continue
+
+                    wait(
+                        [f for f in pending_downloads if not f.done()],
+                        return_when=FIRST_COMPLETED,
+                    )
+            finally:
+                self._stopped.set()
+                for f in pending_downloads:
+                    f.cancel()
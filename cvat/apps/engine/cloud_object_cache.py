@@ -0,0 +1,202 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import hashlib
+import os
+import os.path as osp
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Sequence
+
+from django.conf import settings
+from PIL import Image
+
+from cvat.apps.engine.cloud_downloader import DownloadProgress
+from cvat.apps.engine.cloud_provider import _CloudStorage
+from cvat.apps.engine.disk_cache import BoundedDiskCache
+from cvat.apps.engine.log import ServerLogManager
+from cvat.apps.engine.utils import md5_hash, preload_image
+
+slogger = ServerLogManager(__name__)
+
+
+class CloudObjectCache(BoundedDiskCache):
+    """
+    A bounded on-disk cache of cloud storage objects, shared by all the server processes.
+
+    The objects are addressed by the storage id, the object key and the object checksum
+    from the manifest, so a changed object is never read from the cache. Objects without
+    a known checksum are not cached. The cache is filled atomically, and the least
+    recently used objects are removed when the total size exceeds the limit.
+    """
+
+    def __init__(self, root: Optional[str] = None, *, max_size: Optional[int] = None):
+        super().__init__(
+            root or settings.CLOUD_OBJECT_CACHE_ROOT,
+            max_size=settings.CLOUD_OBJECT_CACHE_MAX_SIZE if max_size is None else max_size,
+            eviction_interval=settings.CLOUD_OBJECT_CACHE_EVICTION_INTERVAL,
+        )
+
+    def _get_object_path(self, storage_id: int, key: str, checksum: str) -> str:
+        digest = hashlib.sha256(f'{storage_id}:{checksum}:{key}'.encode()).hexdigest()
+
+        # the extension is kept, as some readers rely on it
+        return self._get_file_path(digest, osp.splitext(key)[1])
+
+    def _lookup(self, storage_id: int, files: Sequence[tuple[str, Optional[str]]]) -> list[Optional[str]]:
+        paths = []
+        for key, checksum in files:
+            path = None
+            if self.enabled and checksum:
+                path = self._get_object_path(storage_id, key, checksum)
+                if not self._touch(path):
+                    path = None
+
+            paths.append(path)
+
+        return paths
+
+    @contextmanager
+    def open_images(
+        self,
+        storage: _CloudStorage,
+        storage_id: int,
+        files: Sequence[tuple[str, Optional[str]]],
+        *,
+        max_pending_size: Optional[int] = None,
+    ) -> Iterator[Iterator[tuple[Image.Image, str]]]:
+        """
+        Yields an iterator over the loaded (image, local path) pairs
+        for the requested (key, checksum) objects, in the input order.
+
+        The missing objects are downloaded from the storage in the background
+        while the previous images are consumed. The downloaded objects are
+        verified on the fly. The returned paths are only valid inside the context.
+        """
+
+        paths = self._lookup(storage_id, files)
+
+        with self._make_tmp_dir() as tmp_dir:
+            yield self._iter_images(storage, storage_id, files,
+                paths=paths, tmp_dir=tmp_dir, max_pending_size=max_pending_size)
+
+    def _iter_images(
+        self,
+        storage: _CloudStorage,
+        storage_id: int,
+        files: Sequence[tuple[str, Optional[str]]],
+        *,
+        paths: Sequence[Optional[str]],
+        tmp_dir: str,
+        max_pending_size: Optional[int],
+    ) -> Iterator[tuple[Image.Image, str]]:
+        downloads = storage.bulk_download_to_memory(
+            [key for (key, _), path in zip(files, paths) if path is None],
+            max_pending_size=max_pending_size,
+            _use_optimal_downloading=False,
+        )
+
+        has_stored_objects = False
+        try:
+            for (key, checksum), path in zip(files, paths):
+                if path is not None:
+                    yield preload_image((path, path, None))[0], path
+                    continue
+
+                data = next(downloads)
+                image = Image.open(data)
+                image.load()
+
+                is_verified = bool(checksum) and md5_hash(image) == checksum
+                if checksum and not is_verified:
+                    slogger.cloud_storage[storage_id].warning(
+                        'Hash sums of files {} do not match'.format(key)
+                    )
+
+                if self.enabled and is_verified:
+                    path = self._get_object_path(storage_id, key, checksum)
+                    has_stored_objects = True
+                else:
+                    # don't keep the unexpected content under the expected checksum
+                    path = osp.join(tmp_dir, key)
+
+                self._write_file(path, data.getbuffer(), tmp_dir=tmp_dir)
+                yield image, path
+        finally:
+            downloads.close()
+
+            if has_stored_objects:
+                self._evict_if_needed()
+
+    @contextmanager
+    def download_files(
+        self,
+        storage: _CloudStorage,
+        storage_id: int,
+        files: Sequence[tuple[str, Optional[str]]],
+        *,
+        progress_callback: Optional[Callable[[DownloadProgress], None]] = None,
+    ) -> Iterator[list[str]]:
+        """
+        Yields local paths of the requested (key, checksum) objects.
+        The missing objects are downloaded from the storage,
+        the download progress is reported to the progress callback.
+
+        The returned paths are only valid inside the context. The files must not be changed.
+        """
+
+        paths = self._lookup(storage_id, files)
+        missing_files = [i for i, path in enumerate(paths) if path is None]
+
+        with self._make_tmp_dir() as tmp_dir:
+            if missing_files:
+                self._download_missing_files(storage, storage_id, files,
+                    missing_files=missing_files, paths=paths, tmp_dir=tmp_dir,
+                    progress_callback=progress_callback)
+
+            yield paths
+
+    def _download_missing_files(
+        self,
+        storage: _CloudStorage,
+        storage_id: int,
+        files: Sequence[tuple[str, Optional[str]]],
+        *,
+        missing_files: Sequence[int],
+        paths: list[Optional[str]],
+        tmp_dir: str,
+        progress_callback: Optional[Callable[[DownloadProgress], None]],
+    ):
+        keys_to_download = list(dict.fromkeys(files[i][0] for i in missing_files))
+        storage.bulk_download_to_dir(files=keys_to_download, upload_dir=tmp_dir,
+            progress_callback=progress_callback)
+
+        stored_paths = {}
+        for i in missing_files:
+            key, checksum = files[i]
+            downloaded_path = osp.join(tmp_dir, key)
+
+            if not (self.enabled and checksum):
+                paths[i] = downloaded_path
+                continue
+
+            path = stored_paths.get(key)
+            if path is None:
+                if md5_hash(downloaded_path) != checksum:
+                    slogger.cloud_storage[storage_id].warning(
+                        'Hash sums of files {} do not match'.format(key)
+                    )
+
+                    # don't keep the unexpected content under the expected checksum
+                    paths[i] = downloaded_path
+                    continue
+
+                path = self._get_object_path(storage_id, key, checksum)
+                os.makedirs(osp.dirname(path), exist_ok=True)
+                os.replace(downloaded_path, path)
+                stored_paths[key] = path
+
+            paths[i] = path
+
+        if stored_paths:
+            self._evict_if_needed()
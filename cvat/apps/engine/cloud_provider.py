@@ -1,5 +1,5 @@
 # Copyright (C) 2021-2023 Intel Corporation
-# Copyright (C) 2023 CVAT.ai Corporation
+# Copyright (C) 2023-2024 CVAT.ai Corporation
 #
 # SPDX-License-Identifier: MIT
 
@@ -11,7 +11,6 @@ from abc import ABC, abstractmethod, abstractproperty
 from enum import Enum
 from io import BytesIO
 from typing import Dict, List, Optional, Any, Callable, TypeVar, Iterator
-from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 
 import boto3
 from azure.core.exceptions import HttpResponseError, ResourceExistsError
@@ -21,7 +20,6 @@ from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import ClientError
 from botocore.handlers import disable_signing
-from datumaro.util import take_by # can be changed to itertools.batched after migration to python3.12
 from django.conf import settings
 from google.cloud import storage
 from google.cloud.exceptions import Forbidden as GoogleCloudForbidden
@@ -30,6 +28,7 @@ from PIL import Image, ImageFile
 from rest_framework.exceptions import (NotFound, PermissionDenied,
                                        ValidationError)
 
+from cvat.apps.engine.cloud_downloader import BulkDownloader, DownloadProgress
 from cvat.apps.engine.log import ServerLogManager
 from cvat.apps.engine.models import CloudProviderChoice, CredentialsTypeChoice
 from cvat.apps.engine.utils import get_cpu_number
@@ -236,14 +235,32 @@ class _CloudStorage(ABC):
         files: List[str],
         *,
         threads_number: Optional[int] = None,
+        max_pending_size: Optional[int] = None,
+        progress_callback: Optional[Callable[[DownloadProgress], None]] = None,
         _use_optimal_downloading: bool = True,
     ) -> Iterator[BytesIO]:
+        """
+        Downloads the files in parallel and yields them in the input order.
+
+        Up to threads_number files are downloaded in parallel, the number of parallel
+        downloads is adapted to the observed throughput. If max_pending_size
+        is specified, the next downloads are not started while the downloaded,
+        but not yet consumed files, take more than this number of bytes.
+        """
+
         func = self.optimally_image_download if _use_optimal_downloading else self.download_fileobj
-        threads_number = normalize_threads_number(threads_number, len(files))
+        downloader = BulkDownloader(func,
+            get_size=lambda buffer: buffer.getbuffer().nbytes,
+            max_concurrency=normalize_threads_number(threads_number, len(files)),
+            progress_callback=progress_callback,
+        )
 
-        with ThreadPoolExecutor(max_workers=threads_number) as executor:
-            for batch_links in take_by(files, count=threads_number):
-                yield from executor.map(func, batch_links)
+        yield from downloader.download(files, max_pending_size=max_pending_size)
+
+    def _download_file_to_dir(self, key: str, upload_dir: str) -> int:
+        path = os.path.join(upload_dir, key)
+        self.download_file(key, path)
+        return os.path.getsize(path)
 
     def bulk_download_to_dir(
         self,
@@ -251,15 +268,17 @@ class _CloudStorage(ABC):
         upload_dir: str,
         *,
         threads_number: Optional[int] = None,
+        progress_callback: Optional[Callable[[DownloadProgress], None]] = None,
     ) -> None:
-        threads_number = normalize_threads_number(threads_number, len(files))
+        downloader = BulkDownloader(
+            functools.partial(self._download_file_to_dir, upload_dir=upload_dir),
+            get_size=lambda size: size,
+            max_concurrency=normalize_threads_number(threads_number, len(files)),
+            progress_callback=progress_callback,
+        )
 
-        with ThreadPoolExecutor(max_workers=threads_number) as executor:
-            futures = [executor.submit(self.download_file, f, os.path.join(upload_dir, f)) for f in files]
-            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
-            for future in done:
-                if ex := future.exception():
-                    raise ex
+        for _ in downloader.download(files, ordered=False):
+            pass
 
     @abstractmethod
     def upload_fileobj(self, file_obj, file_name):
@@ -405,6 +424,8 @@ class AWS_S3(_CloudStorage):
         'max_io_queue': 10,
     }
 
+    _DEFAULT_MAX_POOL_CONNECTIONS = 10
+
     class Effect(str, Enum):
         ALLOW = 'Allow'
         DENY = 'Deny'
@@ -445,7 +466,14 @@ class AWS_S3(_CloudStorage):
 
         session = boto3.Session(**kwargs)
         self._s3 = session.resource("s3", endpoint_url=endpoint_url,
-            config=Config(proxies=PROXIES_FOR_UNTRUSTED_URLS or {}),
+            config=Config(
+                proxies=PROXIES_FOR_UNTRUSTED_URLS or {},
+                # keep the connections of all the parallel downloads
+                max_pool_connections=max(
+                    self._DEFAULT_MAX_POOL_CONNECTIONS,
+                    settings.CLOUD_DATA_DOWNLOADING_MAX_THREADS_NUMBER,
+                ),
+            ),
         )
 
         # anonymous access
@@ -0,0 +1,47 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+
+MEDIA_CACHE_ITEM_LOCK_TTL = int(os.getenv("CVAT_MEDIA_CACHE_ITEM_LOCK_TTL", 60 * 10))
+"Maximum time a media cache item can stay locked while it is being prepared, in seconds"
+
+MEDIA_CACHE_ITEM_LOCK_TIMEOUT = int(os.getenv("CVAT_MEDIA_CACHE_ITEM_LOCK_TIMEOUT", 60 * 2))
+"Maximum time to wait for a media cache item prepared by another worker, in seconds"
+
+MEDIA_CACHE_PREFETCH_DEPTH = int(os.getenv("CVAT_MEDIA_CACHE_PREFETCH_DEPTH", 2))
+"Number of the next chunks prepared in the background after a chunk is requested, 0 to disable"
+
+CLOUD_OBJECT_CACHE_MAX_SIZE = int(os.getenv("CVAT_CLOUD_OBJECT_CACHE_MAX_SIZE", 10 * 2**30))
+"Maximum total size of the cloud storage objects cached on the disk, in bytes, 0 to disable"
+
+CLOUD_OBJECT_CACHE_EVICTION_INTERVAL = int(os.getenv("CVAT_CLOUD_OBJECT_CACHE_EVICTION_INTERVAL", 60))
+"Minimum interval between the checks of the cloud object cache size, in seconds"
+
+CLOUD_DATA_DOWNLOADING_MAX_PENDING_SIZE = int(os.getenv("CVAT_CLOUD_DATA_DOWNLOADING_MAX_PENDING_SIZE", 64 * 2**20))
+"Maximum size of the cloud storage objects downloaded ahead of the chunk encoding, in bytes"
+
+MEDIA_CHUNK_COMPRESSION_THREADS = int(os.getenv("CVAT_MEDIA_CHUNK_COMPRESSION_THREADS", 4))
+"Number of threads used to compress the frames of one chunk, 1 to compress them sequentially"
+
+MEDIA_CHUNK_COMPRESSION_MAX_PENDING_FRAMES = int(os.getenv("CVAT_MEDIA_CHUNK_COMPRESSION_MAX_PENDING_FRAMES", 8))
+"Maximum number of the frames of one chunk kept in memory while they are being compressed"
+
+MEDIA_DATA_MAX_AGE = int(os.getenv("CVAT_MEDIA_DATA_MAX_AGE", 24 * 60 * 60))
+"Time the clients can reuse the downloaded chunks and frames without revalidation, in seconds"
+
+MEDIA_CACHE_CHUNK_FILES_MAX_SIZE = int(os.getenv("CVAT_MEDIA_CACHE_CHUNK_FILES_MAX_SIZE", 0))
+"Maximum total size of the cached chunks kept in files and sent without copying, in bytes, 0 to keep the chunks in the media cache"
+
+MEDIA_CACHE_CHUNK_FILES_EVICTION_INTERVAL = int(os.getenv("CVAT_MEDIA_CACHE_CHUNK_FILES_EVICTION_INTERVAL", 60))
+"Minimum interval between the checks of the cached chunk files size, in seconds"
+
+MANIFEST_DIRECTORY_TREE_CACHE_SIZE = int(os.getenv("CVAT_MANIFEST_DIRECTORY_TREE_CACHE_SIZE", 4))
+"Number of the cloud storage manifest directory trees kept in the memory of each server process for browsing"
+
+CLOUD_DATA_DOWNLOADING_MAX_RETRIES = int(os.getenv("CVAT_CLOUD_DATA_DOWNLOADING_MAX_RETRIES", 3))
+"Number of the retries of a failed cloud storage object download"
+
+CLOUD_DATA_DOWNLOADING_RETRY_DELAY = float(os.getenv("CVAT_CLOUD_DATA_DOWNLOADING_RETRY_DELAY", 1))
+"Delay before the first retry of a failed cloud storage object download, in seconds, doubled for each next retry"
@@ -0,0 +1,129 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import fcntl
+import os
+import os.path as osp
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager, suppress
+from typing import Iterator
+
+from cvat.apps.engine.log import ServerLogManager
+
+slogger = ServerLogManager(__name__)
+
+
+class BoundedDiskCache:
+    """
+    A base class for the on-disk caches shared by all the server processes.
+
+    The files are stored under the root directory in 2-character subdirectories.
+    The files are written atomically, and the least recently used files are removed
+    when the total size exceeds the limit.
+    """
+
+    _TMP_DIR_NAME = 'tmp'
+    _EVICTION_MARKER_NAME = '.eviction'
+    _EVICTION_TARGET_RATIO = 0.9
+    _STALE_TMP_DIR_AGE = 24 * 60 * 60
+
+    def __init__(self, root: str, *, max_size: int, eviction_interval: int):
+        self._root = root
+        self._max_size = max_size
+        self._eviction_interval = eviction_interval
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_size > 0
+
+    def _get_file_path(self, digest: str, ext: str = '') -> str:
+        return osp.join(self._root, digest[:2], digest + ext)
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def _make_tmp_dir(self) -> Iterator[str]:
+        tmp_root = osp.join(self._root, self._TMP_DIR_NAME)
+        os.makedirs(tmp_root, exist_ok=True)
+
+        # keep the temporary files in the cache dir, so that they can be moved atomically
+        with tempfile.TemporaryDirectory(prefix='cvat', dir=tmp_root) as tmp_dir:
+            yield tmp_dir
+
+    @staticmethod
+    def _write_file(path: str, data: bytes, *, tmp_dir: str):
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as f:
+            f.write(data)
+        os.replace(f.name, path)
+
+    def _evict_if_needed(self):
+        # Scanning the cache is relatively expensive, so it's done no more often
+        # than once in the eviction interval and only by one process at a time.
+        # The cache can exceed the limit a bit between the checks.
+        marker_path = osp.join(self._root, self._EVICTION_MARKER_NAME)
+        with suppress(FileNotFoundError):
+            if time.time() < osp.getmtime(marker_path) + self._eviction_interval:
+                return
+
+        with open(marker_path, 'a') as marker:
+            try:
+                fcntl.flock(marker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            try:
+                os.utime(marker_path)
+                self._evict()
+            finally:
+                fcntl.flock(marker, fcntl.LOCK_UN)
+
+    def _evict(self):
+        entries = []
+        total_size = 0
+        now = time.time()
+        for group_dir in os.scandir(self._root):
+            if not group_dir.is_dir():
+                continue
+
+            if group_dir.name == self._TMP_DIR_NAME:
+                # remove the leftovers of the terminated processes
+                for tmp_dir in os.scandir(group_dir.path):
+                    with suppress(FileNotFoundError):
+                        if tmp_dir.stat().st_mtime + self._STALE_TMP_DIR_AGE < now:
+                            shutil.rmtree(tmp_dir.path, ignore_errors=True)
+                continue
+
+            for entry in os.scandir(group_dir.path):
+                with suppress(FileNotFoundError):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+        if total_size <= self._max_size:
+            return
+
+        target_size = self._max_size * self._EVICTION_TARGET_RATIO
+        removed_count = 0
+        for _, size, path in sorted(entries):
+            if total_size <= target_size:
+                break
+
+            with suppress(FileNotFoundError):
+                os.remove(path)
+                removed_count += 1
+
+            total_size -= size
+
+        slogger.glob.info(
+            f'Removed {removed_count} least recently used files from {self._root}'
+        )
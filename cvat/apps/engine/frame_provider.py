@@ -4,9 +4,13 @@
 # SPDX-License-Identifier: MIT
 
 import math
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
 from enum import Enum
 from io import BytesIO
 import os
+from typing import Deque
 
 import cv2
 import numpy as np
@@ -201,10 +205,17 @@ class FrameProvider:
 
         return output_buf, PREVIEW_MIME
 
-    def get_chunk(self, chunk_number, quality=Quality.ORIGINAL):
+    def get_chunk(self, chunk_number, quality=Quality.ORIGINAL, *, with_checksum=False):
+        """
+        Returns the chunk (data, mime type) for the media cache, and the chunk path otherwise.
+        The media cache can return the chunk file path instead of the data.
+        with_checksum adds the data checksum to the media cache results.
+        """
+
         chunk_number = self._validate_chunk_number(chunk_number)
         if self._db_data.storage_method == StorageMethodChoice.CACHE:
-            return self._loaders[quality].get_chunk_path(chunk_number, quality, self._db_data)
+            return self._loaders[quality].get_chunk_path(chunk_number, quality, self._db_data,
+                with_checksum=with_checksum)
         return self._loaders[quality].get_chunk_path(chunk_number)
 
     def get_frame(self, frame_number, quality=Quality.ORIGINAL,
@@ -223,6 +234,81 @@ class FrameProvider:
         for idx in range(start_frame, stop_frame):
             yield self.get_frame(idx, quality=quality, out_type=out_type)
 
+    def _get_chunk_source(self, chunk_number, quality):
+        loader = self._loaders[quality]
+        if self._db_data.storage_method == StorageMethodChoice.CACHE:
+            return loader.get_chunk_path(chunk_number, quality, self._db_data)[0]
+        return loader.get_chunk_path(chunk_number)
+
+    def _read_chunk_frames(self, chunk_source, reader_class, frame_offsets, out_type):
+        frames = []
+        with closing(iter(reader_class([chunk_source]))) as chunk_reader:
+            for frame_offset, (frame, frame_name, _) in enumerate(chunk_reader):
+                if frame_offset < frame_offsets.start:
+                    continue
+
+                frame = self._convert_frame(frame, reader_class, out_type)
+                if reader_class is VideoReader:
+                    frames.append((frame, self.VIDEO_FRAME_MIME))
+                else:
+                    frames.append((frame, mimetypes.guess_type(frame_name)[0]))
+
+                if frame_offset + 1 == frame_offsets.stop:
+                    break
+
+        return frames
+
+    def get_frames_parallel(self, start_frame, stop_frame, quality=Quality.ORIGINAL,
+            out_type=Type.BUFFER, *, max_workers=1):
+        """
+        Returns an iterator over the same frames as get_frames(), in the frame order.
+
+        The chunks are obtained in the calling thread, and each chunk is decoded
+        and converted by a separate worker, so several chunks are processed in parallel.
+        The frames of no more than max_workers chunks are kept in memory at once.
+        """
+
+        if max_workers < 1:
+            raise ValueError('max_workers must be greater than 0')
+
+        if start_frame < stop_frame:
+            self._validate_frame_number(start_frame)
+            self._validate_frame_number(stop_frame - 1)
+
+        return self._get_frames_parallel(start_frame, stop_frame, quality, out_type,
+            max_workers=max_workers)
+
+    def _get_frames_parallel(self, start_frame, stop_frame, quality, out_type, *, max_workers):
+        if stop_frame <= start_frame:
+            return
+
+        chunk_size = self._db_data.chunk_size
+        reader_class = self._loaders[quality].reader_class
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending_chunks: Deque[Future] = deque()
+            try:
+                for chunk_number in range(
+                    self.get_chunk_number(start_frame), self.get_chunk_number(stop_frame - 1) + 1
+                ):
+                    if len(pending_chunks) == max_workers:
+                        yield from pending_chunks.popleft().result()
+
+                    chunk_start = chunk_number * chunk_size
+                    frame_offsets = range(
+                        max(start_frame, chunk_start) - chunk_start,
+                        min(stop_frame, chunk_start + chunk_size) - chunk_start
+                    )
+                    pending_chunks.append(executor.submit(self._read_chunk_frames,
+                        self._get_chunk_source(chunk_number, quality),
+                        reader_class, frame_offsets, out_type))
+
+                while pending_chunks:
+                    yield from pending_chunks.popleft().result()
+            finally:
+                for f in pending_chunks:
+                    f.cancel()
+
     @property
     def data_id(self):
         return self._db_data.id
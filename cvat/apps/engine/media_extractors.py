@@ -13,8 +13,10 @@ import itertools
 import struct
 from enum import IntEnum
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import closing
-from typing import Iterable
+from typing import Deque, Iterable, Iterator, Optional
 
 import av
 import numpy as np
@@ -490,7 +492,7 @@ class VideoReader(IMediaReader):
         return image.width, image.height
 
 class FragmentMediaReader:
-    def __init__(self, chunk_number, chunk_size, start, stop, step=1):
+    def __init__(self, chunk_number, chunk_size, start, stop, step=1, *, chunk_count=1):
         self._start = start
         self._stop = stop + 1 # up to the last inclusive
         self._step = step
@@ -499,7 +501,7 @@ class FragmentMediaReader:
         self._start_chunk_frame_number = \
             self._start + self._chunk_number * self._chunk_size * self._step
         self._end_chunk_frame_number = min(self._start_chunk_frame_number \
-            + (self._chunk_size - 1) * self._step + 1, self._stop)
+            + (self._chunk_size * chunk_count - 1) * self._step + 1, self._stop)
         self._frame_range = self._get_frame_range()
 
     @property
@@ -527,8 +529,7 @@ class ImageDatasetManifestReader(FragmentMediaReader):
         self._manifest.init_index()
 
     def __iter__(self):
-        for idx in self._frame_range:
-            yield self._manifest[idx]
+        yield from self._manifest.get_many(self._frame_range)
 
 class VideoDatasetManifestReader(FragmentMediaReader):
     def __init__(self, manifest_path, **kwargs):
@@ -538,27 +539,36 @@ class VideoDatasetManifestReader(FragmentMediaReader):
         self._manifest.init_index()
 
     def _get_nearest_left_key_frame(self):
-        if self._start_chunk_frame_number >= \
-                self._manifest[len(self._manifest) - 1].get('number'):
-            left_border = len(self._manifest) - 1
-        else:
-            left_border = 0
-            delta = len(self._manifest)
-            while delta:
-                step = delta // 2
-                cur_position = left_border + step
-                if self._manifest[cur_position].get('number') < self._start_chunk_frame_number:
-                    cur_position += 1
-                    left_border = cur_position
-                    delta -= step + 1
-                else:
-                    delta = step
-            if self._manifest[cur_position].get('number') > self._start_chunk_frame_number:
-                left_border -= 1
-        frame_number = self._manifest[left_border].get('number')
-        timestamp = self._manifest[left_border].get('pts')
+        with self._manifest.open_reader():
+            if self._start_chunk_frame_number >= \
+                    self._manifest[len(self._manifest) - 1].get('number'):
+                left_border = len(self._manifest) - 1
+            else:
+                left_border = 0
+                delta = len(self._manifest)
+                while delta:
+                    step = delta // 2
+                    cur_position = left_border + step
+                    if self._manifest[cur_position].get('number') < self._start_chunk_frame_number:
+                        cur_position += 1
+                        left_border = cur_position
+                        delta -= step + 1
+                    else:
+                        delta = step
+                if self._manifest[cur_position].get('number') > self._start_chunk_frame_number:
+                    left_border -= 1
+            frame_number = self._manifest[left_border].get('number')
+            timestamp = self._manifest[left_border].get('pts')
         return frame_number, timestamp
 
+    def get_key_frames(self) -> dict[int, int]:
+        "Returns the frame numbers and timestamps of the key frames listed in the manifest"
+        return {item['number']: item['pts'] for _, item in self._manifest}
+
+    @property
+    def video_length(self) -> int:
+        return self._manifest.video_length
+
     def __iter__(self):
         start_decode_frame_number, start_decode_timestamp = self._get_nearest_left_key_frame()
         with closing(av.open(self.source_path, mode='r')) as container:
@@ -567,11 +577,15 @@ class VideoDatasetManifestReader(FragmentMediaReader):
 
             container.seek(offset=start_decode_timestamp, stream=video_stream)
 
+            # the range can include several chunks, a list is too slow for lookups
+            frames_to_read = set(self._frame_range)
+            last_frame_number = self._frame_range[-1]
+
             frame_number = start_decode_frame_number - 1
             for packet in container.demux(video_stream):
                 for frame in packet.decode():
                     frame_number += 1
-                    if frame_number in self._frame_range:
+                    if frame_number in frames_to_read:
                         if video_stream.metadata.get('rotate'):
                             frame = av.VideoFrame().from_ndarray(
                                 rotate_image(
@@ -581,7 +595,7 @@ class VideoDatasetManifestReader(FragmentMediaReader):
                                 format ='bgr24'
                             )
                         yield frame
-                    elif frame_number < self._frame_range[-1]:
+                    elif frame_number < last_frame_number:
                         continue
                     else:
                         return
@@ -701,25 +715,80 @@ class ZipChunkWriter(IChunkWriter):
         return []
 
 class ZipCompressedChunkWriter(ZipChunkWriter):
+    def __init__(
+        self,
+        quality,
+        dimension=DimensionType.DIM_2D,
+        *,
+        threads_number: int = 1,
+        max_pending_frames: Optional[int] = None,
+    ):
+        """
+        The frames are compressed by threads_number threads. Up to max_pending_frames frames
+        (2 per thread by default) can be requested from the input and kept in memory
+        before they are written into the chunk.
+        """
+
+        super().__init__(quality, dimension=dimension)
+        self._threads_number = max(1, threads_number)
+        self._max_pending_frames = max(1, max_pending_frames or 2 * self._threads_number)
+
+    def _compress_frames(
+        self, images: Iterable[tuple[Image.Image|io.IOBase|str, str, str]]
+    ) -> Iterator[tuple[int, int, io.BytesIO]]:
+        if self._threads_number == 1:
+            for image, _, _ in images:
+                yield self._compress_image(image, self._image_quality)
+            return
+
+        # PIL releases the GIL while encoding, so the threads can use several cores
+        with ThreadPoolExecutor(max_workers=self._threads_number) as executor:
+            pending_frames: Deque[Future] = deque()
+            try:
+                for image, _, _ in images:
+                    if len(pending_frames) == self._max_pending_frames:
+                        yield pending_frames.popleft().result()
+
+                    pending_frames.append(
+                        executor.submit(self._compress_image, image, self._image_quality)
+                    )
+
+                while pending_frames:
+                    yield pending_frames.popleft().result()
+            finally:
+                for f in pending_frames:
+                    f.cancel()
+
+    def _read_frame(
+        self, image_info: tuple[Image.Image|io.IOBase|str, str, str]
+    ) -> tuple[int, int, io.BytesIO, str]:
+        image, path, _ = image_info
+        if self._dimension == DimensionType.DIM_2D:
+            assert isinstance(image, io.IOBase)
+            image_buf = io.BytesIO(image.read())
+            with Image.open(image_buf) as img:
+                w, h = img.size
+            return w, h, image_buf, self.IMAGE_EXT
+        else:
+            image_buf, extension, w, h = self._write_pcd_file(path)
+            return w, h, image_buf, extension
+
     def save_as_chunk(
         self,
         images: Iterable[tuple[Image.Image|io.IOBase|str, str, str]],
         chunk_path: str, *, compress_frames: bool = True, zip_compress_level: int = 0
     ):
+        if self._dimension == DimensionType.DIM_2D and compress_frames:
+            frames = (
+                (w, h, image_buf, self.IMAGE_EXT)
+                for w, h, image_buf in self._compress_frames(images)
+            )
+        else:
+            frames = map(self._read_frame, images)
+
         image_sizes = []
         with zipfile.ZipFile(chunk_path, 'x', compresslevel=zip_compress_level) as zip_chunk:
-            for idx, (image, path, _) in enumerate(images):
-                if self._dimension == DimensionType.DIM_2D:
-                    if compress_frames:
-                        w, h, image_buf = self._compress_image(image, self._image_quality)
-                    else:
-                        assert isinstance(image, io.IOBase)
-                        image_buf = io.BytesIO(image.read())
-                        with Image.open(image_buf) as img:
-                            w, h = img.size
-                    extension = self.IMAGE_EXT
-                else:
-                    image_buf, extension, w, h = self._write_pcd_file(path)
+            for idx, (w, h, image_buf, extension) in enumerate(frames):
                 image_sizes.append((w, h))
                 arcname = '{:06d}.{}'.format(idx, extension)
                 zip_chunk.writestr(arcname, image_buf.getvalue())
@@ -791,6 +860,23 @@ class Mpeg4ChunkWriter(IChunkWriter):
             self._encode_images(images, output_container, output_v_stream)
         return [(input_w, input_h)]
 
+    def remux_packets(self, video_stream, packets, chunk_path):
+        "Writes the encoded packets of the video stream into a chunk without re-encoding"
+
+        with av.open(chunk_path, 'w', format=self.FORMAT) as output_container:
+            output_v_stream = output_container.add_stream(template=video_stream)
+
+            offset = packets[0].dts if packets[0].dts is not None else packets[0].pts
+            for packet in packets:
+                if packet.pts is not None:
+                    packet.pts -= offset
+                if packet.dts is not None:
+                    packet.dts -= offset
+                packet.stream = output_v_stream
+                output_container.mux(packet)
+
+        return [(video_stream.codec_context.width, video_stream.codec_context.height)]
+
     @staticmethod
     def _encode_images(images, container, stream):
         for frame, _, _ in images:
@@ -843,6 +929,131 @@ class Mpeg4CompressedChunkWriter(Mpeg4ChunkWriter):
             self._encode_images(images, output_container, output_v_stream)
         return [(input_w, input_h)]
 
+class VideoChunkBuilder:
+    """
+    Builds consecutive chunks of a video in one pass over the video.
+
+    If remuxing is allowed (it requires a Mpeg4ChunkWriter), the source video can be
+    played by the client as is, and the chunks start and end at key frames,
+    the chunk packets are copied without re-encoding. Otherwise, the frames are decoded
+    from the key frame nearest to the first chunk and encoded by the writer.
+    """
+
+    def __init__(
+        self,
+        *,
+        manifest_path: str,
+        source_path: str,
+        chunk_number: int,
+        chunk_count: int,
+        chunk_size: int,
+        start: int,
+        stop: int,
+        step: int,
+        writer: IChunkWriter,
+        allow_remuxing: bool = False,
+    ):
+        self._manifest_path = manifest_path
+        self._source_path = source_path
+        self._chunk_number = chunk_number
+        self._chunk_count = chunk_count
+        self._chunk_size = chunk_size
+        self._start = start
+        self._stop = stop
+        self._step = step
+        self._writer = writer
+        self._allow_remuxing = allow_remuxing
+
+    def _make_reader(self, chunk_number: int, chunk_count: int) -> VideoDatasetManifestReader:
+        return VideoDatasetManifestReader(manifest_path=self._manifest_path,
+            source_path=self._source_path, chunk_number=chunk_number, chunk_count=chunk_count,
+            chunk_size=self._chunk_size, start=self._start, stop=self._stop, step=self._step)
+
+    def __iter__(self) -> Iterator[io.BytesIO]:
+        "Yields the chunks in order"
+
+        remuxed_count = 0
+        if self._allow_remuxing:
+            for chunk in self._remux_chunks():
+                remuxed_count += 1
+                yield chunk
+
+        if remuxed_count < self._chunk_count:
+            yield from self._encode_chunks(
+                self._chunk_number + remuxed_count, self._chunk_count - remuxed_count
+            )
+
+    def _encode_chunks(self, chunk_number: int, chunk_count: int) -> Iterator[io.BytesIO]:
+        frames = iter(self._make_reader(chunk_number, chunk_count))
+        for _ in range(chunk_count):
+            chunk_frames = [
+                (frame, self._source_path, None)
+                for frame in itertools.islice(frames, self._chunk_size)
+            ]
+            if not chunk_frames:
+                break
+
+            chunk = io.BytesIO()
+            self._writer.save_as_chunk(chunk_frames, chunk)
+            chunk.seek(0)
+            yield chunk
+
+    @staticmethod
+    def _can_remux(video_stream) -> bool:
+        codec_context = video_stream.codec_context
+
+        # The client decodes only the H.264 baseline profile.
+        # This profile has no B-frames, so the packets go in the frame order.
+        return (
+            codec_context.name == 'h264' and
+            codec_context.profile in ('Baseline', 'Constrained Baseline') and
+            codec_context.pix_fmt == 'yuv420p' and
+            codec_context.width * codec_context.height <= (Mpeg4ChunkWriter.MAX_MBS_PER_FRAME << 8) and
+            not video_stream.metadata.get('rotate')
+        )
+
+    def _remux_chunks(self) -> Iterator[io.BytesIO]:
+        "Yields the leading chunks which can be remuxed, stops at the first one which can't"
+
+        if self._step != 1:
+            return
+
+        reader = self._make_reader(self._chunk_number, self._chunk_count)
+        frame_range = reader.frame_range
+        key_frames = reader.get_key_frames()
+        if not frame_range or frame_range[0] not in key_frames:
+            return
+
+        with closing(av.open(self._source_path, mode='r')) as container:
+            video_stream = next(stream for stream in container.streams if stream.type == 'video')
+            if not self._can_remux(video_stream):
+                return
+
+            container.seek(offset=key_frames[frame_range[0]], stream=video_stream)
+
+            # skip the empty packets used to flush the decoders
+            packets = (packet for packet in container.demux(video_stream) if packet.size)
+
+            for chunk_start in frame_range[::self._chunk_size]:
+                chunk_stop = min(chunk_start + self._chunk_size, frame_range[-1] + 1)
+
+                # the frames of the next chunk can't be referenced if it starts with a key frame
+                if not (chunk_stop in key_frames or chunk_stop == reader.video_length):
+                    return
+
+                chunk_packets = list(itertools.islice(packets, chunk_stop - chunk_start))
+                if (
+                    len(chunk_packets) != chunk_stop - chunk_start or
+                    not chunk_packets[0].is_keyframe or
+                    chunk_packets[0].pts != key_frames[chunk_start]
+                ):
+                    return
+
+                chunk = io.BytesIO()
+                self._writer.remux_packets(video_stream, chunk_packets, chunk)
+                chunk.seek(0)
+                yield chunk
+
 def _is_archive(path):
     mime = mimetypes.guess_type(path)
     mime_type = mime[0]
@@ -284,7 +284,7 @@ class Data(models.Model):
         return os.path.join(self.get_upload_dirname(), 'manifest.jsonl')
 
     def get_index_path(self):
-        return os.path.join(self.get_upload_dirname(), 'index.json')
+        return os.path.join(self.get_upload_dirname(), 'index.bin')
 
     def make_dirs(self):
         data_path = self.get_data_dirname()
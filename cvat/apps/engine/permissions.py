@@ -483,6 +483,7 @@ class TaskPermission(OpenPolicyAgentPermission):
             ('metadata', 'GET'): Scopes.VIEW_METADATA,
             ('metadata', 'PATCH'): Scopes.UPDATE_METADATA,
             ('data', 'GET'): Scopes.VIEW_DATA,
+            ('prefetch_data', 'POST'): Scopes.VIEW_DATA,
             ('data', 'POST'): Scopes.UPLOAD_DATA,
             ('append_data_chunk', 'PATCH'): Scopes.UPLOAD_DATA,
             ('append_data_chunk', 'HEAD'): Scopes.UPLOAD_DATA,
@@ -713,6 +714,7 @@ class JobPermission(OpenPolicyAgentPermission):
             ('append_annotations_chunk', 'PATCH'): Scopes.UPDATE_ANNOTATIONS,
             ('append_annotations_chunk', 'HEAD'): Scopes.UPDATE_ANNOTATIONS,
             ('data', 'GET'): Scopes.VIEW_DATA,
+            ('prefetch_data', 'POST'): Scopes.VIEW_DATA,
             ('metadata','GET'): Scopes.VIEW_METADATA,
             ('metadata','PATCH'): Scopes.UPDATE_METADATA,
             ('issues', 'GET'): Scopes.VIEW,
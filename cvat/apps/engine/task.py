@@ -1,12 +1,14 @@
 # Copyright (C) 2018-2022 Intel Corporation
-# Copyright (C) 2022-2023 CVAT.ai Corporation
+# Copyright (C) 2022-2024 CVAT.ai Corporation
 #
 # SPDX-License-Identifier: MIT
 
 import itertools
 import fnmatch
 import os
-from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Union, Iterable
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Union, Iterable
 from rest_framework.serializers import ValidationError
 import rq
 import re
@@ -28,13 +30,16 @@ from cvat.apps.engine.log import ServerLogManager
 from cvat.apps.engine.media_extractors import (MEDIA_TYPES, ImageListReader, Mpeg4ChunkWriter, Mpeg4CompressedChunkWriter,
     ValidateDimension, ZipChunkWriter, ZipCompressedChunkWriter, get_mime, sort)
 from cvat.apps.engine.utils import (
-    av_scan_paths,get_rq_job_meta, define_dependent_job, get_rq_lock_by_user, preload_images
+    av_scan_paths,get_rq_job_meta, define_dependent_job, get_rq_lock_by_user, preload_images,
+    get_chunk_compression_options,
 )
 from cvat.apps.engine.rq_job_handler import RQIdManager
 from cvat.utils.http import make_requests_session, PROXIES_FOR_UNTRUSTED_URLS
 from utils.dataset_manifest import ImageManifestManager, VideoManifestManager, is_manifest
 from utils.dataset_manifest.core import VideoManifestValidator, is_dataset_manifest
 from utils.dataset_manifest.utils import detect_related_images
+from .cloud_downloader import DownloadProgress
+from .cloud_object_cache import CloudObjectCache
 from .cloud_provider import db_storage_to_storage_instance
 
 slogger = ServerLogManager(__name__)
@@ -407,13 +412,74 @@ def _download_data(urls, upload_dir):
 
     return list(local_files.keys())
 
+def _make_download_progress_callback(
+    files_count: int, *, update_interval: float = 1
+) -> Optional[Callable[[DownloadProgress], None]]:
+    # The callback is called from the download threads, where the current rq job is unavailable
+    job = rq.get_current_job()
+    if not job:
+        return None
+
+    lock = threading.Lock()
+    last_update = 0
+    last_downloaded_files = 0
+
+    def _update_progress(progress: DownloadProgress):
+        nonlocal last_update, last_downloaded_files
+        # some of the files can be reused from the previous downloads
+        is_last = progress.downloaded_files >= (progress.total_files or files_count)
+
+        # Skip the intermediate updates while another thread is saving the status
+        if not lock.acquire(blocking=is_last):
+            return
+
+        try:
+            now = time.monotonic()
+            if progress.downloaded_files <= last_downloaded_files or (
+                not is_last and now - last_update < update_interval
+            ):
+                return
+
+            last_update = now
+            last_downloaded_files = progress.downloaded_files
+            job.meta['status'] = 'Downloaded {} of {} files from the cloud storage ({:.1f} MB)'.format(
+                progress.downloaded_files, files_count, progress.downloaded_bytes / 2**20
+            )
+            job.save_meta()
+        finally:
+            lock.release()
+
+    return _update_progress
+
 def _download_data_from_cloud_storage(
     db_storage: models.CloudStorage,
     files: List[str],
     upload_dir: str,
+    *,
+    checksums: Optional[Dict[str, Optional[str]]] = None,
 ):
     cloud_storage_instance = db_storage_to_storage_instance(db_storage)
-    cloud_storage_instance.bulk_download_to_dir(files, upload_dir)
+    progress_callback = _make_download_progress_callback(len(files))
+    object_cache = CloudObjectCache()
+    if not checksums or not object_cache.enabled:
+        cloud_storage_instance.bulk_download_to_dir(files, upload_dir,
+            progress_callback=progress_callback)
+        return
+
+    # the files with known checksums can be reused from the previous downloads
+    with object_cache.download_files(
+        cloud_storage_instance, db_storage.id, [(f, checksums.get(f)) for f in files],
+        progress_callback=progress_callback,
+    ) as paths:
+        for f, path in zip(files, paths):
+            dst_path = os.path.join(upload_dir, f)
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            try:
+                # the files are only read, so they can share the data with the cached objects
+                os.link(path, dst_path)
+            except OSError:
+                # e.g. the cache is on another file system
+                shutil.copyfile(path, dst_path)
 
 def _get_manifest_frame_indexer(start_frame=0, frame_step=1):
     return lambda frame_id: start_frame + frame_id * frame_step
@@ -689,7 +755,16 @@ def _create_thread(
                 step = db_data.get_frame_step()
                 if start_frame or step != 1 or stop_frame != len(filtered_data) - 1:
                     media_to_download = filtered_data[start_frame : stop_frame + 1: step]
-            _download_data_from_cloud_storage(db_data.cloud_storage, media_to_download, upload_dir)
+
+            checksums = None
+            if manifest_file:
+                checksums = {
+                    os.path.join(cloud_storage_manifest_prefix, image.full_name): image.get('checksum')
+                    for _, image in cloud_storage_manifest
+                }
+
+            _download_data_from_cloud_storage(db_data.cloud_storage, media_to_download, upload_dir,
+                checksums=checksums)
             del media_to_download
             del filtered_data
             is_data_in_cloud = False
@@ -942,7 +1017,12 @@ def _create_thread(
     kwargs = {}
     if validate_dimension.dimension == models.DimensionType.DIM_3D:
         kwargs["dimension"] = validate_dimension.dimension
-    compressed_chunk_writer = compressed_chunk_writer_class(db_data.image_quality, **kwargs)
+    compressed_chunk_writer_kwargs = dict(kwargs)
+    if compressed_chunk_writer_class is ZipCompressedChunkWriter:
+        compressed_chunk_writer_kwargs.update(get_chunk_compression_options())
+    compressed_chunk_writer = compressed_chunk_writer_class(
+        db_data.image_quality, **compressed_chunk_writer_kwargs
+    )
     original_chunk_writer = original_chunk_writer_class(original_quality, **kwargs)
 
     # calculate chunk size if it isn't specified
@@ -1040,37 +1120,40 @@ def _create_thread(
                 else:
                     manifest.init_index()
                 counter = itertools.count()
-                for _, chunk_frames in itertools.groupby(extractor.frame_range, lambda x: next(counter) // db_data.chunk_size):
-                    chunk_paths = [(extractor.get_path(i), i) for i in chunk_frames]
-                    img_sizes = []
-
-                    for chunk_path, frame_id in chunk_paths:
-                        properties = manifest[manifest_index(frame_id)]
-
-                        # check mapping
-                        if not chunk_path.endswith(f"{properties['name']}{properties['extension']}"):
-                            raise Exception('Incorrect file mapping to manifest content')
-
-                        if db_task.dimension == models.DimensionType.DIM_2D and (
-                            properties.get('width') is not None and
-                            properties.get('height') is not None
-                        ):
-                            resolution = (properties['width'], properties['height'])
-                        elif is_data_in_cloud:
-                            raise Exception(
-                                "Can't find image '{}' width or height info in the manifest"
-                                .format(f"{properties['name']}{properties['extension']}")
-                            )
-                        else:
-                            resolution = extractor.get_image_size(frame_id)
-                        img_sizes.append(resolution)
-
-                    db_images.extend([
-                        models.Image(data=db_data,
-                            path=os.path.relpath(path, upload_dir),
-                            frame=frame, width=w, height=h)
-                        for (path, frame), (w, h) in zip(chunk_paths, img_sizes)
-                    ])
+                with manifest.open_reader() as manifest_reader:
+                    for _, chunk_frames in itertools.groupby(extractor.frame_range, lambda x: next(counter) // db_data.chunk_size):
+                        chunk_paths = [(extractor.get_path(i), i) for i in chunk_frames]
+                        img_sizes = []
+                        chunk_properties = manifest_reader.get_many(
+                            manifest_index(frame_id) for _, frame_id in chunk_paths
+                        )
+
+                        for (chunk_path, frame_id), properties in zip(chunk_paths, chunk_properties):
+
+                            # check mapping
+                            if not chunk_path.endswith(f"{properties['name']}{properties['extension']}"):
+                                raise Exception('Incorrect file mapping to manifest content')
+
+                            if db_task.dimension == models.DimensionType.DIM_2D and (
+                                properties.get('width') is not None and
+                                properties.get('height') is not None
+                            ):
+                                resolution = (properties['width'], properties['height'])
+                            elif is_data_in_cloud:
+                                raise Exception(
+                                    "Can't find image '{}' width or height info in the manifest"
+                                    .format(f"{properties['name']}{properties['extension']}")
+                                )
+                            else:
+                                resolution = extractor.get_image_size(frame_id)
+                            img_sizes.append(resolution)
+
+                        db_images.extend([
+                            models.Image(data=db_data,
+                                path=os.path.relpath(path, upload_dir),
+                                frame=frame, width=w, height=h)
+                            for (path, frame), (w, h) in zip(chunk_paths, img_sizes)
+                        ])
     if db_data.storage_method == models.StorageMethodChoice.FILE_SYSTEM or not settings.USE_CACHE:
         counter = itertools.count()
         generator = itertools.groupby(extractor, lambda _: next(counter) // db_data.chunk_size)
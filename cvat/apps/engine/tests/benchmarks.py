@@ -0,0 +1,93 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Benchmarks for the media data serving code.
+
+The module is not picked up by the default test discovery, run it explicitly:
+
+    python manage.py test --settings cvat.settings.testing \
+        cvat.apps.engine.tests.benchmarks
+
+The problem sizes can be adjusted in the class attributes.
+"""
+
+import os
+import tracemalloc
+from contextlib import contextmanager
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import RequestFactory, SimpleTestCase
+
+from cvat.apps.engine.cache import MediaCache, MediaCacheFiles
+from cvat.apps.engine.views import _make_data_response
+
+
+@contextmanager
+def _measure(name: str):
+    tracemalloc.start()
+    started = perf_counter()
+    yield
+    elapsed = perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name}: {elapsed:.2f}s, peak memory {peak / 2**20:.1f}MB")
+
+
+class _NoLock:
+    def acquire(self, **kwargs):
+        return True
+
+    def release(self):
+        pass
+
+
+class MediaChunkResponseBenchmark(SimpleTestCase):
+    CHUNK_SIZE = 64 * 2**20
+    REQUEST_COUNT = 20
+
+    def setUp(self):
+        self._chunk = os.urandom(self.CHUNK_SIZE)
+
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+
+        patcher = mock.patch.object(MediaCache, '_get_cache_item_lock', return_value=_NoLock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _make_media_cache(self, *, use_files: bool) -> MediaCache:
+        media_cache = MediaCache()
+        media_cache._cache = LocMemCache(f'media-cache-benchmark-{use_files}', {})
+        media_cache._cache.clear()
+        media_cache._files = MediaCacheFiles(self._tmp_dir.name,
+            max_size=2 * self.CHUNK_SIZE if use_files else 0)
+        return media_cache
+
+    def _serve_chunks(self, media_cache: MediaCache):
+        chunk = self._chunk
+        request = RequestFactory().get('/')
+
+        for _ in range(self.REQUEST_COUNT):
+            data, mime_type, checksum = media_cache._get_or_set_chunk_item('chunk',
+                lambda: (BytesIO(chunk), 'application/zip'), with_checksum=True)
+            response = _make_data_response(request, data, mime_type, checksum=checksum)
+
+            # the server sends the response by blocks
+            for _ in response:
+                pass
+            response.close()
+
+    def test_serve_cached_chunks(self):
+        print(f"\n{self.REQUEST_COUNT} requests x {self.CHUNK_SIZE // 2**20}MB chunk")
+
+        with _measure("media cache"):
+            self._serve_chunks(self._make_media_cache(use_files=False))
+
+        with _measure("chunk files"):
+            self._serve_chunks(self._make_media_cache(use_files=True))
@@ -0,0 +1,464 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import os.path as osp
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+from PIL import Image
+
+from cvat.apps.engine.cache import (
+    ManifestDirectoryTreeCache, MediaCache, MediaCacheFiles, MediaCachePrefetcher
+)
+from cvat.apps.engine.cloud_object_cache import CloudObjectCache
+from cvat.apps.engine.frame_provider import FrameProvider
+from cvat.apps.engine.models import DimensionType, SegmentType
+from cvat.apps.engine.utils import md5_hash
+from utils.dataset_manifest import ImageManifestManager
+
+
+class _LocalLocks:
+    # fakeredis locks can't be used from several threads reliably,
+    # just implement the locks here
+    def __init__(self):
+        self._locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def __call__(self, key):
+        with self._guard:
+            return self._locks[key]
+
+
+class MediaCacheTest(SimpleTestCase):
+    def _make_media_cache(self) -> MediaCache:
+        media_cache = MediaCache()
+        media_cache._cache = LocMemCache(f'media-cache-test-{id(self)}', {})
+        media_cache._cache.clear()
+        return media_cache
+
+    def test_concurrent_requests_for_the_same_chunk_build_it_once(self):
+        media_cache = self._make_media_cache()
+        requests_count = 8
+        build_count = 0
+        build_count_lock = threading.Lock()
+        all_requests_started = threading.Barrier(requests_count)
+
+        def prepare_chunk():
+            nonlocal build_count
+            with build_count_lock:
+                build_count += 1
+
+            # give the other requests a chance to miss the cache
+            time.sleep(0.5)
+            return BytesIO(b'chunk data'), 'application/zip'
+
+        def get_chunk(_):
+            all_requests_started.wait()
+            return media_cache._get_or_set_cache_item('chunk_key', prepare_chunk)
+
+        with (
+            mock.patch.object(MediaCache, '_get_cache_item_lock', new=_LocalLocks()),
+            ThreadPoolExecutor(max_workers=requests_count) as executor,
+        ):
+            results = list(executor.map(get_chunk, range(requests_count)))
+
+        self.assertEqual(build_count, 1)
+        for buffer, mime_type in results:
+            self.assertEqual(buffer.getvalue(), b'chunk data')
+            self.assertEqual(mime_type, 'application/zip')
+
+        stats = media_cache.get_stats()
+        self.assertEqual(stats[MediaCache.Stats.BUILDS.value], 1)
+        self.assertEqual(
+            stats[MediaCache.Stats.COALESCED.value] + stats[MediaCache.Stats.HITS.value],
+            requests_count - 1
+        )
+        self.assertEqual(stats[MediaCache.Stats.LOCK_TIMEOUTS.value], 0)
+
+    def test_can_build_chunk_if_waiting_for_another_request_timed_out(self):
+        media_cache = self._make_media_cache()
+        locks = _LocalLocks()
+        locks('chunk_key').acquire() # emulate a stuck request
+
+        with (
+            mock.patch.object(MediaCache, '_get_cache_item_lock', new=locks),
+            self.settings(MEDIA_CACHE_ITEM_LOCK_TIMEOUT=0.1),
+        ):
+            buffer, _ = media_cache._get_or_set_cache_item(
+                'chunk_key', lambda: (BytesIO(b'chunk data'), 'application/zip')
+            )
+
+        self.assertEqual(buffer.getvalue(), b'chunk data')
+        self.assertEqual(media_cache.get_stats()[MediaCache.Stats.LOCK_TIMEOUTS.value], 1)
+
+    def test_consecutive_video_chunks_are_built_together(self):
+        media_cache = self._make_media_cache()
+        db_data = SimpleNamespace(id=1, video=SimpleNamespace(path='video.mp4'))
+        quality = FrameProvider.Quality.ORIGINAL
+        media_cache._cache.set(media_cache._make_task_chunk_key(db_data.id, 3, quality), 'cached')
+
+        built_ranges = []
+        def prepare_video_chunks(db_data, quality, start_chunk, chunk_count):
+            built_ranges.append((start_chunk, chunk_count))
+            for chunk_number in range(start_chunk, start_chunk + chunk_count):
+                yield chunk_number, (BytesIO(f'chunk {chunk_number}'.encode()), 'video/mp4')
+
+        with (
+            mock.patch.object(MediaCache, '_get_cache_item_lock', new=_LocalLocks()),
+            mock.patch.object(media_cache, '_prepare_video_task_chunks', prepare_video_chunks),
+        ):
+            media_cache.prepare_task_chunks([5, 1, 2, 3, 4, 7], quality, db_data)
+
+        self.assertEqual(built_ranges, [(1, 2), (4, 2), (7, 1)])
+        for chunk_number in [1, 2, 4, 5, 7]:
+            buffer, _ = media_cache._get_or_set_cache_item(
+                media_cache._make_task_chunk_key(db_data.id, chunk_number, quality),
+                create_function=None,
+            )
+            self.assertEqual(buffer.getvalue(), f'chunk {chunk_number}'.encode())
+
+    def test_consecutive_video_chunks_are_built_under_item_locks(self):
+        media_cache = self._make_media_cache()
+        locks = _LocalLocks()
+        db_data = SimpleNamespace(id=1, video=SimpleNamespace(path='video.mp4'))
+        quality = FrameProvider.Quality.ORIGINAL
+
+        def get_chunk_key(chunk_number):
+            return media_cache._make_task_chunk_key(db_data.id, chunk_number, quality)
+
+        built_ranges = []
+        built_chunks = []
+        def prepare_video_chunks(db_data, quality, start_chunk, chunk_count):
+            built_ranges.append((start_chunk, chunk_count))
+            for chunk_number in range(start_chunk, start_chunk + chunk_count):
+                self.assertTrue(locks(get_chunk_key(chunk_number)).locked())
+                built_chunks.append(chunk_number)
+
+                if chunk_number == 1:
+                    # another request prepares the next chunk meanwhile
+                    media_cache._cache.set(get_chunk_key(2),
+                        (BytesIO(b'other'), 'video/mp4', zlib.crc32(b'other')))
+
+                yield chunk_number, (BytesIO(f'chunk {chunk_number}'.encode()), 'video/mp4')
+
+        with (
+            mock.patch.object(MediaCache, '_get_cache_item_lock', new=locks),
+            mock.patch.object(media_cache, '_prepare_video_task_chunks', prepare_video_chunks),
+        ):
+            media_cache.prepare_task_chunks([1, 2, 3, 4], quality, db_data)
+
+        self.assertEqual(built_ranges, [(1, 4), (3, 2)])
+        self.assertEqual(built_chunks, [1, 3, 4])
+        for chunk_number, expected_data in [
+            (1, b'chunk 1'), (2, b'other'), (3, b'chunk 3'), (4, b'chunk 4')
+        ]:
+            buffer, _ = media_cache._get_or_set_cache_item(get_chunk_key(chunk_number),
+                create_function=None)
+            self.assertEqual(buffer.getvalue(), expected_data)
+
+    def test_can_keep_chunks_in_files(self):
+        media_cache = self._make_media_cache()
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        media_cache._files = MediaCacheFiles(tmp_dir.name, max_size=2**20)
+
+        build_count = 0
+        def prepare_chunk():
+            nonlocal build_count
+            build_count += 1
+            return BytesIO(b'chunk data'), 'application/zip'
+
+        with mock.patch.object(MediaCache, '_get_cache_item_lock', new=_LocalLocks()):
+            path, mime_type, checksum = media_cache._get_or_set_chunk_item(
+                'chunk_key', prepare_chunk, with_checksum=True
+            )
+            self.assertTrue(media_cache._has_chunk_item('chunk_key'))
+            self.assertEqual(
+                media_cache._get_or_set_chunk_item('chunk_key', prepare_chunk, with_checksum=True),
+                (path, mime_type, checksum)
+            )
+
+            os.remove(path)
+            rebuilt_path, _ = media_cache._get_or_set_chunk_item('chunk_key', prepare_chunk)
+
+        self.assertEqual(build_count, 2)
+        self.assertEqual(rebuilt_path, path)
+        self.assertTrue(path.startswith(tmp_dir.name) and path.endswith('.zip'))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'chunk data')
+        self.assertEqual(mime_type, 'application/zip')
+        self.assertEqual(checksum, zlib.crc32(b'chunk data'))
+
+    def test_can_return_chunk_data_if_chunk_file_is_removed_after_writing(self):
+        media_cache = self._make_media_cache()
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        media_cache._files = MediaCacheFiles(tmp_dir.name, max_size=2**20)
+
+        with (
+            mock.patch.object(MediaCache, '_get_cache_item_lock', new=_LocalLocks()),
+            mock.patch.object(media_cache._files, 'get_path', return_value=None),
+        ):
+            buffer, mime_type, checksum = media_cache._get_or_set_chunk_item(
+                'chunk_key', lambda: (BytesIO(b'chunk data'), 'application/zip'),
+                with_checksum=True
+            )
+
+        self.assertEqual(buffer.getvalue(), b'chunk data')
+        self.assertEqual(mime_type, 'application/zip')
+        self.assertEqual(checksum, zlib.crc32(b'chunk data'))
+
+
+class MediaCachePrefetcherTest(SimpleTestCase):
+    def _make_prefetcher(self, *, pending_rq_job_ids=()):
+        queue = mock.Mock()
+        queue.fetch_job.side_effect = lambda rq_id: mock.Mock(
+            **{'get_status.return_value': 'started'}
+        ) if rq_id in pending_rq_job_ids else None
+
+        prefetcher = MediaCachePrefetcher()
+        prefetcher._get_queue = lambda: queue
+        return prefetcher, queue
+
+    def test_can_prefetch_next_chunks(self):
+        prefetcher, queue = self._make_prefetcher()
+
+        with self.settings(MEDIA_CACHE_PREFETCH_DEPTH=3):
+            prefetcher.prefetch_next_chunks(SimpleNamespace(id=1, size=100, chunk_size=10), 4,
+                FrameProvider.Quality.COMPRESSED, stop_chunk=6, dimension=DimensionType.DIM_2D)
+
+        queue.enqueue.assert_called_once()
+        self.assertEqual(queue.enqueue.call_args.kwargs['chunk_numbers'], [5, 6])
+        self.assertEqual(queue.enqueue.call_args.kwargs['db_job_id'], None)
+
+    def test_prefetching_is_not_scheduled_after_the_last_chunk(self):
+        prefetcher, queue = self._make_prefetcher()
+
+        prefetcher.prefetch_next_chunks(SimpleNamespace(id=1, size=100, chunk_size=10), 6,
+            FrameProvider.Quality.COMPRESSED, stop_chunk=6, dimension=DimensionType.DIM_2D)
+
+        queue.enqueue.assert_not_called()
+
+    def test_prefetched_chunks_are_limited_by_task_size(self):
+        # e.g. a task with a start frame, where the chunks are computed from the frame numbers
+        db_data = SimpleNamespace(id=1, size=45, chunk_size=10)
+        prefetcher, queue = self._make_prefetcher()
+
+        prefetcher.prefetch_chunks(db_data, FrameProvider.Quality.COMPRESSED,
+            start_chunk=0, stop_chunk=9, dimension=DimensionType.DIM_2D)
+        self.assertEqual(queue.enqueue.call_args.kwargs['chunk_numbers'], [0, 1, 2, 3, 4])
+
+        queue.reset_mock()
+        with self.settings(MEDIA_CACHE_PREFETCH_DEPTH=3):
+            prefetcher.prefetch_next_chunks(db_data, 3, FrameProvider.Quality.COMPRESSED,
+                stop_chunk=9, dimension=DimensionType.DIM_2D)
+        self.assertEqual(queue.enqueue.call_args.kwargs['chunk_numbers'], [4])
+
+    def test_only_one_prefetching_job_is_pending_per_job(self):
+        db_data = SimpleNamespace(id=1, size=100, chunk_size=10)
+        db_job = SimpleNamespace(id=2, segment=SimpleNamespace(type=SegmentType.SPECIFIC_FRAMES))
+        rq_id = MediaCachePrefetcher()._make_queue_job_id(
+            db_data, FrameProvider.Quality.ORIGINAL, db_job=db_job
+        )
+        prefetcher, queue = self._make_prefetcher(pending_rq_job_ids=[rq_id])
+
+        prefetcher.prefetch_next_chunks(db_data, 0, FrameProvider.Quality.ORIGINAL,
+            stop_chunk=10, dimension=DimensionType.DIM_2D, db_job=db_job)
+
+        queue.enqueue.assert_not_called()
+
+    def test_prefetching_jobs_of_different_jobs_dont_block_each_other(self):
+        db_data = SimpleNamespace(id=1, size=100, chunk_size=10)
+        db_jobs = [
+            SimpleNamespace(id=job_id, segment=SimpleNamespace(type=SegmentType.RANGE))
+            for job_id in (2, 3)
+        ]
+        rq_id = MediaCachePrefetcher()._make_queue_job_id(
+            db_data, FrameProvider.Quality.COMPRESSED, db_job=db_jobs[0]
+        )
+        prefetcher, queue = self._make_prefetcher(pending_rq_job_ids=[rq_id])
+
+        for db_job in db_jobs:
+            prefetcher.prefetch_next_chunks(db_data, 0, FrameProvider.Quality.COMPRESSED,
+                stop_chunk=10, dimension=DimensionType.DIM_2D, db_job=db_job)
+
+        queue.enqueue.assert_called_once()
+        # the regular jobs use the task chunks
+        self.assertEqual(queue.enqueue.call_args.kwargs['db_job_id'], None)
+        self.assertNotEqual(queue.enqueue.call_args.kwargs['job_id'], rq_id)
+
+
+class _FakeCloudStorage:
+    def __init__(self, colors):
+        self.colors = colors
+        self.downloaded_files = []
+
+    def bulk_download_to_dir(self, files, upload_dir):
+        for f in files:
+            self.downloaded_files.append(f)
+            path = osp.join(upload_dir, f)
+            os.makedirs(osp.dirname(path), exist_ok=True)
+            Image.new('RGB', (4, 4), self.colors[f]).save(path)
+
+    def bulk_download_to_memory(self, files, **kwargs):
+        for f in files:
+            self.downloaded_files.append(f)
+            buffer = BytesIO()
+            Image.new('RGB', (4, 4), self.colors[f]).save(buffer, format='BMP')
+            buffer.seek(0)
+            yield buffer
+
+    def checksum(self, f):
+        return md5_hash(Image.new('RGB', (4, 4), self.colors[f]))
+
+
+class CloudObjectCacheTest(SimpleTestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+
+        self.storage = _FakeCloudStorage({
+            'a.bmp': (255, 0, 0), 'dir/b.bmp': (0, 255, 0), 'c.bmp': (0, 0, 255)
+        })
+
+    def _download(self, files, *, max_size=2**20):
+        with CloudObjectCache(self._tmp_dir.name, max_size=max_size).download_files(
+            self.storage, 1, files
+        ) as paths:
+            return [Image.open(path).getpixel((0, 0)) for path in paths]
+
+    def test_can_reuse_downloaded_files(self):
+        files = [(f, self.storage.checksum(f)) for f in ['a.bmp', 'dir/b.bmp']]
+
+        first_results = self._download(files)
+        self.storage.downloaded_files.clear()
+        second_results = self._download(files)
+
+        self.assertEqual(self.storage.downloaded_files, [])
+        self.assertEqual(second_results, first_results)
+        self.assertEqual(second_results, [(255, 0, 0), (0, 255, 0)])
+
+    def test_can_download_changed_file(self):
+        self._download([('a.bmp', self.storage.checksum('a.bmp'))])
+
+        self.storage.colors['a.bmp'] = (255, 255, 255)
+        self.storage.downloaded_files.clear()
+        results = self._download([('a.bmp', self.storage.checksum('a.bmp'))])
+
+        self.assertEqual(self.storage.downloaded_files, ['a.bmp'])
+        self.assertEqual(results, [(255, 255, 255)])
+
+    def test_files_without_checksums_are_not_cached(self):
+        self._download([('a.bmp', None)])
+        self._download([('a.bmp', None)])
+
+        self.assertEqual(self.storage.downloaded_files, ['a.bmp', 'a.bmp'])
+
+    def test_files_with_unexpected_checksums_are_not_cached(self):
+        self._download([('a.bmp', 'unexpected')])
+        self._download([('a.bmp', 'unexpected')])
+
+        self.assertEqual(self.storage.downloaded_files, ['a.bmp', 'a.bmp'])
+
+    def test_can_stream_images_and_reuse_downloaded_files(self):
+        files = [(f, self.storage.checksum(f)) for f in ['a.bmp', 'dir/b.bmp', 'c.bmp']]
+        self._download(files[1:2])
+        self.storage.downloaded_files.clear()
+
+        with CloudObjectCache(self._tmp_dir.name, max_size=2**20).open_images(
+            self.storage, 1, files
+        ) as images:
+            results = [
+                (image.getpixel((0, 0)), Image.open(path).getpixel((0, 0)))
+                for image, path in images
+            ]
+
+        self.assertEqual(self.storage.downloaded_files, ['a.bmp', 'c.bmp'])
+        self.assertEqual(results, [
+            ((255, 0, 0), (255, 0, 0)), ((0, 255, 0), (0, 255, 0)), ((0, 0, 255), (0, 0, 255))
+        ])
+
+        self.storage.downloaded_files.clear()
+        self.assertEqual(self._download(files), [(255, 0, 0), (0, 255, 0), (0, 0, 255)])
+        self.assertEqual(self.storage.downloaded_files, [])
+
+    def test_least_recently_used_files_are_removed(self):
+        files = {f: (f, self.storage.checksum(f)) for f in ['a.bmp', 'dir/b.bmp', 'c.bmp']}
+        self._download([files['a.bmp'], files['dir/b.bmp']])
+        file_size = osp.getsize(next(
+            osp.join(dirpath, filename)
+            for dirpath, _, filenames in os.walk(self._tmp_dir.name)
+            for filename in filenames
+            if filename.endswith('.bmp')
+        ))
+
+        # make sure the modification times differ
+        time.sleep(0.01)
+        self._download([files['a.bmp']])
+
+        max_size = 3 * file_size - 1
+        with self.settings(CLOUD_OBJECT_CACHE_EVICTION_INTERVAL=0):
+            self._download([files['c.bmp']], max_size=max_size)
+
+        self.storage.downloaded_files.clear()
+        self._download([files['a.bmp'], files['c.bmp']], max_size=max_size)
+        self.assertEqual(self.storage.downloaded_files, [])
+
+        self._download([files['dir/b.bmp']], max_size=max_size)
+        self.assertEqual(self.storage.downloaded_files, ['dir/b.bmp'])
+
+
+class ManifestDirectoryTreeCacheTest(SimpleTestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.manifest_path = osp.join(self._tmp_dir.name, 'manifest.jsonl')
+
+    def _write_manifest(self, names):
+        ImageManifestManager(self.manifest_path).create(content=[
+            {'name': osp.splitext(name)[0], 'extension': osp.splitext(name)[1],
+                'width': 4, 'height': 4}
+            for name in names
+        ])
+
+    def test_can_list_manifest_directories(self):
+        self._write_manifest(['img10.jpg', 'img2.jpg', 'b/1.jpg', 'a/c/2.jpg', 'a/1.jpg'])
+        tree = ManifestDirectoryTreeCache.get(self.manifest_path, manifest_prefix='data')
+
+        self.assertEqual(tree.get_page('', 0, 10), {
+            'content': [{'name': 'data', 'type': 'DIR'}], 'next': None
+        })
+        self.assertEqual(tree.get_page('data/', 1, 2), {
+            'content': [{'name': 'b', 'type': 'DIR'}, {'name': 'img2.jpg', 'type': 'REG'}],
+            'next': 3,
+        })
+        self.assertEqual(tree.get_page('data/a/', 0, 10), {
+            'content': [{'name': 'c', 'type': 'DIR'}, {'name': '1.jpg', 'type': 'REG'}],
+            'next': None,
+        })
+        self.assertEqual(tree.get_page('data/im', 0, 10), {
+            'content': [{'name': 'img2.jpg', 'type': 'REG'}, {'name': 'img10.jpg', 'type': 'REG'}],
+            'next': None,
+        })
+
+    def test_tree_is_rebuilt_when_manifest_changes(self):
+        self._write_manifest(['1.jpg'])
+        tree = ManifestDirectoryTreeCache.get(self.manifest_path)
+        self.assertIs(ManifestDirectoryTreeCache.get(self.manifest_path), tree)
+
+        self._write_manifest(['1.jpg', '2.jpg'])
+        tree = ManifestDirectoryTreeCache.get(self.manifest_path)
+
+        self.assertEqual([f['name'] for f in tree.get_page('', 0, 10)['content']],
+            ['1.jpg', '2.jpg'])
@@ -0,0 +1,257 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import os.path as osp
+import re
+import threading
+from concurrent.futures import wait
+from email.utils import formatdate
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from unittest import mock
+from urllib.parse import unquote, urlparse
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import NotFound
+
+from cvat.apps.engine.cloud_downloader import BulkDownloader, DownloadProgress
+from cvat.apps.engine.cloud_provider import AWS_S3
+from cvat.apps.engine.task import _make_download_progress_callback
+
+
+class _S3StandIn(ThreadingHTTPServer):
+    """
+    A minimal S3-compatible server with anonymous access to one bucket.
+    Supports only the requests needed to download objects.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, bucket: str, objects: dict[str, bytes]):
+        self.bucket = bucket
+        self.objects = objects
+        self.requests = []
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), _S3StandInHandler)
+
+    @property
+    def url(self) -> str:
+        return 'http://{}:{}'.format(*self.server_address)
+
+
+class _S3StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _get_key(self):
+        bucket, _, key = unquote(urlparse(self.path).path).lstrip('/').partition('/')
+        return bucket, key
+
+    def _send_object_headers(self, data: bytes, *, status: int = 200, **headers):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('ETag', f'"{md5(data).hexdigest()}"') # nosec
+        self.send_header('Last-Modified', formatdate(0, usegmt=True))
+        for name, value in headers.items():
+            self.send_header(name.replace('_', '-'), value)
+        self.end_headers()
+
+    def _send_not_found(self, *, with_body: bool):
+        body = b'<Error><Code>NoSuchKey</Code></Error>' if with_body else b''
+        self.send_response(404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _register_request(self, key: str):
+        with self.server.lock:
+            self.server.requests.append((self.command, key))
+
+    def do_HEAD(self):
+        bucket, key = self._get_key()
+        self._register_request(key)
+        if bucket != self.server.bucket or key and key not in self.server.objects:
+            self._send_not_found(with_body=False)
+        elif not key:
+            self._send_object_headers(b'')
+        else:
+            self._send_object_headers(self.server.objects[key])
+
+    def do_GET(self):
+        bucket, key = self._get_key()
+        self._register_request(key)
+        if bucket != self.server.bucket or key not in self.server.objects:
+            self._send_not_found(with_body=True)
+            return
+
+        data = self.server.objects[key]
+        if match := re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', '')):
+            start, stop = int(match[1]), min(int(match[2]) + 1, len(data))
+            self._send_object_headers(data[start:stop], status=206,
+                Content_Range=f'bytes {start}-{stop - 1}/{len(data)}')
+            self.wfile.write(data[start:stop])
+        else:
+            self._send_object_headers(data)
+            self.wfile.write(data)
+
+
+class AwsS3BulkDownloadTest(SimpleTestCase):
+    def setUp(self):
+        self.objects = {f'dir/{i}.bin': os.urandom(1000 + i) for i in range(30)}
+        self.server = _S3StandIn('bucket', self.objects)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.storage = AWS_S3('bucket', endpoint_url=self.server.url)
+
+    def test_can_download_files_to_memory_in_order(self):
+        keys = list(self.objects)
+        progress = []
+
+        results = list(self.storage.bulk_download_to_memory(keys, threads_number=4,
+            progress_callback=progress.append, _use_optimal_downloading=False))
+
+        self.assertEqual([r.getvalue() for r in results], [self.objects[k] for k in keys])
+        self.assertEqual(
+            sorted(key for method, key in self.server.requests if method == 'GET'), sorted(keys)
+        )
+        # the progress can be reported out of order
+        last_progress = max(progress, key=lambda p: p.downloaded_files)
+        self.assertEqual(last_progress.downloaded_files, len(keys))
+        self.assertEqual(last_progress.downloaded_bytes, sum(map(len, self.objects.values())))
+
+    def test_can_download_files_to_dir(self):
+        with TemporaryDirectory() as upload_dir:
+            self.storage.bulk_download_to_dir(list(self.objects), upload_dir, threads_number=4)
+
+            for key, data in self.objects.items():
+                with open(osp.join(upload_dir, key), 'rb') as f:
+                    self.assertEqual(f.read(), data)
+
+    def test_missing_files_are_not_retried(self):
+        with self.assertRaises(NotFound), self.settings(CLOUD_DATA_DOWNLOADING_RETRY_DELAY=0):
+            list(self.storage.bulk_download_to_memory(['dir/0.bin', 'missing.bin'],
+                _use_optimal_downloading=False))
+
+        # the object and its status are requested once
+        self.assertEqual(self.server.requests.count(('HEAD', 'missing.bin')), 2)
+
+
+class BulkDownloaderTest(SimpleTestCase):
+    def test_can_retry_failed_downloads(self):
+        attempts = {}
+        def download(key):
+            attempts[key] = attempts.get(key, 0) + 1
+            if attempts[key] < 3:
+                raise ConnectionResetError()
+            return key.encode()
+
+        downloader = BulkDownloader(download, get_size=len, max_concurrency=2,
+            max_retries=2, retry_delay=0)
+
+        self.assertEqual(list(downloader.download(['a', 'b'])), [b'a', b'b'])
+        self.assertEqual(attempts, {'a': 3, 'b': 3})
+
+    def test_can_stop_retrying(self):
+        def download(key):
+            raise ConnectionResetError()
+
+        downloader = BulkDownloader(download, get_size=len, max_concurrency=2,
+            max_retries=2, retry_delay=0)
+
+        with self.assertRaises(ConnectionResetError):
+            list(downloader.download(['a']))
+
+    def _make_pending_limit_downloader(self, started: list, *,
+        item_size: int, max_concurrency: int, max_pending_size: int
+    ):
+        finished = []
+        other_downloads_stopped = threading.Event()
+
+        def download(key):
+            started.append(key)
+            if key == '0':
+                # the next files are downloaded while waiting for the first one
+                other_downloads_stopped.wait(timeout=10)
+            finished.append(key)
+            return key.encode().ljust(item_size)
+
+        def wait_downloads(futures, **kwargs):
+            # The first file is the only running download, and the finished ones
+            # have reached the pending size limit. No more downloads can be started.
+            if len(futures) == 1 and len(finished) > max_pending_size // item_size:
+                other_downloads_stopped.set()
+            return wait(futures, **kwargs)
+
+        patcher = mock.patch('cvat.apps.engine.cloud_downloader.wait', wait_downloads)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return BulkDownloader(download, get_size=len, max_concurrency=max_concurrency,
+            max_retries=0)
+
+    def test_pending_downloads_are_limited(self):
+        item_size = 100
+        max_pending_size = 250
+        max_concurrency = 4
+        started = []
+        downloader = self._make_pending_limit_downloader(started, item_size=item_size,
+            max_concurrency=max_concurrency, max_pending_size=max_pending_size)
+
+        downloads = downloader.download([str(i) for i in range(100)],
+            max_pending_size=max_pending_size)
+        next(downloads)
+        downloads.close()
+
+        # the downloaded files are below the size limit before the last downloads are started
+        self.assertLessEqual(len(started), max_pending_size // item_size + max_concurrency)
+
+    def test_downloading_waits_for_consumer(self):
+        item_size = 100
+        max_pending_size = 250
+        max_concurrency = 4
+        files = [str(i) for i in range(100)]
+        started = []
+        downloader = self._make_pending_limit_downloader(started, item_size=item_size,
+            max_concurrency=max_concurrency, max_pending_size=max_pending_size)
+
+        downloads = downloader.download(files, max_pending_size=max_pending_size)
+        self.assertEqual(next(downloads).rstrip(), b'0')
+
+        # no new downloads are started until the next files are requested
+        self.assertLessEqual(len(started), max_pending_size // item_size + max_concurrency)
+
+        self.assertEqual([f.rstrip().decode() for f in downloads], files[1:])
+        self.assertEqual(len(started), len(files))
+
+
+class DownloadProgressCallbackTest(SimpleTestCase):
+    def test_no_callback_outside_rq_job(self):
+        with mock.patch('rq.get_current_job', return_value=None):
+            self.assertIsNone(_make_download_progress_callback(3))
+
+    def test_status_updates_are_throttled(self):
+        rq_job = mock.Mock(meta={})
+        with mock.patch('rq.get_current_job', return_value=rq_job):
+            callback = _make_download_progress_callback(3, update_interval=60)
+
+        # the callback is called from the download threads, where there is no current rq job
+        for progress in [
+            DownloadProgress(downloaded_files=1, total_files=3, downloaded_bytes=2**20),
+            DownloadProgress(downloaded_files=2, total_files=3, downloaded_bytes=2 * 2**20),
+            DownloadProgress(downloaded_files=3, total_files=3, downloaded_bytes=3 * 2**20),
+        ]:
+            thread = threading.Thread(target=callback, args=(progress,))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(rq_job.save_meta.call_count, 2)
+        self.assertEqual(rq_job.meta['status'],
+            'Downloaded 3 of 3 files from the cloud storage (3.0 MB)')
@@ -0,0 +1,82 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os.path as osp
+import zipfile
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from cvat.apps.engine.frame_provider import FrameProvider
+from cvat.apps.engine.models import DataChoice, StorageMethodChoice
+
+
+class FrameProviderParallelFramesTest(SimpleTestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+
+        frames_count = 23
+        chunk_size = 5
+        for chunk_number in range(0, (frames_count - 1) // chunk_size + 1):
+            with zipfile.ZipFile(self._get_chunk_path(chunk_number), 'w') as chunk:
+                for frame in range(chunk_number * chunk_size,
+                        min(frames_count, (chunk_number + 1) * chunk_size)):
+                    image = BytesIO()
+                    Image.new('RGB', (8, 8), (frame * 10, 0, 0)).save(image, format='PNG')
+                    chunk.writestr(f'{frame:06d}.png', image.getvalue())
+
+        self.db_data = SimpleNamespace(
+            id=1, size=frames_count, chunk_size=chunk_size,
+            storage_method=StorageMethodChoice.FILE_SYSTEM,
+            compressed_chunk_type=DataChoice.IMAGESET,
+            original_chunk_type=DataChoice.IMAGESET,
+            get_compressed_chunk_path=self._get_chunk_path,
+            get_original_chunk_path=self._get_chunk_path,
+        )
+        self.frame_provider = FrameProvider(self.db_data)
+
+    def _get_chunk_path(self, chunk_number):
+        return osp.join(self._tmp_dir.name, f'{chunk_number}.zip')
+
+    def _read_frames(self, frames):
+        return [(frame.getvalue(), mime) for frame, mime in frames]
+
+    def test_frames_match_sequential_frames(self):
+        for start_frame, stop_frame in [(0, 23), (3, 17), (6, 9), (7, 8), (12, 23), (5, 5)]:
+            expected = self._read_frames(
+                self.frame_provider.get_frames(start_frame, stop_frame))
+
+            for max_workers in [1, 3]:
+                with self.subTest(start=start_frame, stop=stop_frame, max_workers=max_workers):
+                    actual = self._read_frames(self.frame_provider.get_frames_parallel(
+                        start_frame, stop_frame, max_workers=max_workers))
+
+                    self.assertEqual(actual, expected)
+                    self.assertEqual(len(actual), stop_frame - start_frame)
+
+    def test_can_close_frames_early(self):
+        with mock.patch.object(self.frame_provider, '_read_chunk_frames',
+            wraps=self.frame_provider._read_chunk_frames
+        ) as read_chunk_frames:
+            frames = self.frame_provider.get_frames_parallel(3, 23, max_workers=2)
+
+            first_frame = next(frames)
+            frames.close()
+
+            self.assertEqual(self._read_frames([first_frame]),
+                self._read_frames(self.frame_provider.get_frames(3, 4)))
+            self.assertLessEqual(read_chunk_frames.call_count, 2)
+            self.assertEqual(list(frames), [])
+
+    def test_invalid_worker_count_is_rejected_before_reading(self):
+        with mock.patch.object(self.frame_provider, '_get_chunk_source') as get_chunk_source:
+            with self.assertRaises(ValueError):
+                self.frame_provider.get_frames_parallel(0, 5, max_workers=0)
+
+        get_chunk_source.assert_not_called()
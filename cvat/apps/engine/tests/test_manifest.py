@@ -0,0 +1,202 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import builtins
+import json
+import os
+import os.path as osp
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from utils.dataset_manifest import ImageManifestManager
+from utils.dataset_manifest.core import _Index
+
+
+class ManifestReaderTest(SimpleTestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.manifest_path = osp.join(self._tmp_dir.name, 'manifest.jsonl')
+
+        self.names = [f'image_{i}' for i in range(10)]
+        ImageManifestManager(self.manifest_path).create(content=[
+            {'name': name, 'extension': '.jpg', 'width': 4, 'height': 4}
+            for name in self.names
+        ])
+
+        self.manifest = ImageManifestManager(self.manifest_path)
+        self.manifest.init_index()
+
+    def _count_manifest_opens(self):
+        original_open = builtins.open
+        opened_paths = []
+
+        def _open(file, *args, **kwargs):
+            opened_paths.append(file)
+            return original_open(file, *args, **kwargs)
+
+        patcher = mock.patch('builtins.open', _open)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return lambda: opened_paths.count(self.manifest_path)
+
+    def test_can_get_many_items_in_requested_order(self):
+        numbers = [7, 2, 9, 2, 0]
+
+        items = self.manifest.get_many(numbers)
+
+        self.assertEqual([item['name'] for item in items], [self.names[i] for i in numbers])
+
+    def test_manifest_is_opened_once_for_reader(self):
+        get_opens_count = self._count_manifest_opens()
+
+        with self.manifest.open_reader():
+            items = [self.manifest[i] for i in [5, 1, 8]]
+            items.extend(self.manifest.get_many([3, 0]))
+
+        self.assertEqual(get_opens_count(), 1)
+        self.assertEqual([item['name'] for item in items],
+            [self.names[i] for i in [5, 1, 8, 3, 0]])
+
+    def test_reader_reuses_parsed_items(self):
+        with self.manifest.open_reader(cache_size=4) as reader:
+            with mock.patch.object(reader, '_parse_item', wraps=reader._parse_item) as parse:
+                reader.get_many([3, 1, 2])
+                self.assertEqual(parse.call_count, 3)
+
+                self.assertIs(self.manifest[1], reader.get_many([1])[0])
+                self.assertEqual(parse.call_count, 3)
+
+                # the least recently used item is evicted
+                reader.get_many([4, 5])
+                reader[2]
+                self.assertEqual(parse.call_count, 6)
+
+    def test_items_are_read_without_reader(self):
+        get_opens_count = self._count_manifest_opens()
+
+        self.assertEqual(self.manifest[4]['name'], self.names[4])
+        self.assertEqual(self.manifest[6]['name'], self.names[6])
+        self.assertEqual(get_opens_count(), 2)
+
+
+class ManifestIndexTest(SimpleTestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.manifest_path = osp.join(self._tmp_dir.name, 'manifest.jsonl')
+        self.index_path = osp.join(self._tmp_dir.name, _Index.FILE_NAME)
+        self.legacy_index_path = osp.join(self._tmp_dir.name, _Index.LEGACY_FILE_NAME)
+
+        self._write_manifest(3)
+
+    def _write_manifest(self, images_count):
+        self.names = [f'image_{i}' for i in range(images_count)]
+        ImageManifestManager(self.manifest_path).create(content=[
+            {'name': name, 'extension': '.jpg', 'width': 4, 'height': 4}
+            for name in self.names
+        ])
+
+    def _open_manifest(self):
+        manifest = ImageManifestManager(self.manifest_path)
+        with mock.patch.object(_Index, 'create', autospec=True, side_effect=_Index.create) as create:
+            manifest.init_index()
+        return manifest, create.call_count > 0
+
+    def _check_manifest_items(self, manifest):
+        self.assertEqual([item['name'] for _, item in manifest], self.names)
+        self.assertEqual([item['name'] for item in manifest.get_many([2, 0])],
+            [self.names[2], self.names[0]])
+
+    def test_can_reuse_actual_index(self):
+        manifest, rebuilt = self._open_manifest()
+
+        self.assertFalse(rebuilt)
+        self.assertTrue(manifest.index.is_actual(self.manifest_path))
+        self._check_manifest_items(manifest)
+
+    def test_can_convert_legacy_index(self):
+        manifest, _ = self._open_manifest()
+        offsets = list(manifest.index)
+        os.remove(self.index_path)
+        with open(self.legacy_index_path, 'w') as f:
+            json.dump({str(i): offset for i, offset in enumerate(offsets)}, f)
+
+        manifest, rebuilt = self._open_manifest()
+
+        self.assertFalse(rebuilt)
+        self.assertTrue(osp.isfile(self.index_path))
+        self.assertFalse(osp.exists(self.legacy_index_path))
+        self.assertEqual(list(manifest.index), offsets)
+        self._check_manifest_items(manifest)
+
+        index = _Index(self._tmp_dir.name)
+        index.load()
+        self.assertTrue(index.is_actual(self.manifest_path))
+
+    def test_index_is_rebuilt_when_manifest_size_changes(self):
+        with open(self.manifest_path, 'a') as f:
+            f.write('{"name":"image_3","extension":".jpg","width":4,"height":4}\n')
+        self.names.append('image_3')
+
+        manifest, rebuilt = self._open_manifest()
+
+        self.assertTrue(rebuilt)
+        self.assertEqual(len(manifest), 4)
+        self._check_manifest_items(manifest)
+
+    def test_index_is_rebuilt_when_manifest_mtime_changes(self):
+        mtime = os.stat(self.manifest_path).st_mtime_ns + 10 ** 9
+        os.utime(self.manifest_path, ns=(mtime, mtime))
+
+        manifest, rebuilt = self._open_manifest()
+
+        self.assertTrue(rebuilt)
+        self._check_manifest_items(manifest)
+
+        index = _Index(self._tmp_dir.name)
+        index.load()
+        self.assertTrue(index.is_actual(self.manifest_path))
+
+    def _check_index_is_rebuilt(self, index_file_content: bytes):
+        with open(self.index_path, 'wb') as f:
+            f.write(index_file_content)
+
+        manifest, rebuilt = self._open_manifest()
+
+        self.assertTrue(rebuilt)
+        self._check_manifest_items(manifest)
+
+        with open(self.index_path, 'rb') as f:
+            self.assertEqual(f.read(len(_Index._MAGIC)), _Index._MAGIC)
+
+    def test_index_is_rebuilt_if_header_is_truncated(self):
+        with open(self.index_path, 'rb') as f:
+            content = f.read()
+
+        self._check_index_is_rebuilt(content[:_Index._HEADER.size - 1])
+
+    def test_index_is_rebuilt_if_offsets_are_truncated(self):
+        with open(self.index_path, 'rb') as f:
+            content = f.read()
+
+        self._check_index_is_rebuilt(content[:-1])
+
+    def test_index_is_rebuilt_if_magic_is_wrong(self):
+        with open(self.index_path, 'rb') as f:
+            content = f.read()
+
+        self._check_index_is_rebuilt(b'NOTINDEX' + content[len(_Index._MAGIC):])
+
+    def test_index_is_rebuilt_if_version_is_unknown(self):
+        with open(self.index_path, 'rb') as f:
+            content = bytearray(f.read())
+
+        _, _, *header_fields = _Index._HEADER.unpack_from(content)
+        _Index._HEADER.pack_into(content, 0, _Index._MAGIC, _Index._VERSION + 1, *header_fields)
+
+        self._check_index_is_rebuilt(bytes(content))
@@ -0,0 +1,41 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import zipfile
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from cvat.apps.engine.media_extractors import ZipCompressedChunkWriter
+
+
+class ZipCompressedChunkWriterTest(SimpleTestCase):
+    def _make_images(self, count):
+        return [
+            (Image.new('RGB', (16 + i, 8), (i * 10, 0, 255 - i * 10)), f'{i}.png', None)
+            for i in range(count)
+        ]
+
+    def _save_chunk(self, writer, images):
+        chunk = BytesIO()
+        image_sizes = writer.save_as_chunk(images, chunk)
+
+        with zipfile.ZipFile(chunk) as zip_chunk:
+            entries = [(name, zip_chunk.read(name)) for name in zip_chunk.namelist()]
+
+        return image_sizes, entries
+
+    def test_parallel_compression_keeps_frame_order(self):
+        images = self._make_images(20)
+
+        expected = self._save_chunk(ZipCompressedChunkWriter(50), images)
+        actual = self._save_chunk(
+            ZipCompressedChunkWriter(50, threads_number=4, max_pending_frames=3),
+            iter(images)
+        )
+
+        self.assertEqual(actual, expected)
+        self.assertEqual([name for name, _ in actual[1]], [f'{i:06d}.jpeg' for i in range(20)])
+        self.assertEqual(actual[0], [(16 + i, 8) for i in range(20)])
@@ -3370,14 +3370,17 @@ class TaskDataAPITestCase(ApiTestBase):
         with ForceLogin(user, self.client):
             return self.client.get("/api/tasks/{}".format(tid))
 
-    def _run_api_v2_task_id_data_get(self, tid, user, data_type, data_quality=None, data_number=None):
+    def _run_api_v2_task_id_data_get(self, tid, user, data_type, data_quality=None, data_number=None,
+        *, headers=None
+    ):
         url = '/api/tasks/{}/data?type={}'.format(tid, data_type)
         if data_quality is not None:
             url += '&quality={}'.format(data_quality)
         if data_number is not None:
             url += '&number={}'.format(data_number)
         with ForceLogin(user, self.client):
-            return self.client.get(url)
+            return self.client.get(url,
+                **{'HTTP_' + k: v for k, v in (headers or {}).items()})
 
     def _get_preview(self, tid, user):
         url = '/api/tasks/{}/preview'.format(tid)
@@ -4663,6 +4666,50 @@ class TaskDataAPITestCase(ApiTestBase):
     def test_api_v2_tasks_id_data_user(self):
         self._test_api_v2_tasks_id_data_create(self.user)
 
+    def test_can_revalidate_and_resume_cached_chunks(self):
+        task_spec = {
+            "name": "cached chunk revalidation task",
+            "overlap": 0,
+            "segment_size": 0,
+            "labels": [
+                {"name": "car"},
+            ]
+        }
+        task_data = {
+            "server_files[0]": "test_1.jpg",
+            "server_files[1]": "test_2.jpg",
+            "image_quality": 70,
+            "use_cache": True,
+        }
+
+        response = self._create_task(self.admin, task_spec)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        task_id = response.data["id"]
+        response = self._run_api_v2_tasks_id_data_post(task_id, self.admin, task_data)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        response = self._get_original_chunk(task_id, self.admin, 0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('max-age', response['Cache-Control'])
+        etag = response['ETag']
+        chunk = response.content
+
+        response = self._run_api_v2_task_id_data_get(task_id, self.admin, "chunk", "original", 0,
+            headers={'IF_NONE_MATCH': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        response = self._run_api_v2_task_id_data_get(task_id, self.admin, "chunk", "original", 0,
+            headers={'RANGE': 'bytes=10-', 'IF_RANGE': etag})
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 10-{len(chunk) - 1}/{len(chunk)}')
+        self.assertEqual(response.content, chunk[10:])
+
+        response = self._run_api_v2_task_id_data_get(task_id, self.admin, "chunk", "original", 0,
+            headers={'RANGE': f'bytes={len(chunk)}-'})
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
     def test_api_v2_tasks_id_data_no_auth(self):
         data = {
             "name": "my task #3",
@@ -359,6 +359,13 @@ def sendfile(
 
     return _sendfile(request, filename, attachment, attachment_filename, mimetype, encoding)
 
+def get_chunk_compression_options() -> dict[str, int]:
+    "Returns the ZipCompressedChunkWriter parallelism options from the server settings"
+    return {
+        'threads_number': settings.MEDIA_CHUNK_COMPRESSION_THREADS,
+        'max_pending_frames': settings.MEDIA_CHUNK_COMPRESSION_MAX_PENDING_FRAMES,
+    }
+
 def preload_image(image: tuple[str, str, str])-> tuple[Image.Image, str, str]:
     pil_img = Image.open(image[0])
     pil_img.load()
@@ -3,11 +3,13 @@
 #
 # SPDX-License-Identifier: MIT
 
+import io
 import os
 import os.path as osp
 import re
 import shutil
 import functools
+import zlib
 
 from contextlib import suppress
 from PIL import Image
@@ -29,8 +31,11 @@ from django.contrib.auth.models import User
 from django.db import IntegrityError, transaction
 from django.db.models import Count
 from django.db.models.query import Prefetch
-from django.http import HttpResponse, HttpRequest, HttpResponseNotFound, HttpResponseBadRequest
+from django.http import (
+    FileResponse, HttpResponse, HttpRequest, HttpResponseNotFound, HttpResponseBadRequest
+)
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import never_cache
 from django_rq.queues import DjangoRQ
@@ -101,7 +106,7 @@ from . import models, task
 from .log import ServerLogManager
 from cvat.apps.iam.filters import ORGANIZATION_OPEN_API_PARAMETERS
 from cvat.apps.iam.permissions import PolicyEnforcer, IsAuthenticatedOrReadPublicResource
-from cvat.apps.engine.cache import MediaCache
+from cvat.apps.engine.cache import ManifestDirectoryTreeCache, MediaCache, MediaCachePrefetcher
 from cvat.apps.engine.permissions import (CloudStoragePermission,
     CommentPermission, IssuePermission, JobPermission, LabelPermission, ProjectPermission,
     TaskPermission, UserPermission)
@@ -666,6 +671,115 @@ class ProjectViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
 
         return response
 
+_BYTE_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def _get_byte_range(request: HttpRequest, size: int, etag: str) -> Optional[slice]:
+    """
+    Returns the requested byte range, or None if the whole data should be returned.
+    Raises ValueError if the range can't be satisfied.
+
+    Only single ranges are supported, the other requests get the whole data.
+    """
+
+    range_header = request.headers.get('Range')
+    if not range_header:
+        return None
+
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+
+    match = _BYTE_RANGE_PATTERN.match(range_header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, stop = match.groups()
+    if start:
+        start = int(start)
+        stop = min(int(stop) + 1, size) if stop else size
+        if stop <= start:
+            if start < size:
+                return None # an invalid range is ignored
+
+            raise ValueError('The range is out of the data')
+    else:
+        start, stop = max(size - int(stop), 0), size
+        if stop <= start:
+            raise ValueError('The range is empty')
+
+    return slice(start, stop)
+
+def _make_data_response(
+    request: HttpRequest,
+    data,
+    mime_type: str,
+    *,
+    checksum: Optional[int] = None,
+    max_age: Optional[int] = None,
+) -> HttpResponse:
+    """
+    Makes a response for the immutable media data. The response has a strong ETag,
+    supports the conditional requests and the byte range requests.
+    The clients can reuse the data without revalidation for max_age seconds,
+    if max_age is specified.
+
+    The data can be a file path, the file is sent without reading it into memory then.
+    The checksum is required for files.
+    """
+
+    data_file = None
+    if isinstance(data, str):
+        assert checksum is not None
+
+        # the file is opened before the checks, so that its size can't change
+        data_file = open(data, 'rb')
+        size = os.fstat(data_file.fileno()).st_size
+    else:
+        data = data.getbuffer() if isinstance(data, io.BytesIO) else data
+        size = len(data)
+        if checksum is None:
+            checksum = zlib.crc32(data)
+    etag = f'"{checksum:08x}-{size:x}"'
+
+    try:
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                byte_range = _get_byte_range(request, size, etag)
+            except ValueError:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = f'bytes */{size}'
+            else:
+                if byte_range is None and data_file:
+                    response = FileResponse(data_file, content_type=mime_type)
+                    response.headers.pop('Content-Disposition', None) # the file name is internal
+                    data_file = None # the response closes the file
+                elif byte_range is None:
+                    response = HttpResponse(bytes(data), content_type=mime_type)
+                else:
+                    if data_file:
+                        data_file.seek(byte_range.start)
+                        content = data_file.read(byte_range.stop - byte_range.start)
+                    else:
+                        content = bytes(data[byte_range])
+
+                    response = HttpResponse(content, content_type=mime_type,
+                        status=status.HTTP_206_PARTIAL_CONTENT)
+                    response['Content-Range'] = \
+                        f'bytes {byte_range.start}-{byte_range.stop - 1}/{size}'
+    finally:
+        if data_file:
+            data_file.close()
+
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    if max_age is None:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, private=True, max_age=max_age)
+
+    return response
+
 class DataChunkGetter:
     def __init__(self, data_type, data_num, data_quality, task_dim):
         possible_data_type_values = ('chunk', 'frame', 'preview', 'context_image')
@@ -685,6 +799,7 @@ class DataChunkGetter:
             if data_quality == 'compressed' else FrameProvider.Quality.ORIGINAL
 
         self.dimension = task_dim
+        self.job: Optional[Job] = None
 
     def _check_frame_range(self, frame: int):
         frame_range = range(self._start, self._stop + 1, self._db_data.get_frame_step())
@@ -714,8 +829,12 @@ class DataChunkGetter:
 
                 # TODO: av.FFmpegError processing
                 if settings.USE_CACHE and db_data.storage_method == StorageMethodChoice.CACHE:
-                    buff, mime_type = frame_provider.get_chunk(self.number, self.quality)
-                    return HttpResponse(buff.getvalue(), content_type=mime_type)
+                    buff, mime_type, checksum = frame_provider.get_chunk(self.number, self.quality,
+                        with_checksum=True)
+                    MediaCachePrefetcher().prefetch_next_chunks(db_data, self.number, self.quality,
+                        stop_chunk=stop_chunk, dimension=self.dimension, db_job=self.job)
+                    return _make_data_response(request, buff, mime_type, checksum=checksum,
+                        max_age=settings.MEDIA_DATA_MAX_AGE)
 
                 # Follow symbol links if the chunk is a link on a real image otherwise
                 # mimetype detection inside sendfile will work incorrectly.
@@ -725,12 +844,15 @@ class DataChunkGetter:
                 self._check_frame_range(self.number)
 
                 if self.type == 'preview':
+                    # the previews of projects and tasks can change, they are always revalidated
                     cache = MediaCache(self.dimension)
-                    buf, mime = cache.get_local_preview_with_mime(self.number, db_data)
-                else:
-                    buf, mime = frame_provider.get_frame(self.number, self.quality)
+                    buf, mime, checksum = cache.get_local_preview_with_mime(self.number, db_data,
+                        with_checksum=True)
+                    return _make_data_response(request, buf, mime, checksum=checksum)
 
-                return HttpResponse(buf.getvalue(), content_type=mime)
+                buf, mime = frame_provider.get_frame(self.number, self.quality)
+                return _make_data_response(request, buf, mime,
+                    max_age=settings.MEDIA_DATA_MAX_AGE)
 
             elif self.type == 'context_image':
                 self._check_frame_range(self.number)
@@ -772,21 +894,52 @@ class JobDataGetter(DataChunkGetter):
 
             cache = MediaCache()
 
+            checksum = None
             if settings.USE_CACHE and db_data.storage_method == StorageMethodChoice.CACHE:
-                buf, mime = cache.get_selective_job_chunk_data_with_mime(
-                    chunk_number=self.number, quality=self.quality, job=self.job
+                buf, mime, checksum = cache.get_selective_job_chunk_data_with_mime(
+                    chunk_number=self.number, quality=self.quality, job=self.job,
+                    with_checksum=True,
                 )
+                MediaCachePrefetcher().prefetch_next_chunks(db_data, self.number, self.quality,
+                    stop_chunk=stop_chunk, dimension=self.dimension, db_job=self.job)
             else:
                 buf, mime = cache.prepare_selective_job_chunk(
                     chunk_number=self.number, quality=self.quality, db_job=self.job
                 )
 
-            return HttpResponse(buf.getvalue(), content_type=mime)
+            return _make_data_response(request, buf, mime, checksum=checksum,
+                max_age=settings.MEDIA_DATA_MAX_AGE)
 
         else:
             return super().__call__(request, start, stop, db_data)
 
 
+def prefetch_data_chunks(request, start: int, stop: int, db_data: Optional[Data], *,
+    dimension: models.DimensionType, db_job: Optional[Job] = None
+):
+    if not db_data:
+        raise NotFound(detail='Cannot find requested data')
+
+    data_quality = request.query_params.get('quality', 'compressed')
+    if data_quality not in ('compressed', 'original'):
+        raise ValidationError('Wrong quality value')
+
+    quality = FrameProvider.Quality.COMPRESSED \
+        if data_quality == 'compressed' else FrameProvider.Quality.ORIGINAL
+
+    if not (settings.USE_CACHE and db_data.storage_method == StorageMethodChoice.CACHE):
+        return HttpResponseBadRequest('Only the data stored in the media cache can be prefetched')
+
+    frame_provider = FrameProvider(db_data, dimension)
+    MediaCachePrefetcher().prefetch_chunks(db_data, quality,
+        start_chunk=frame_provider.get_chunk_number(start),
+        stop_chunk=frame_provider.get_chunk_number(stop),
+        dimension=dimension, db_job=db_job,
+    )
+
+    return Response(status=status.HTTP_202_ACCEPTED)
+
+
 @extend_schema(tags=['tasks'])
 @extend_schema_view(
     list=extend_schema(
@@ -1320,6 +1473,29 @@ class TaskViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
         self._object = self.get_object()
         return self.append_tus_chunk(request, file_id)
 
+    @extend_schema(summary='Prepare task data chunks in the background',
+        description=textwrap.dedent("""\
+            Fills the server media cache with the task chunks,
+            so that they are not prepared on request later.
+            Only the tasks with the data stored in the cache are supported.
+        """),
+        parameters=[
+            OpenApiParameter('quality', location=OpenApiParameter.QUERY, required=False,
+                type=OpenApiTypes.STR, enum=['compressed', 'original'],
+                description="Specifies the quality level of the prepared chunks"),
+        ],
+        request=None,
+        responses={
+            '202': OpenApiResponse(description='Chunk preparation has been started'),
+            '400': OpenApiResponse(description='The task data is not stored in the media cache'),
+        })
+    @action(detail=True, methods=['POST'], url_path='data/prefetch')
+    def prefetch_data(self, request, pk):
+        self._object = self.get_object() # call check_object_permissions as well
+
+        return prefetch_data_chunks(request, self._object.data.start_frame,
+            self._object.data.stop_frame, self._object.data, dimension=self._object.dimension)
+
     def get_export_callback(self, save_images: bool) -> Callable:
         return dm.views.export_task_as_dataset if save_images else dm.views.export_task_annotations
 
@@ -2049,6 +2225,30 @@ class JobViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateMo
         return data_getter(request, db_job.segment.start_frame,
             db_job.segment.stop_frame, db_job.segment.task.data)
 
+    @extend_schema(summary='Prepare job data chunks in the background',
+        description=textwrap.dedent("""\
+            Fills the server media cache with the job chunks,
+            so that they are not prepared on request later.
+            Only the jobs with the data stored in the cache are supported.
+        """),
+        parameters=[
+            OpenApiParameter('quality', location=OpenApiParameter.QUERY, required=False,
+                type=OpenApiTypes.STR, enum=['compressed', 'original'],
+                description="Specifies the quality level of the prepared chunks"),
+        ],
+        request=None,
+        responses={
+            '202': OpenApiResponse(description='Chunk preparation has been started'),
+            '400': OpenApiResponse(description='The job data is not stored in the media cache'),
+        })
+    @action(detail=True, methods=['POST'], url_path='data/prefetch')
+    def prefetch_data(self, request, pk):
+        db_job = self.get_object() # call check_object_permissions as well
+
+        return prefetch_data_chunks(request, db_job.segment.start_frame,
+            db_job.segment.stop_frame, db_job.segment.task.data,
+            dimension=db_job.segment.task.dimension, db_job=db_job)
+
 
     @extend_schema(methods=['GET'], summary='Get metainformation for media files in a job',
         responses={
@@ -2670,14 +2870,15 @@ class CloudStorageViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
                         datetime.fromtimestamp(os.path.getmtime(full_manifest_path), tz=timezone.utc) < storage.get_file_last_modified(manifest_path):
                     storage.download_file(manifest_path, full_manifest_path)
                 manifest = ImageManifestManager(full_manifest_path, db_storage.get_storage_dirname())
-                # need to update index
-                manifest.set_index()
                 try:
                     start_index = int(next_token or '0')
                 except ValueError:
                     return HttpResponseBadRequest('Wrong value for the next_token parameter was found.')
+                directory_tree = ManifestDirectoryTreeCache.get(full_manifest_path,
+                    manifest_prefix=manifest_prefix)
                 content = manifest.emulate_hierarchical_structure(
-                    page_size, manifest_prefix=manifest_prefix, prefix=prefix, default_prefix=storage.prefix, start_index=start_index)
+                    page_size, manifest_prefix=manifest_prefix, prefix=prefix, default_prefix=storage.prefix, start_index=start_index,
+                    directory_tree=directory_tree)
             else:
                 content = storage.list_files_on_one_page(prefix, next_token, page_size, _use_sort=True)
             for i in content['content']:
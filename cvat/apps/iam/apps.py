@@ -9,5 +9,13 @@ class IAMConfig(AppConfig):
     name = 'cvat.apps.iam'
 
     def ready(self):
+        from django.conf import settings
+
+        from . import default_settings
+
+        for key in dir(default_settings):
+            if key.isupper() and not hasattr(settings, key):
+                setattr(settings, key, getattr(default_settings, key))
+
         from .signals import register_signals
         register_signals(self)
@@ -0,0 +1,14 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+
+IAM_OPA_CONNECTION_POOL_SIZE = int(os.getenv("CVAT_IAM_OPA_CONNECTION_POOL_SIZE", 10))
+"Maximum number of the connections to OPA kept open by each server process"
+
+IAM_OPA_RESULT_CACHE_TTL = int(os.getenv("CVAT_IAM_OPA_RESULT_CACHE_TTL", 10))
+"Time the OPA query results are reused for the same queries, in seconds, 0 to disable"
+
+IAM_OPA_RESULT_CACHE_SIZE = int(os.getenv("CVAT_IAM_OPA_RESULT_CACHE_SIZE", 10000))
+"Maximum number of the OPA query results cached by each server process"
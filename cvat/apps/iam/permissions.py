@@ -6,19 +6,26 @@
 from __future__ import annotations
 
 import importlib
+import json
 import operator
+import os
+import threading
+import time
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, TypeVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypeVar
 
 from attrs import define, field
 from django.apps import AppConfig
 from django.conf import settings
 from django.db.models import Q, Model
+from requests.adapters import HTTPAdapter
 from rest_framework.permissions import BasePermission
 
 from cvat.apps.organizations.models import Membership, Organization
+from cvat.apps.profiler import silk_profile
 from cvat.utils.http import make_requests_session
 
 from .utils import add_opa_rules_path
@@ -84,6 +91,85 @@ def get_iam_context(request, obj) -> Dict[str, Any]:
     return build_iam_context(request, organization, membership)
 
 
+class OpenPolicyAgentClient:
+    """
+    Sends the queries to OPA. The connections are reused by all the threads of the process.
+
+    The results are cached for a short time, the cache key is the whole query input.
+    The input includes the user privilege and the organization role, so the cached results
+    can't be reused after the role changes. The cache is also cleared explicitly
+    when the memberships or the user groups change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._results: OrderedDict[Tuple[str, str], Tuple[float, Any]] = OrderedDict()
+
+    def _get_session(self):
+        with self._lock:
+            # the connections can't be shared with the forked processes
+            if self._session is None or self._session_pid != os.getpid():
+                session = make_requests_session()
+                adapter = HTTPAdapter(pool_maxsize=settings.IAM_OPA_CONNECTION_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+
+                self._session = session
+                self._session_pid = os.getpid()
+
+            return self._session
+
+    def _get_cached_result(self, key: Tuple[str, str]) -> Optional[Any]:
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is None:
+                return None
+
+            expires_at, result = cached
+            if expires_at < time.monotonic():
+                del self._results[key]
+                return None
+
+            self._results.move_to_end(key)
+            return result
+
+    def _set_cached_result(self, key: Tuple[str, str], result: Any):
+        with self._lock:
+            self._results[key] = (time.monotonic() + settings.IAM_OPA_RESULT_CACHE_TTL, result)
+            self._results.move_to_end(key)
+            while len(self._results) > settings.IAM_OPA_RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._results.clear()
+
+    def query(self, url: str, payload: Dict[str, Any]) -> Any:
+        """
+        Returns the query result. The result can be shared with other callers,
+        it must not be changed.
+        """
+
+        use_cache = settings.IAM_OPA_RESULT_CACHE_TTL > 0
+        if use_cache:
+            key = (url, json.dumps(payload, sort_keys=True, separators=(',', ':')))
+            result = self._get_cached_result(key)
+            if result is not None:
+                return result
+
+        response = self._get_session().post(url, json=payload)
+        response.raise_for_status()
+        result = response.json()['result']
+
+        if use_cache:
+            self._set_cached_result(key, result)
+
+        return result
+
+opa_client = OpenPolicyAgentClient()
+
 class OpenPolicyAgentPermission(metaclass=ABCMeta):
     url: str
     user_id: int
@@ -146,16 +232,13 @@ class OpenPolicyAgentPermission(metaclass=ABCMeta):
     def get_resource(self):
         return None
 
-    def check_access(self) -> PermissionResult:
-        with make_requests_session() as session:
-            response = session.post(self.url, json=self.payload)
-            output = response.json()['result']
-
+    @staticmethod
+    def _parse_result(output) -> PermissionResult:
         allow = False
         reasons = []
         if isinstance(output, dict):
             allow = output['allow']
-            reasons = output.get('reasons', [])
+            reasons = list(output.get('reasons', []))
         elif isinstance(output, bool):
             allow = output
         else:
@@ -163,11 +246,46 @@ class OpenPolicyAgentPermission(metaclass=ABCMeta):
 
         return PermissionResult(allow=allow, reasons=reasons)
 
+    def check_access(self) -> PermissionResult:
+        return self._parse_result(opa_client.query(self.url, self.payload))
+
+    def _get_package(self) -> Optional[str]:
+        prefix, suffix = settings.IAM_OPA_DATA_URL + '/', '/allow'
+        if not (self.url.startswith(prefix) and self.url.endswith(suffix)):
+            return None
+
+        package = self.url[len(prefix):-len(suffix)]
+        return package if package and '/' not in package else None
+
+    @classmethod
+    def check_access_many(
+        cls, perms: Sequence[OpenPolicyAgentPermission]
+    ) -> List[PermissionResult]:
+        """
+        Checks the permissions in one OPA query.
+        The results are returned in the order of the permissions.
+        """
+
+        packages = [perm._get_package() for perm in perms]
+        if len(perms) < 2 or None in packages:
+            return [perm.check_access() for perm in perms]
+
+        output = opa_client.query(settings.IAM_OPA_DATA_URL + '/batch/results', {
+            'input': {
+                'queries': [
+                    {'package': package, 'input': perm.payload['input']}
+                    for perm, package in zip(perms, packages)
+                ]
+            }
+        })
+
+        # the undefined results are missing in the output
+        return [cls._parse_result(output.get(str(i), False)) for i in range(len(perms))]
+
+    @silk_profile(name='Filter by permissions')
     def filter(self, queryset):
         url = self.url.replace('/allow', '/filter')
-
-        with make_requests_session() as session:
-            r = session.post(url, json=self.payload).json()['result']
+        r = opa_client.query(url, self.payload)
 
         q_objects = []
         ops_dict = {
@@ -204,6 +322,7 @@ def is_public_obj(obj: T) -> bool:
 
 class PolicyEnforcer(BasePermission):
     # pylint: disable=no-self-use
+    @silk_profile(name='Check permissions')
     def check_permission(self, request, view, obj) -> bool:
         # DRF can send OPTIONS request. Internally it will try to get
         # information about serializers for PUT and POST requests (clone
@@ -214,13 +333,15 @@ class PolicyEnforcer(BasePermission):
             return True
 
         iam_context = get_iam_context(request, obj)
-        for perm_class in OpenPolicyAgentPermission.__subclasses__():
-            for perm in perm_class.create(request, view, obj, iam_context):
-                result = perm.check_access()
-                if not result.allow:
-                    return False
-
-        return True
+        perms = [
+            perm
+            for perm_class in OpenPolicyAgentPermission.__subclasses__()
+            for perm in perm_class.create(request, view, obj, iam_context)
+        ]
+
+        return all(
+            result.allow for result in OpenPolicyAgentPermission.check_access_many(perms)
+        )
 
     def has_permission(self, request, view):
         if not view.detail:
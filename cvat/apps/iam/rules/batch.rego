@@ -0,0 +1,20 @@
+package batch
+
+import rego.v1
+
+# input: {
+#     "queries": [
+#         {
+#             "package": <the name of the package with the "allow" rule>,
+#             "input": <the input of the package>
+#         },
+#         ...
+#     ]
+# }
+#
+# The results are keyed by the query indices. The queries with undefined results are skipped.
+
+results[i] := result if {
+    some i, query in input.queries
+    result := data[query.package].allow with input as query.input
+}
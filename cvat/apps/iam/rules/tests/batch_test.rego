@@ -0,0 +1,58 @@
+# The tests are kept out of the rules directory, so that they are not included in the OPA bundle
+
+package batch_test
+
+import rego.v1
+
+import data.batch
+
+sandbox_user_input(scope, privilege) := {
+    "scope": scope,
+    "auth": {
+        "user": {
+            "id": 1,
+            "privilege": privilege
+        },
+        "organization": null
+    }
+}
+
+queries := [
+    {
+        "package": "events",
+        "input": sandbox_user_input("send:events", "worker")
+    },
+    {
+        "package": "events",
+        "input": sandbox_user_input("dump:events", null)
+    },
+    {
+        "package": "server",
+        "input": sandbox_user_input("list:content", "user")
+    },
+    {
+        "package": "server",
+        "input": sandbox_user_input("list:content", "worker")
+    }
+]
+
+test_results_match_single_queries if {
+    results := batch.results with input as {"queries": queries}
+
+    count(results) == count(queries)
+    every i, query in queries {
+        results[i] == data[query.package].allow with input as query.input
+    }
+}
+
+test_results_include_denied_queries if {
+    results := batch.results with input as {"queries": queries}
+
+    results == {0: true, 1: false, 2: true, 3: false}
+}
+
+test_no_results_for_no_queries if {
+    results := batch.results with input as {"queries": []}
+
+    count(results) == 0
+}
@@ -4,7 +4,7 @@
 
 from django.conf import settings
 from django.contrib.auth.models import User, Group
-from django.db.models.signals import post_save, post_migrate
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
 
 
 def register_groups(sender, **kwargs):
@@ -51,8 +51,22 @@ elif settings.IAM_TYPE == 'LDAP':
         user.groups.set(user_groups)
 
 
+def clear_permission_cache(sender, **kwargs):
+    from .permissions import opa_client
+
+    # The roles are a part of the query input, so the outdated results are not reused.
+    # They are removed to avoid keeping them until they expire.
+    opa_client.clear_cache()
+
 def register_signals(app_config):
+    from cvat.apps.organizations.models import Membership
+
     post_migrate.connect(register_groups, app_config)
+
+    post_save.connect(clear_permission_cache, sender=Membership)
+    post_delete.connect(clear_permission_cache, sender=Membership)
+    m2m_changed.connect(clear_permission_cache, sender=User.groups.through)
+
     if settings.IAM_TYPE == 'BASIC':
         # Add default groups and add admin rights to super users.
         post_save.connect(create_user, sender=User)
@@ -0,0 +1,96 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from cvat.apps.engine.permissions import ServerPermission
+from cvat.apps.iam.permissions import (
+    OpenPolicyAgentClient, OpenPolicyAgentPermission, PermissionResult
+)
+
+
+class OpenPolicyAgentClientTest(SimpleTestCase):
+    def _make_client(self):
+        client = OpenPolicyAgentClient()
+        session = mock.Mock()
+        session.post.side_effect = lambda url, json: mock.Mock(
+            **{'json.return_value': {'result': {'allow': json['input']['scope'] == 'view'}}}
+        )
+        client._get_session = lambda: session
+        return client, session
+
+    def test_results_are_cached_for_the_same_input(self):
+        client, session = self._make_client()
+
+        with self.settings(IAM_OPA_RESULT_CACHE_TTL=60):
+            results = [
+                client.query('http://opa/allow', {'input': {'scope': 'view', 'auth': {'id': 1}}}),
+                # the key order doesn't matter
+                client.query('http://opa/allow', {'input': {'auth': {'id': 1}, 'scope': 'view'}}),
+                client.query('http://opa/allow', {'input': {'scope': 'update', 'auth': {'id': 1}}}),
+            ]
+            client.clear_cache()
+            client.query('http://opa/allow', {'input': {'scope': 'view', 'auth': {'id': 1}}})
+
+        self.assertEqual([r['allow'] for r in results], [True, True, False])
+        self.assertEqual(session.post.call_count, 3)
+
+    def test_results_are_not_cached_if_disabled(self):
+        client, session = self._make_client()
+
+        with self.settings(IAM_OPA_RESULT_CACHE_TTL=0):
+            for _ in range(2):
+                client.query('http://opa/allow', {'input': {'scope': 'view'}})
+
+        self.assertEqual(session.post.call_count, 2)
+
+    def test_outdated_results_are_not_used(self):
+        client, session = self._make_client()
+
+        with (
+            self.settings(IAM_OPA_RESULT_CACHE_TTL=60),
+            mock.patch('cvat.apps.iam.permissions.time.monotonic', side_effect=[0, 30, 61, 61]),
+        ):
+            for _ in range(3):
+                client.query('http://opa/allow', {'input': {'scope': 'view'}})
+
+        self.assertEqual(session.post.call_count, 2)
+
+
+class OpenPolicyAgentPermissionTest(SimpleTestCase):
+    def _make_perm(self, scope):
+        return ServerPermission(scope=scope, user_id=1, group_name='user',
+            org_id=None, org_owner_id=None, org_role=None)
+
+    def test_can_check_permissions_in_one_query(self):
+        perms = [self._make_perm('view'), self._make_perm('list:content'), self._make_perm('x')]
+
+        with mock.patch('cvat.apps.iam.permissions.opa_client') as opa_client:
+            opa_client.query.return_value = {'0': True, '1': {'allow': False, 'reasons': ['r']}}
+            results = OpenPolicyAgentPermission.check_access_many(perms)
+
+        opa_client.query.assert_called_once()
+        url, payload = opa_client.query.call_args.args
+        self.assertEqual(url, settings.IAM_OPA_DATA_URL + '/batch/results')
+        self.assertEqual(payload['input']['queries'], [
+            {'package': 'server', 'input': perm.payload['input']} for perm in perms
+        ])
+        self.assertEqual(results, [
+            PermissionResult(allow=True),
+            PermissionResult(allow=False, reasons=['r']),
+            PermissionResult(allow=False),
+        ])
+
+    def test_single_permission_is_checked_directly(self):
+        perm = self._make_perm('view')
+
+        with mock.patch('cvat.apps.iam.permissions.opa_client') as opa_client:
+            opa_client.query.return_value = True
+            results = OpenPolicyAgentPermission.check_access_many([perm])
+
+        opa_client.query.assert_called_once_with(perm.url, perm.payload)
+        self.assertEqual(results, [PermissionResult(allow=True)])
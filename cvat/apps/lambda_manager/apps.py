@@ -10,5 +10,13 @@ class LambdaManagerConfig(AppConfig):
     name = 'cvat.apps.lambda_manager'
 
     def ready(self) -> None:
+        from django.conf import settings
+
+        from . import default_settings
+
+        for key in dir(default_settings):
+            if key.isupper() and not hasattr(settings, key):
+                setattr(settings, key, getattr(default_settings, key))
+
         from cvat.apps.iam.permissions import load_app_permissions
         load_app_permissions(self)
@@ -0,0 +1,11 @@
+# Copyright (C) 2024 CVAT.ai Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+
+LAMBDA_FRAME_PREFETCH_DEPTH = int(os.getenv("CVAT_LAMBDA_FRAME_PREFETCH_DEPTH", 2))
+"Number of the next frames prepared in the background during automatic annotation, 0 to disable"
+
+LAMBDA_MAX_CONCURRENT_REQUESTS = int(os.getenv("CVAT_LAMBDA_MAX_CONCURRENT_REQUESTS", 4))
+"Maximum number of parallel function calls for one automatic annotation request"
@@ -1,24 +1,35 @@
 # Copyright (C) 2021-2022 Intel Corporation
-# Copyright (C) 2023 CVAT.ai Corporation
+# Copyright (C) 2023-2024 CVAT.ai Corporation
 #
 # SPDX-License-Identifier: MIT
 
 from collections import OrderedDict
+from contextlib import contextmanager
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from itertools import groupby
 from io import BytesIO
+from types import SimpleNamespace
 from typing import Dict, Optional
 from unittest import mock, skip
+import base64
 import json
 import os
+import threading
+import time
 
 import requests
+from django.conf import settings
 from django.contrib.auth.models import Group, User
 from django.http import HttpResponseNotFound, HttpResponseServerError
+from django.test import SimpleTestCase
 from PIL import Image
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
+from cvat.apps.engine.frame_provider import FrameProvider
 from cvat.apps.engine.tests.utils import filter_dict, get_paginated_collection
+from cvat.apps.lambda_manager.views import LambdaFrameSource, LambdaGateway
 
 LAMBDA_ROOT_PATH = '/api/lambda'
 LAMBDA_FUNCTIONS_PATH = f'{LAMBDA_ROOT_PATH}/functions'
@@ -50,6 +61,10 @@ with open(path) as f:
     functions = json.load(f)
 
 
+# The gateway is patched in the tests, keep the original implementation for the stand-in server
+_original_gateway_http = LambdaGateway._http
+_original_gateway_invoke = LambdaGateway.invoke
+
 def generate_image_file(filename, size=(100, 100)):
     f = BytesIO()
     image = Image.new('RGB', size=size)
@@ -59,6 +74,42 @@ def generate_image_file(filename, size=(100, 100)):
     return f
 
 
+class _NuclioRequestHandler(BaseHTTPRequestHandler):
+    def _reply(self, data, status_code=status.HTTP_200_OK):
+        body = json.dumps(data).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        functions = self.server.functions
+        if self.path == '/api/functions':
+            self._reply(functions)
+        elif (func_id := self.path.rsplit('/', maxsplit=1)[-1]) in functions:
+            self._reply(functions[func_id])
+        else:
+            self._reply({}, status_code=status.HTTP_404_NOT_FOUND)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        func_id = self.headers['x-nuclio-function-name']
+        self._reply(self.server.invoke_function(func_id, payload))
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+class _NuclioStandIn(ThreadingHTTPServer):
+    """
+    Serves the functions and their invocations like the nuclio dashboard does
+    """
+
+    def __init__(self, functions, invoke_function):
+        self.functions = functions
+        self.invoke_function = invoke_function
+        super().__init__(('localhost', 0), _NuclioRequestHandler)
+
 class ForceLogin:
     def __init__(self, user, client):
         self.user = user
@@ -933,6 +984,19 @@ class LambdaTestCases(_LambdaTestCaseBase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+    def test_api_v2_lambda_functions_create_detector_with_frames(self):
+        data = {
+            "task": self.main_task["id"],
+            "frames": [0, 1],
+            "cleanup": True,
+            "mapping": {
+                "car": { "name": "car" },
+            },
+        }
+        response = self._post_request(f"{LAMBDA_FUNCTIONS_PATH}/{id_function_detector}", self.admin, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
     def test_api_v2_lambda_functions_create_detector_empty_mapping(self):
         data = {
             "task": self.main_task["id"],
@@ -1189,6 +1253,139 @@ class TestComplexFrameSetupCases(_LambdaTestCaseBase):
             }
         )
 
+    def test_can_run_offline_detector_function_with_parallel_calls(self):
+        calls_in_progress = 0
+        max_calls_in_progress = 0
+        calls_count = 0
+        calls_lock = threading.Lock()
+
+        def invoke_function(func, payload):
+            nonlocal calls_in_progress, max_calls_in_progress, calls_count
+            with calls_lock:
+                calls_in_progress += 1
+                max_calls_in_progress = max(max_calls_in_progress, calls_in_progress)
+                calls_count += 1
+                is_slow_call = calls_count % 2
+
+            # make the following calls finish earlier than the previous ones
+            time.sleep(0.1 if is_slow_call else 0)
+
+            with calls_lock:
+                calls_in_progress -= 1
+
+            return self._invoke_function(func, payload)
+
+        detector_triggers = {
+            'myHttpTrigger': { 'kind': 'http', 'maxWorkers': 2 },
+        }
+
+        with (
+            mock.patch.dict(functions["positive"][self.detector_function_id]["spec"],
+                triggers=detector_triggers),
+            mock.patch('cvat.apps.lambda_manager.views.LambdaGateway.invoke',
+                side_effect=invoke_function),
+        ):
+            data = self.common_request_data.copy()
+            self._run_offline_function(self.detector_function_id, data, self.user)
+
+        self.assertEqual(max_calls_in_progress, 2)
+
+        response = self._get_request(f'/api/tasks/{self.task["id"]}/annotations', self.admin)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        annotations = response.json()
+
+        # the results are saved in the frame order
+        self.assertEqual(
+            [shape["frame"] for shape in sorted(annotations["shapes"], key=lambda a: a["id"])],
+            list(self.task_rel_frame_range)
+        )
+
+    @contextmanager
+    def _run_nuclio_stand_in(self, invoke_function, *, max_batch_size: int):
+        function_data = deepcopy(functions["positive"][self.detector_function_id])
+        function_data["metadata"]["annotations"]["max_batch_size"] = str(max_batch_size)
+
+        server = _NuclioStandIn({self.detector_function_id: function_data}, invoke_function)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+
+        try:
+            with (
+                self.settings(NUCLIO={
+                    **settings.NUCLIO,
+                    'SCHEME': 'http',
+                    'HOST': server.server_address[0],
+                    'PORT': server.server_address[1],
+                    'INVOKE_METHOD': 'dashboard',
+                }),
+                mock.patch.object(LambdaGateway, '_http', _original_gateway_http),
+                mock.patch.object(LambdaGateway, 'invoke', _original_gateway_invoke),
+            ):
+                yield
+        finally:
+            server.shutdown()
+            server.server_close()
+            server_thread.join()
+
+    def test_can_run_offline_detector_function_with_batches(self):
+        batch_sizes = []
+
+        def invoke_function(func_id, payload):
+            # mark each detection with the index of the image in the request sequence
+            first_image_index = sum(batch_sizes)
+            batch_sizes.append(len(payload["images"]))
+            return [
+                [{
+                    "confidence": "0.9",
+                    "label": "car",
+                    "points": [image_index, image_index, image_index + 10, image_index + 10],
+                    "type": "rectangle",
+                }]
+                for image_index in range(first_image_index, sum(batch_sizes))
+            ]
+
+        with self._run_nuclio_stand_in(invoke_function, max_batch_size=4):
+            data = self.common_request_data.copy()
+            self._run_offline_function(self.detector_function_id, data, self.user)
+
+        frames = list(self.task_rel_frame_range)
+        self.assertEqual(batch_sizes, [len(frames[i : i + 4]) for i in range(0, len(frames), 4)])
+
+        response = self._get_request(f'/api/tasks/{self.task["id"]}/annotations', self.admin)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (shape["frame"], shape["points"][0])
+                for shape in sorted(response.json()["shapes"], key=lambda a: a["id"])
+            ],
+            [(frame, image_index) for image_index, frame in enumerate(frames)]
+        )
+
+    def test_offline_detector_function_fails_on_incomplete_batch_results(self):
+        calls_count = 0
+
+        def invoke_function(func_id, payload):
+            nonlocal calls_count
+            calls_count += 1
+
+            results = [[] for _ in payload["images"]]
+            if calls_count == 2:
+                # the function lost one of the frames
+                results.pop()
+
+            return results
+
+        with self._run_nuclio_stand_in(invoke_function, max_batch_size=4):
+            data = self.common_request_data.copy()
+            data["function"] = self.detector_function_id
+            response = self._post_request(LAMBDA_REQUESTS_PATH, self.user, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+            request_id = response.json()["id"]
+            self.assertEqual(self._wait_request(request_id), "failed")
+
+        self.assertEqual(calls_count, 2)
+
     def test_can_run_offline_reid_function_on_whole_task(self):
         # Add starting shapes to be tracked on following frames
         requested_frame_range = self.task_rel_frame_range
@@ -1673,3 +1870,63 @@ class Issue4996_Cases(_LambdaTestCaseBase):
             response = self._post_request(self.function_url, self.user, data,
                 org_id=self.org['id'])
             self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class _FakeFrameProvider:
+    def __init__(self, db_data):
+        self.requested_frames = []
+        self.request_threads = set()
+
+    def get_frame(self, frame, quality):
+        self.requested_frames.append(frame)
+        self.request_threads.add(threading.get_ident())
+        return BytesIO(f'frame {frame}'.encode()), 'image/png'
+
+    def unload(self):
+        pass
+
+
+@mock.patch('cvat.apps.lambda_manager.views.FrameProvider', _FakeFrameProvider)
+class LambdaFrameSourceTest(SimpleTestCase):
+    quality = FrameProvider.Quality.COMPRESSED
+
+    def _decode(self, image):
+        return base64.b64decode(image).decode()
+
+    def test_can_reuse_frame_provider_between_calls(self):
+        with LambdaFrameSource(SimpleNamespace(data=None)) as frame_source:
+            frame_provider = frame_source._frame_provider
+
+            images = [frame_source.get_image(frame, self.quality) for frame in [0, 1, 1, 2]]
+
+        self.assertEqual([self._decode(image) for image in images],
+            ['frame 0', 'frame 1', 'frame 1', 'frame 2'])
+        self.assertEqual(frame_provider.requested_frames, [0, 1, 2])
+
+    def test_can_prefetch_next_frames(self):
+        frames = [0, 2, 3, 5, 7]
+
+        with LambdaFrameSource(SimpleNamespace(data=None), prefetch_depth=2) as frame_source:
+            frame_provider = frame_source._frame_provider
+            frame_source.prefetch(frames, self.quality)
+
+            images = [frame_source.get_image(frame, self.quality) for frame in frames]
+
+        self.assertEqual([self._decode(image) for image in images],
+            [f'frame {frame}' for frame in frames])
+        self.assertEqual(frame_provider.requested_frames, frames)
+        self.assertNotIn(threading.get_ident(), frame_provider.request_threads)
+
+    def test_can_skip_prefetched_frames(self):
+        frames = list(range(10))
+
+        with LambdaFrameSource(SimpleNamespace(data=None), prefetch_depth=2) as frame_source:
+            frame_provider = frame_source._frame_provider
+            frame_source.prefetch(frames, self.quality)
+
+            images = [frame_source.get_image(frame, self.quality) for frame in frames[::3]]
+
+        self.assertEqual([self._decode(image) for image in images],
+            [f'frame {frame}' for frame in frames[::3]])
+        for frame in frames[::3]:
+            self.assertEqual(frame_provider.requested_frames.count(frame), 1)
@@ -1,5 +1,5 @@
 # Copyright (C) 2022 Intel Corporation
-# Copyright (C) 2022-2023 CVAT.ai Corporation
+# Copyright (C) 2022-2024 CVAT.ai Corporation
 #
 # SPDX-License-Identifier: MIT
 
@@ -9,11 +9,14 @@ import base64
 import json
 import os
 import textwrap
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from copy import deepcopy
 from datetime import timedelta
 from enum import Enum
 from functools import wraps
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import datumaro.util.mask_tools as mask_tools
 import django_rq
@@ -23,6 +26,7 @@ import rq
 from cvat.apps.lambda_manager.signals import interactive_function_call_signal
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import connections
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (OpenApiParameter, OpenApiResponse,
                                    extend_schema, extend_schema_view,
@@ -57,6 +61,37 @@ class LambdaType(Enum):
 class LambdaGateway:
     NUCLIO_ROOT_URL = '/api/functions'
 
+    _session: Optional[requests.Session] = None
+
+    @contextmanager
+    def keep_session(self, *, max_connections: int = 1):
+        """
+        Makes the gateway reuse a single keep-alive HTTP session for the calls
+        inside the context. The calls can be made from several threads.
+        """
+
+        if self._session is not None:
+            yield
+            return
+
+        session = make_requests_session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_connections)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        self._session = session
+        try:
+            yield
+        finally:
+            self._session = None
+            session.close()
+
+    def _get_session(self):
+        if self._session is not None:
+            return nullcontext(self._session)
+
+        return make_requests_session()
+
     def _http(self, method="get", scheme=None, host=None, port=None,
         function_namespace=None, url=None, headers=None, data=None):
         NUCLIO_GATEWAY = '{}://{}:{}'.format(
@@ -79,7 +114,7 @@ class LambdaGateway:
         else:
             url = NUCLIO_GATEWAY
 
-        with make_requests_session() as session:
+        with self._get_session() as session:
             reply = session.request(method, url, headers=extra_headers,
                 timeout=NUCLIO_TIMEOUT, json=data)
             reply.raise_for_status()
@@ -120,7 +155,7 @@ class LambdaGateway:
         else:
             url = f'http://localhost:{func.port}'
 
-        with make_requests_session() as session:
+        with self._get_session() as session:
             reply = session.post(url, timeout=NUCLIO_TIMEOUT, json=payload)
             reply.raise_for_status()
             response = reply.json()
@@ -197,6 +232,14 @@ class LambdaFunction:
         self.animated_gif = meta_anno.get('animated_gif', '')
         self.version = int(meta_anno.get('version', '1'))
         self.help_message = meta_anno.get('help_message', '')
+        # maximum number of frames a detector can process in one call
+        self.max_batch_size = max(1, int(meta_anno.get('max_batch_size', 1)))
+        # number of requests the function can process at the same time
+        self.max_concurrent_requests = max(1, sum(
+            int(trigger.get('maxWorkers', 1))
+            for trigger in (data['spec'].get('triggers') or {}).values()
+            if trigger.get('kind') == 'http'
+        ))
         self.gateway = gateway
 
     def to_dict(self):
@@ -227,8 +270,28 @@ class LambdaFunction:
         *,
         db_job: Optional[Job] = None,
         is_interactive: Optional[bool] = False,
-        request: Optional[Request] = None
+        request: Optional[Request] = None,
+        frame_source: Optional[LambdaFrameSource] = None,
     ):
+        payload, mapping = self._prepare_call(db_task, data,
+            db_job=db_job, frame_source=frame_source)
+
+        if is_interactive and request:
+            interactive_function_call_signal.send(sender=self, request=request)
+
+        response = self.gateway.invoke(self, payload)
+
+        return self._parse_response(response, mapping)
+
+    def _prepare_call(
+        self,
+        db_task: Task,
+        data: Dict[str, Any],
+        *,
+        db_job: Optional[Job] = None,
+        frame_source: Optional[LambdaFrameSource] = None,
+        allow_batch: bool = False,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         if db_job is not None and db_job.get_task_id() != db_task.id:
             raise ValidationError("Job task id does not match task id",
                 code=status.HTTP_400_BAD_REQUEST
@@ -237,6 +300,14 @@ class LambdaFunction:
         payload = {}
         data = {k: v for k,v in data.items() if v is not None}
 
+        # Batched calls are only made by the offline annotation requests,
+        # which parse the per-frame results with _parse_batch_response()
+        if "frames" in data and not (allow_batch and self.kind == LambdaType.DETECTOR):
+            raise ValidationError(
+                "`{}` lambda function was called with unsupported argument: frames"
+                    .format(self.id),
+                code=status.HTTP_400_BAD_REQUEST)
+
         def mandatory_arg(name: str) -> Any:
             try:
                 return data[name]
@@ -362,35 +433,56 @@ class LambdaFunction:
             data_start_frame = task_data.start_frame
             step = task_data.get_frame_step()
 
-            for key, desc in (
-                ('frame', 'frame'),
-                ('frame0', 'start frame'),
-                ('frame1', 'end frame'),
-            ):
-                if key not in data:
-                    continue
+            frames_to_check = [
+                (data[key], desc) for key, desc in (
+                    ('frame', 'frame'),
+                    ('frame0', 'start frame'),
+                    ('frame1', 'end frame'),
+                )
+                if key in data
+            ]
+            frames_to_check.extend((frame, 'frame') for frame in data.get('frames', []))
 
-                abs_frame_id = data_start_frame + data[key] * step
+            for frame, desc in frames_to_check:
+                abs_frame_id = data_start_frame + frame * step
                 if not db_job.segment.contains_frame(abs_frame_id):
                     raise ValidationError(f"The {desc} is outside the job range",
                         code=status.HTTP_400_BAD_REQUEST)
 
 
-        if self.kind == LambdaType.DETECTOR:
+        if "frames" in data:
+            frames = data["frames"]
+            if not 0 < len(frames) <= self.max_batch_size:
+                raise ValidationError(
+                    '`{}` lambda function can process from 1 to {} frames in one call'
+                        .format(self.id, self.max_batch_size),
+                    code=status.HTTP_400_BAD_REQUEST)
+
+            payload.update({
+                "images": [
+                    self._get_image(db_task, frame, quality, frame_source=frame_source)
+                    for frame in frames
+                ]
+            })
+        elif self.kind == LambdaType.DETECTOR:
             payload.update({
-                "image": self._get_image(db_task, mandatory_arg("frame"), quality)
+                "image": self._get_image(db_task, mandatory_arg("frame"), quality,
+                    frame_source=frame_source)
             })
         elif self.kind == LambdaType.INTERACTOR:
             payload.update({
-                "image": self._get_image(db_task, mandatory_arg("frame"), quality),
+                "image": self._get_image(db_task, mandatory_arg("frame"), quality,
+                    frame_source=frame_source),
                 "pos_points": mandatory_arg("pos_points")[2:] if self.startswith_box else mandatory_arg("pos_points"),
                 "neg_points": mandatory_arg("neg_points"),
                 "obj_bbox": mandatory_arg("pos_points")[0:2] if self.startswith_box else None
             })
         elif self.kind == LambdaType.REID:
             payload.update({
-                "image0": self._get_image(db_task, mandatory_arg("frame0"), quality),
-                "image1": self._get_image(db_task, mandatory_arg("frame1"), quality),
+                "image0": self._get_image(db_task, mandatory_arg("frame0"), quality,
+                    frame_source=frame_source),
+                "image1": self._get_image(db_task, mandatory_arg("frame1"), quality,
+                    frame_source=frame_source),
                 "boxes0": mandatory_arg("boxes0"),
                 "boxes1": mandatory_arg("boxes1")
             })
@@ -401,7 +493,8 @@ class LambdaFunction:
                 })
         elif self.kind == LambdaType.TRACKER:
             payload.update({
-                "image": self._get_image(db_task, mandatory_arg("frame"), quality),
+                "image": self._get_image(db_task, mandatory_arg("frame"), quality,
+                    frame_source=frame_source),
                 "shapes": data.get("shapes", []),
                 "states": data.get("states", [])
             })
@@ -411,11 +504,9 @@ class LambdaFunction:
                 .format(self.id, self.kind),
                 code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        if is_interactive and request:
-            interactive_function_call_signal.send(sender=self, request=request)
-
-        response = self.gateway.invoke(self, payload)
+        return payload, mapping
 
+    def _parse_response(self, response, mapping: Dict[str, Any]):
         response_filtered = []
 
         def check_attr_value(value, db_attr):
@@ -478,21 +569,129 @@ class LambdaFunction:
 
         return response
 
-    def _get_image(self, db_task, frame, quality):
+    def _parse_batch_response(
+        self, response, mapping: Dict[str, Any], *, batch_size: int
+    ) -> List[List[Dict[str, Any]]]:
+        if not isinstance(response, list) or len(response) != batch_size:
+            raise ValidationError(
+                '`{}` lambda function returned a wrong number of results '.format(self.id) +
+                '(expected {} frames)'.format(batch_size),
+                code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return [self._parse_response(frame_response, mapping) for frame_response in response]
+
+    def _get_quality(self, quality: Optional[str]) -> FrameProvider.Quality:
         if quality is None or quality == "original":
-            quality = FrameProvider.Quality.ORIGINAL
+            return FrameProvider.Quality.ORIGINAL
         elif  quality == "compressed":
-            quality = FrameProvider.Quality.COMPRESSED
+            return FrameProvider.Quality.COMPRESSED
         else:
             raise ValidationError(
                 '`{}` lambda function was run '.format(self.id) +
                 'with wrong arguments (quality={})'.format(quality),
                 code=status.HTTP_400_BAD_REQUEST)
 
-        frame_provider = FrameProvider(db_task.data)
-        image = frame_provider.get_frame(frame, quality=quality)
+    def _get_image(
+        self, db_task, frame, quality, *, frame_source: Optional[LambdaFrameSource] = None
+    ):
+        quality = self._get_quality(quality)
+
+        if frame_source is None:
+            frame_source = LambdaFrameSource(db_task)
+
+        return frame_source.get_image(frame, quality)
+
+class LambdaFrameSource:
+    """
+    Provides base64-encoded task frames for lambda function calls.
+
+    The frame provider is shared between the calls, so the current chunk stays open
+    and the frames of the chunk are decoded sequentially only once. If prefetching is
+    enabled, the next frames are prepared in a background thread while
+    the current function call is in progress.
+    """
+
+    def __init__(self, db_task: Task, *, prefetch_depth: int = 0):
+        self._frame_provider = FrameProvider(db_task.data)
+        self._prefetch_depth = prefetch_depth
+        self._upcoming_images: Optional[Iterator[Tuple[int, FrameProvider.Quality]]] = None
+        self._pending_images: Dict[Tuple[int, FrameProvider.Quality], Future] = {}
+        self._last_image: Optional[Tuple[Tuple[int, FrameProvider.Quality], str]] = None
+
+        self._executor = None
+        if prefetch_depth:
+            # The frame provider is not thread-safe,
+            # so all the frames are prepared in the same thread
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def close(self):
+        if self._executor:
+            for future in self._pending_images.values():
+                future.cancel()
+
+            # The background thread has its own DB connection
+            self._executor.submit(connections.close_all)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        self._upcoming_images = None
+        self._pending_images.clear()
+        self._frame_provider.unload()
+
+    def _encode_image(self, frame: int, quality: FrameProvider.Quality) -> str:
+        image, _ = self._frame_provider.get_frame(frame, quality=quality)
+        return base64.b64encode(image.getvalue()).decode('utf-8')
+
+    def _schedule_prefetch(self):
+        if not self._executor or not self._upcoming_images:
+            return
+
+        while len(self._pending_images) < self._prefetch_depth:
+            key = next(self._upcoming_images, None)
+            if key is None:
+                self._upcoming_images = None
+                break
+
+            if key not in self._pending_images:
+                self._pending_images[key] = self._executor.submit(self._encode_image, *key)
+
+    def prefetch(self, frames: Iterable[int], quality: FrameProvider.Quality):
+        """
+        Declares the frames that are going to be requested, in the increasing order.
+        Does nothing if prefetching is disabled.
+        """
+
+        self._upcoming_images = ((frame, quality) for frame in frames)
+        self._schedule_prefetch()
+
+    def get_image(self, frame: int, quality: FrameProvider.Quality) -> str:
+        key = (frame, quality)
+        if self._last_image and self._last_image[0] == key:
+            return self._last_image[1]
+
+        # Drop the skipped frames
+        for skipped_key in [k for k in self._pending_images if k[0] < frame]:
+            self._pending_images.pop(skipped_key).cancel()
 
-        return base64.b64encode(image[0].getvalue()).decode('utf-8')
+        self._schedule_prefetch()
+        future = self._pending_images.pop(key, None)
+        self._schedule_prefetch()
+
+        if future:
+            image = future.result()
+        elif self._executor:
+            image = self._executor.submit(self._encode_image, frame, quality).result()
+        else:
+            image = self._encode_image(frame, quality)
+
+        self._last_image = (key, image)
+        return image
 
 class LambdaQueue:
     RESULT_TTL = timedelta(minutes=30)
@@ -766,34 +965,87 @@ class LambdaJob:
 
         results = Results(db_task.id, job_id=db_job.id if db_job else None)
 
-        frame_set = cls._get_frame_set(db_task, db_job)
+        deleted_frames = set(db_task.data.deleted_frames)
+        frame_set = [
+            frame for frame in cls._get_frame_set(db_task, db_job)
+            if frame not in deleted_frames
+        ]
 
-        for frame in frame_set:
-            if frame in db_task.data.deleted_frames:
-                continue
+        # Function calls are made in parallel, but the results are processed in the frame order
+        concurrency = min(
+            settings.LAMBDA_MAX_CONCURRENT_REQUESTS, function.max_concurrent_requests
+        )
 
-            annotations = function.invoke(db_task, db_job=db_job, data={
-                "frame": frame, "quality": quality, "mapping": mapping,
-                "threshold": threshold
-            })
+        with (
+            LambdaFrameSource(
+                db_task, prefetch_depth=settings.LAMBDA_FRAME_PREFETCH_DEPTH
+            ) as frame_source,
+            function.gateway.keep_session(max_connections=concurrency),
+            ThreadPoolExecutor(max_workers=concurrency) as executor,
+        ):
+            frame_source.prefetch(frame_set, function._get_quality(quality))
+
+            # Functions declaring a batch size receive several frames in one call
+            batch_size = function.max_batch_size
+            frame_batches = (
+                frame_set[i : i + batch_size] for i in range(0, len(frame_set), batch_size)
+            )
 
-            progress = (frame + 1) / db_task.data.size
-            if not cls._update_progress(progress):
-                break
+            pending_calls = deque()
+            processed_frames_count = 0
+            while True:
+                while len(pending_calls) < concurrency:
+                    next_batch = next(frame_batches, None)
+                    if next_batch is None:
+                        break
 
-            for anno in annotations:
-                parsed = parse_anno(anno, labels)
-                if parsed is not None:
-                    if anno["type"].lower() == "tag":
-                        results.append_tag(parsed)
+                    if batch_size > 1:
+                        call_data = {"frames": next_batch}
                     else:
-                        results.append_shape(parsed)
+                        call_data = {"frame": next_batch[0]}
 
-            # Accumulate data during 100 frames before submitting results.
-            # It is optimization to make fewer calls to our server. Also
-            # it isn't possible to keep all results in memory.
-            if frame and frame % 100 == 0:
-                results.submit()
+                    payload, labels_mapping = function._prepare_call(db_task, db_job=db_job,
+                        frame_source=frame_source, allow_batch=batch_size > 1, data={
+                            **call_data, "quality": quality, "mapping": mapping,
+                            "threshold": threshold
+                        }
+                    )
+                    pending_calls.append((
+                        next_batch,
+                        labels_mapping,
+                        executor.submit(function.gateway.invoke, function, payload),
+                    ))
+
+                if not pending_calls:
+                    break
+
+                batch, labels_mapping, call = pending_calls.popleft()
+                if batch_size > 1:
+                    batch_annotations = function._parse_batch_response(
+                        call.result(), labels_mapping, batch_size=len(batch)
+                    )
+                else:
+                    batch_annotations = [function._parse_response(call.result(), labels_mapping)]
+
+                processed_frames_count += len(batch)
+                progress = processed_frames_count / len(frame_set)
+                if not cls._update_progress(progress):
+                    break
+
+                for frame, annotations in zip(batch, batch_annotations):
+                    for anno in annotations:
+                        parsed = parse_anno(anno, labels)
+                        if parsed is not None:
+                            if anno["type"].lower() == "tag":
+                                results.append_tag(parsed)
+                            else:
+                                results.append_shape(parsed)
+
+                    # Accumulate data during 100 frames before submitting results.
+                    # It is optimization to make fewer calls to our server. Also
+                    # it isn't possible to keep all results in memory.
+                    if frame and frame % 100 == 0:
+                        results.submit()
 
         results.submit()
 
@@ -850,30 +1102,33 @@ class LambdaJob:
                 shapes_without_boxes.append(shape)
 
         paths = {}
-        for i, (frame0, frame1) in enumerate(zip(frame_set[:-1], frame_set[1:])):
-            boxes0 = boxes_by_frame[frame0]
-            for box in boxes0:
-                if "path_id" not in box:
-                    path_id = len(paths)
-                    paths[path_id] = [box]
-                    box["path_id"] = path_id
-
-            boxes1 = boxes_by_frame[frame1]
-            if boxes0 and boxes1:
-                matching = function.invoke(db_task, db_job=db_job, data={
-                    "frame0": frame0, "frame1": frame1, "quality": quality,
-                    "boxes0": boxes0, "boxes1": boxes1, "threshold": threshold,
-                    "max_distance": max_distance})
-
-                for idx0, idx1 in enumerate(matching):
-                    if idx1 >= 0:
-                        path_id = boxes0[idx0]["path_id"]
-                        boxes1[idx1]["path_id"] = path_id
-                        paths[path_id].append(boxes1[idx1])
-
-            if not LambdaJob._update_progress((i + 1) / len(frame_set)):
-                break
-
+        with (
+            LambdaFrameSource(db_task) as frame_source,
+            function.gateway.keep_session(),
+        ):
+            for i, (frame0, frame1) in enumerate(zip(frame_set[:-1], frame_set[1:])):
+                boxes0 = boxes_by_frame[frame0]
+                for box in boxes0:
+                    if "path_id" not in box:
+                        path_id = len(paths)
+                        paths[path_id] = [box]
+                        box["path_id"] = path_id
+
+                boxes1 = boxes_by_frame[frame1]
+                if boxes0 and boxes1:
+                    matching = function.invoke(db_task, db_job=db_job, frame_source=frame_source, data={
+                        "frame0": frame0, "frame1": frame1, "quality": quality,
+                        "boxes0": boxes0, "boxes1": boxes1, "threshold": threshold,
+                        "max_distance": max_distance})
+
+                    for idx0, idx1 in enumerate(matching):
+                        if idx1 >= 0:
+                            path_id = boxes0[idx0]["path_id"]
+                            boxes1[idx1]["path_id"] = path_id
+                            paths[path_id].append(boxes1[idx1])
+
+                if not LambdaJob._update_progress((i + 1) / len(frame_set)):
+                    break
 
         for box in boxes_by_frame[frame_set[-1]]:
             if "path_id" not in box:
@@ -273,6 +273,7 @@ class CVAT_QUEUES(Enum):
     QUALITY_REPORTS = 'quality_reports'
     ANALYTICS_REPORTS = 'analytics_reports'
     CLEANING = 'cleaning'
+    CHUNKS = 'chunks'
 
 redis_inmem_host = os.getenv('CVAT_REDIS_INMEM_HOST', 'localhost')
 redis_inmem_port = os.getenv('CVAT_REDIS_INMEM_PORT', 6379)
@@ -318,6 +319,10 @@ RQ_QUEUES = {
         **shared_queue_settings,
         'DEFAULT_TIMEOUT': '1h',
     },
+    CVAT_QUEUES.CHUNKS.value: {
+        **shared_queue_settings,
+        'DEFAULT_TIMEOUT': '4h',
+    },
 }
 
 NUCLIO = {
@@ -432,6 +437,12 @@ os.makedirs(MIGRATIONS_LOGS_ROOT, exist_ok=True)
 CLOUD_STORAGE_ROOT = os.path.join(DATA_ROOT, 'storages')
 os.makedirs(CLOUD_STORAGE_ROOT, exist_ok=True)
 
+CLOUD_OBJECT_CACHE_ROOT = os.path.join(CACHE_ROOT, 'cloud_objects')
+os.makedirs(CLOUD_OBJECT_CACHE_ROOT, exist_ok=True)
+
+MEDIA_CACHE_CHUNK_FILES_ROOT = os.path.join(CACHE_ROOT, 'media_chunks')
+os.makedirs(MEDIA_CACHE_CHUNK_FILES_ROOT, exist_ok=True)
+
 TMP_FILES_ROOT = os.path.join(DATA_ROOT, 'tmp')
 os.makedirs(TMP_FILES_ROOT, exist_ok=True)
 
@@ -48,6 +48,12 @@ os.makedirs(MIGRATIONS_LOGS_ROOT, exist_ok=True)
 CLOUD_STORAGE_ROOT = os.path.join(DATA_ROOT, 'storages')
 os.makedirs(CLOUD_STORAGE_ROOT, exist_ok=True)
 
+CLOUD_OBJECT_CACHE_ROOT = os.path.join(CACHE_ROOT, 'cloud_objects')
+os.makedirs(CLOUD_OBJECT_CACHE_ROOT, exist_ok=True)
+
+MEDIA_CACHE_CHUNK_FILES_ROOT = os.path.join(CACHE_ROOT, 'media_chunks')
+os.makedirs(MEDIA_CACHE_CHUNK_FILES_ROOT, exist_ok=True)
+
 TMP_FILES_ROOT = os.path.join(DATA_ROOT, 'tmp')
 os.makedirs(TMP_FILES_ROOT, exist_ok=True)
 
@@ -62,6 +68,10 @@ for logger in LOGGING["loggers"].values():
 
 LOGGING["handlers"]["server_file"] = LOGGING["handlers"]["console"]
 
+# Test database transactions are not visible from other threads,
+# so frames for automatic annotation are prepared in the calling thread
+LAMBDA_FRAME_PREFETCH_DEPTH = 0
+
 PASSWORD_HASHERS = (
     'django.contrib.auth.hashers.MD5PasswordHasher',
 )
@@ -42,6 +42,7 @@ class Container(str, Enum):
     WORKER_EXPORT = "cvat_worker_export"
     WORKER_QUALITY_REPORTS = "cvat_worker_quality_reports"
     WORKER_WEBHOOKS = "cvat_worker_webhooks"
+    WORKER_CHUNKS = "cvat_worker_chunks"
     UTILS = "cvat_utils"
 
     def __str__(self):
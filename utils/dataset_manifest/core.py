@@ -1,16 +1,21 @@
 # Copyright (C) 2021-2022 Intel Corporation
-# Copyright (C) 2022-2023 CVAT.ai Corporation
+# Copyright (C) 2022-2024 CVAT.ai Corporation
 #
 # SPDX-License-Identifier: MIT
 
+from array import array
 from enum import Enum
 from io import StringIO
 import av
 import json
+import mmap
 import os
+import struct
+import sys
 
 from abc import ABC, abstractmethod, abstractproperty, abstractstaticmethod
-from contextlib import closing
+from collections import OrderedDict
+from contextlib import closing, contextmanager
 from itertools import islice
 from PIL import Image
 from json.decoder import JSONDecodeError
@@ -20,7 +25,9 @@ from .errors import InvalidManifestError, InvalidVideoError
 from .utils import SortingMethod, md5_hash, rotate_image, sort
 from .types import NamedBytesIO
 
-from typing import Any, Dict, List, Union, Optional, Iterator, Tuple, Callable
+from typing import (
+    Any, Dict, Generator, Iterable, List, Union, Optional, Iterator, Tuple, Callable
+)
 
 
 class VideoStreamReader:
@@ -303,55 +310,157 @@ class _Manifest:
 # Needed for faster iteration over the manifest file, will be generated to work inside CVAT
 # and will not be generated when manually creating a manifest
 class _Index:
-    FILE_NAME = 'index.json'
+    """
+    Keeps the line offsets of the manifest items.
+
+    The index file consists of a fixed-size header and an array of uint64 offsets,
+    which is memory-mapped on loading. The header contains the size and the modification time
+    of the indexed manifest, so an outdated index can be detected without reading the manifest.
+    The legacy JSON index files are still supported for reading.
+    """
+
+    FILE_NAME = 'index.bin'
+    LEGACY_FILE_NAME = 'index.json'
+
+    _MAGIC = b'CVATMIDX'
+    _VERSION = 1
+    # magic, version, reserved, items count, manifest size, manifest mtime in ns
+    _HEADER = struct.Struct('<8sIIQQq')
+    _OFFSET_TYPE = 'Q'
 
     def __init__(self, path):
         assert path and os.path.isdir(path), 'No index directory path'
         self._path = os.path.join(path, self.FILE_NAME)
-        self._index = {}
+        self._legacy_path = os.path.join(path, self.LEGACY_FILE_NAME)
+        self._index = array(self._OFFSET_TYPE)
+        self._manifest_stat = None
+        self._mmap = None
 
     @property
     def path(self):
         return self._path
 
+    @staticmethod
+    def _get_manifest_stat(manifest) -> Tuple[int, int]:
+        stat = os.stat(manifest)
+        return stat.st_size, stat.st_mtime_ns
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path) or os.path.exists(self._legacy_path)
+
+    def is_actual(self, manifest) -> bool:
+        if self._manifest_stat is None:
+            # the legacy index doesn't keep the manifest information
+            return True
+
+        return os.path.exists(manifest) and self._manifest_stat == self._get_manifest_stat(manifest)
+
+    def _close(self):
+        if isinstance(self._index, memoryview):
+            self._index.release()
+        self._index = array(self._OFFSET_TYPE)
+
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
     def dump(self):
-        with open(self._path, 'w') as index_file:
-            json.dump(self._index, index_file,  separators=(',', ':'))
+        offsets = array(self._OFFSET_TYPE, self._index)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+
+        manifest_size, manifest_mtime = self._manifest_stat or (0, 0)
+        header = self._HEADER.pack(self._MAGIC, self._VERSION, 0,
+            len(offsets), manifest_size, manifest_mtime)
+
+        # the index can be read by other processes, so it is replaced atomically
+        tmp_path = f'{self._path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as index_file:
+            index_file.write(header)
+            offsets.tofile(index_file)
+        os.replace(tmp_path, self._path)
+
+    def _load_legacy(self):
+        with open(self._legacy_path, 'r') as index_file:
+            index = json.load(index_file,
+                object_hook=lambda d: {int(k): v for k, v in d.items()})
+
+        self._index = array(self._OFFSET_TYPE, (index[i] for i in range(len(index))))
+        self._manifest_stat = None
 
     def load(self):
-        with open(self._path, 'r') as index_file:
-            self._index = json.load(index_file,
-                object_hook=lambda d: {int(k): v for k, v in d.items()})
+        self._close()
+
+        if not os.path.exists(self._path):
+            self._load_legacy()
+            return
+
+        with open(self._path, 'rb') as index_file:
+            header = index_file.read(self._HEADER.size)
+            if len(header) != self._HEADER.size:
+                raise InvalidManifestError('The manifest index file is corrupted')
+
+            magic, version, _, count, manifest_size, manifest_mtime = self._HEADER.unpack(header)
+            if magic != self._MAGIC or version != self._VERSION:
+                raise InvalidManifestError('Unsupported manifest index file format')
+
+            expected_size = self._HEADER.size + count * array(self._OFFSET_TYPE).itemsize
+            if os.fstat(index_file.fileno()).st_size != expected_size:
+                raise InvalidManifestError('The manifest index file is corrupted')
+
+            if count and sys.byteorder == 'little':
+                self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._index = memoryview(self._mmap)[self._HEADER.size:].cast(self._OFFSET_TYPE)
+            elif count:
+                self._index = array(self._OFFSET_TYPE)
+                self._index.fromfile(index_file, count)
+                self._index.byteswap()
+
+        self._manifest_stat = (manifest_size, manifest_mtime)
+
+    def convert_legacy(self, manifest):
+        assert os.path.exists(self._legacy_path), 'No legacy index file to convert'
+        self._manifest_stat = self._get_manifest_stat(manifest)
+        self.dump()
+        os.remove(self._legacy_path)
 
     def remove(self):
-        os.remove(self._path)
+        self._close()
+        for path in (self._path, self._legacy_path):
+            if os.path.exists(path):
+                os.remove(path)
 
     def create(self, manifest, *, skip):
         assert os.path.exists(manifest), 'A manifest file not exists, index cannot be created'
-        with open(manifest, 'r+') as manifest_file:
+        self._close()
+        self._manifest_stat = self._get_manifest_stat(manifest)
+
+        index = self._index
+        with open(manifest, 'rb') as manifest_file:
             while skip:
                 manifest_file.readline()
                 skip -= 1
-            image_number = 0
             position = manifest_file.tell()
-            line = manifest_file.readline()
-            while line:
+            for line in manifest_file:
                 if line.strip():
-                    self._index[image_number] = position
-                    image_number += 1
-                    position = manifest_file.tell()
-                line = manifest_file.readline()
+                    index.append(position)
+                position += len(line)
 
     def partial_update(self, manifest, number):
         assert os.path.exists(manifest), 'A manifest file not exists, index cannot be updated'
-        with open(manifest, 'r+') as manifest_file:
-            manifest_file.seek(self._index[number])
-            line = manifest_file.readline()
-            while line:
+        position = self[number]
+        index = array(self._OFFSET_TYPE, self._index[:number])
+        self._close()
+        self._manifest_stat = self._get_manifest_stat(manifest)
+
+        with open(manifest, 'rb') as manifest_file:
+            manifest_file.seek(position)
+            for line in manifest_file:
                 if line.strip():
-                    self._index[number] = manifest_file.tell()
-                    number += 1
-                line = manifest_file.readline()
+                    index.append(position)
+                position += len(line)
+
+        self._index = index
 
     def __getitem__(self, number):
         if not 0 <= number < len(self):
@@ -359,12 +468,92 @@ class _Index:
 
         return self._index[number]
 
+    def __iter__(self):
+        return iter(self._index)
+
     def __len__(self):
         return len(self._index)
 
     def is_empty(self) -> bool:
         return not len(self)
 
+class _ManifestReader:
+    """
+    Keeps the manifest file open for a series of random access reads.
+    Parsed items are cached, so the returned objects must not be modified.
+    """
+
+    DEFAULT_CACHE_SIZE = 1024
+
+    def __init__(self, manifest_manager: '_ManifestManager', *, cache_size: int = DEFAULT_CACHE_SIZE):
+        self._manager = manifest_manager
+        self._index = manifest_manager.index
+        self._file = open(manifest_manager.manifest.path, 'rb')
+        self._cache: OrderedDict[int, ImageProperties] = OrderedDict()
+        self._cache_size = cache_size
+
+    def close(self):
+        self._file.close()
+        self._cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def _add_to_cache(self, number: int, item: 'ImageProperties'):
+        if not self._cache_size:
+            return
+
+        self._cache[number] = item
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _parse_item(self, line: bytes) -> 'ImageProperties':
+        item = ImageProperties(json.loads(line))
+        self._manager._json_item_is_valid(**item)
+        return item
+
+    def __getitem__(self, number: int) -> 'ImageProperties':
+        item = self._cache.get(number)
+        if item is not None:
+            self._cache.move_to_end(number)
+            return item
+
+        self._file.seek(self._index[number])
+        item = self._parse_item(self._file.readline())
+        self._add_to_cache(number, item)
+        return item
+
+    def get_many(self, numbers: Iterable[int]) -> List['ImageProperties']:
+        """
+        Reads the requested items in the order of their location in the file,
+        returns them in the requested order
+        """
+
+        numbers = list(numbers)
+        items: Dict[int, ImageProperties] = {}
+
+        position = None
+        for number in sorted(set(numbers)):
+            item = self._cache.get(number)
+            if item is None:
+                offset = self._index[number]
+                if offset != position:
+                    self._file.seek(offset)
+                line = self._file.readline()
+                position = offset + len(line)
+
+                item = self._parse_item(line)
+                self._add_to_cache(number, item)
+            else:
+                self._cache.move_to_end(number)
+
+            items[number] = item
+
+        return [items[number] for number in numbers]
+
 class _ManifestManager(ABC):
     BASE_INFORMATION = {
         'version' : 1,
@@ -384,6 +573,7 @@ class _ManifestManager(ABC):
         self._index = _Index(os.path.dirname(self._manifest.path))
         self._reader = None
         self._create_index = create_index
+        self._active_reader: Optional[_ManifestReader] = None
 
     @property
     def reader(self):
@@ -391,32 +581,44 @@ class _ManifestManager(ABC):
 
     def _parse_line(self, line):
         """ Getting a random line from the manifest file """
-        with open(self._manifest.path, 'r') as manifest_file:
-            if isinstance(line, str):
-                assert line in self.BASE_INFORMATION.keys(), \
-                    'An attempt to get non-existent information from the manifest'
+        if isinstance(line, str):
+            assert line in self.BASE_INFORMATION.keys(), \
+                'An attempt to get non-existent information from the manifest'
+            with open(self._manifest.path, 'r') as manifest_file:
                 for _ in range(self.BASE_INFORMATION[line]):
                     fline = manifest_file.readline()
-                return json.loads(fline)[line]
-            else:
-                assert self._index, 'No prepared index'
-                offset = self._index[line]
+            return json.loads(fline)[line]
+        else:
+            assert self._index, 'No prepared index'
+            if self._active_reader:
+                return self._active_reader[line]
+
+            offset = self._index[line]
+            with open(self._manifest.path, 'r') as manifest_file:
                 manifest_file.seek(offset)
                 properties = manifest_file.readline()
-                parsed_properties = ImageProperties(json.loads(properties))
-                self._json_item_is_valid(**parsed_properties)
-                return parsed_properties
+            parsed_properties = ImageProperties(json.loads(properties))
+            self._json_item_is_valid(**parsed_properties)
+            return parsed_properties
 
     def init_index(self):
-        if os.path.exists(self._index.path):
-            self._index.load()
-        else:
-            self._index.create(self._manifest.path, skip=self._manifest.get_header_lines_count())
-            if self._create_index:
-                self._index.dump()
+        if self._index.exists():
+            try:
+                self._index.load()
+            except InvalidManifestError:
+                pass
+            else:
+                if self._index.is_actual(self._manifest.path):
+                    if self._create_index and not os.path.exists(self._index.path):
+                        self._index.convert_legacy(self._manifest.path)
+                    return
+
+        self._index.create(self._manifest.path, skip=self._manifest.get_header_lines_count())
+        if self._create_index:
+            self._index.dump()
 
     def reset_index(self):
-        if self._create_index and os.path.exists(self._index.path):
+        if self._create_index and self._index.exists():
             self._index.remove()
 
     def set_index(self):
@@ -437,10 +639,10 @@ class _ManifestManager(ABC):
         ...
 
     def __iter__(self):
-        self.set_index()
+        if self._index.is_empty() or not self._index.is_actual(self._manifest.path):
+            self.init_index()
 
         with open(self._manifest.path, 'r') as manifest_file:
-            manifest_file.seek(self._index[0])
             for idx, line_start in enumerate(self._index):
                 manifest_file.seek(line_start)
                 line = manifest_file.readline()
@@ -462,9 +664,35 @@ class _ManifestManager(ABC):
 
     def __getitem__(self, item):
         if isinstance(item, slice):
-            return [self._parse_line(i) for i in range(item.start or 0, item.stop or len(self), item.step or 1)]
+            return self.get_many(range(item.start or 0, item.stop or len(self), item.step or 1))
         return self._parse_line(item)
 
+    @contextmanager
+    def open_reader(
+        self, *, cache_size: int = _ManifestReader.DEFAULT_CACHE_SIZE
+    ) -> Generator[_ManifestReader, None, None]:
+        """
+        Keeps the manifest file open while the context is active.
+        Item access on the manager uses the opened reader as well.
+        """
+
+        assert self._index, 'No prepared index'
+
+        if self._active_reader:
+            yield self._active_reader
+            return
+
+        with _ManifestReader(self, cache_size=cache_size) as reader:
+            self._active_reader = reader
+            try:
+                yield reader
+            finally:
+                self._active_reader = None
+
+    def get_many(self, numbers: Iterable[int]) -> List['ImageProperties']:
+        with self.open_reader() as reader:
+            return reader.get_many(numbers)
+
     @property
     def index(self):
         return self._index
@@ -665,6 +893,7 @@ class ImageManifestManager(_ManifestManager):
         prefix: str = "",
         default_prefix: Optional[str] = None,
         start_index: Optional[int] = None,
+        directory_tree: Optional['ManifestDirectoryTree'] = None,
     ) -> Dict:
 
         if default_prefix and prefix and not (default_prefix.startswith(prefix) or prefix.startswith(default_prefix)):
@@ -690,41 +919,83 @@ class ImageManifestManager(_ManifestManager):
             else:
                 search_prefix = default_prefix
 
-        next_start_index = None
-        # get part of manifest content
-        # generally we cannot rely to slice with manifest content because it may not be sorted.
-        # And then this can lead to incorrect index calculation.
-        if manifest_prefix:
-            content = [os.path.join(manifest_prefix, f[1].full_name) for f in self]
-        else:
-            content = [f[1].full_name for f in self]
+        if directory_tree is None:
+            directory_tree = self.get_directory_tree(manifest_prefix)
 
-        if search_prefix:
-            content = list(filter(lambda x: x.startswith(search_prefix), content))
-            if os.path.sep in search_prefix:
-                last_slash = search_prefix.rindex(os.path.sep)
-                content = [f[last_slash + 1:] for f in content]
+        return directory_tree.get_page(search_prefix, start_index or 0, page_size)
 
-        files_in_root, files_in_directories = [], []
+    def get_directory_tree(self, manifest_prefix: Optional[str] = None) -> 'ManifestDirectoryTree':
+        """
+        Reads the manifest and groups the file names by directories.
+        The tree can be reused for the listings until the manifest is changed.
+        """
 
-        for f in content:
-            if os.path.sep in f:
-                files_in_directories.append(f)
-            else:
-                files_in_root.append(f)
+        names = (f.full_name for _, f in self)
+        if manifest_prefix:
+            names = (os.path.join(manifest_prefix, name) for name in names)
+
+        return ManifestDirectoryTree(names)
+
+class ManifestDirectoryTree:
+    """
+    Keeps the naturally sorted subdirectories and files of each directory
+    of the manifest content, so that a page of a directory listing can be
+    returned without reading the whole manifest.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        subdirectories: Dict[str, set] = {}
+        files: Dict[str, List[str]] = {}
+
+        for name in names:
+            directory, _, file_name = name.rpartition(os.path.sep)
+            files.setdefault(directory, []).append(file_name)
+
+            # register the parent directories, until an already known one
+            while directory:
+                parent, _, subdirectory = directory.rpartition(os.path.sep)
+                parent_subdirectories = subdirectories.setdefault(parent, set())
+                if subdirectory in parent_subdirectories:
+                    break
+
+                parent_subdirectories.add(subdirectory)
+                directory = parent
+
+        self._directories: Dict[str, Tuple[List[str], List[str]]] = {
+            directory: (
+                sort(list(subdirectories.get(directory, ())), SortingMethod.NATURAL),
+                sort(files.get(directory, []), SortingMethod.NATURAL),
+            )
+            for directory in subdirectories.keys() | files.keys()
+        }
 
-        directories = list(set([d.split(os.path.sep)[0] for d in files_in_directories]))
-        level_in_hierarchical_structure = [{'name': d, 'type': 'DIR'} for d in sort(directories, SortingMethod.NATURAL)]
-        level_in_hierarchical_structure.extend([{'name': f, 'type': 'REG'} for f in sort(files_in_root, SortingMethod.NATURAL)])
+    def get_page(self, prefix: str, start_index: int, page_size: int) -> Dict:
+        """
+        Returns the subdirectories and the files starting with the prefix,
+        relative to the last directory of the prefix.
+        The subdirectories go first.
+        """
 
-        level_in_hierarchical_structure = level_in_hierarchical_structure[start_index:]
-        if len(level_in_hierarchical_structure) > page_size:
-            level_in_hierarchical_structure = level_in_hierarchical_structure[:page_size]
-            next_start_index = start_index + page_size
+        directory, _, name_prefix = prefix.rpartition(os.path.sep)
+        subdirectories, files = self._directories.get(directory, ([], []))
+        if name_prefix:
+            subdirectories = [d for d in subdirectories if d.startswith(name_prefix)]
+            files = [f for f in files if f.startswith(name_prefix)]
+
+        stop_index = start_index + page_size
+        content = [
+            {'name': d, 'type': 'DIR'} for d in subdirectories[start_index:stop_index]
+        ]
+        content.extend(
+            {'name': f, 'type': 'REG'} for f in files[
+                max(start_index - len(subdirectories), 0):
+                max(stop_index - len(subdirectories), 0)
+            ]
+        )
 
         return {
-            'content': level_in_hierarchical_structure,
-            'next': next_start_index,
+            'content': content,
+            'next': stop_index if stop_index < len(subdirectories) + len(files) else None,
         }
 
 class _BaseManifestValidator(ABC):